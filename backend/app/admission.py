@@ -0,0 +1,99 @@
+"""Admission control for new stories: an honest start time, or an honest no.
+
+A story joins the back of its ARQ queue (app.jobs.queue_for). How long it
+waits there is the work ahead of it spread over the slots draining that queue:
+
+    wait = stories waiting × seconds per story / (live workers × slots each)
+
+Live workers are counted from their heartbeats (app.heartbeat). Seconds per
+story is a moving average of how long the workers' generations actually hold a
+slot, kept in the shared cache. create_story returns the estimate, and refuses
+with a 503 and Retry-After when it is over ADMISSION_MAX_WAIT_SECONDS, before
+anything is written or charged. A parent told "try again in 20 minutes" at
+peak is better served than one whose story sits behind hours of backlog.
+
+Inline there is no queue: a story starts as soon as it is created. When the
+queue or the heartbeats cannot be read, stories are admitted without an
+estimate: this paces the workers, it is not what bounds cost (the global
+budget is, and that one fails closed).
+"""
+
+import logging
+import math
+from datetime import UTC, datetime, timedelta
+
+from fastapi import status
+
+from . import heartbeat, kv, metrics
+from .config import get_settings
+from .errors import CodedHTTPException
+from .jobs import queue_depths, queue_for, slots_per_worker
+
+logger = logging.getLogger(__name__)
+
+_SERVICE_KEY = "story-service-seconds"
+_SERVICE_TTL = 7 * 24 * 3600
+# A first guess at one story, until the workers have timed some.
+_INITIAL_STORY_SECONDS = 60.0
+_SMOOTHING = 0.2
+
+
+async def service_seconds() -> float:
+    """How long a generation holds a worker slot, by recent ones."""
+    raw = await kv.get(_SERVICE_KEY)
+    return float(raw) if raw is not None else _INITIAL_STORY_SECONDS
+
+
+async def record_service_time(seconds: float) -> None:
+    """Fold one generation's run into the average. Workers are not coordinated,
+    so two finishing at once may each overwrite the other: for an average
+    of many runs that loses a sample, nothing more."""
+    current = await service_seconds()
+    await kv.put(_SERVICE_KEY, f"{current + _SMOOTHING * (seconds - current):.3f}", ttl=_SERVICE_TTL)
+    metrics.incr("story_service_seconds_total", seconds)
+
+
+async def estimate_wait(*, priority: bool) -> float | None:
+    """Seconds until a story enqueued now would start; None when unknown."""
+    if get_settings().job_backend != "arq":
+        return 0.0
+    queue = queue_for(priority=priority)
+    try:
+        # Stories waiting only: not the ones workers are running, nor the
+        # redraws and exports sharing the standard queue.
+        depth, _ = (await queue_depths())[queue]
+        workers = len(await heartbeat.beats())
+    except Exception as e:
+        logger.warning("Could not read the generation queue; admitting without an estimate: %s", e)
+        return None
+    if not depth:
+        return 0.0
+    # No beating worker at all is a restart, not a queue that never drains:
+    # estimate as if one were back.
+    slots = max(1, workers) * slots_per_worker(queue)
+    return depth * await service_seconds() / slots
+
+
+async def admit(*, priority: bool) -> float | None:
+    """The estimated wait, in seconds, of a story created now (None when
+    unknown). Raises a coded 503 with Retry-After when it is over the limit."""
+    wait = await estimate_wait(priority=priority)
+    limit = get_settings().admission_max_wait_seconds
+    if wait is None or limit <= 0 or wait <= limit:
+        return wait
+    queue = queue_for(priority=priority)
+    metrics.incr("stories_shed_total", queue=queue)
+    # When the backlog ahead should have drained down to the limit.
+    retry_after = max(1, math.ceil(wait - limit))
+    logger.warning("Shedding a new story: %.0fs projected wait in the %s queue", wait, queue)
+    raise CodedHTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        code="capacity.busy",
+        detail=f"Lots of stories are being made right now. Please try again in about {math.ceil(retry_after / 60)} minutes.",
+        params={"minutes": math.ceil(retry_after / 60)},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+def start_time(wait: float | None) -> datetime | None:
+    return None if wait is None else datetime.now(UTC) + timedelta(seconds=wait)
@@ -25,6 +25,22 @@ class Settings(BaseSettings):
     # "arq" uses the Redis-backed worker (prod). "inline" runs generation as an
     # asyncio task inside the API process (keyless dev, tests).
     job_backend: Literal["arq", "inline"] = "inline"
+    # GET /api/jobs/{id}/events sends a comment this often when nothing has
+    # changed, so proxies keep the stream open, and re-reads the job from the
+    # database in case a pub/sub message was lost.
+    job_events_heartbeat_seconds: float = 15.0
+    # Stories each worker runs at once from the priority queue (plans with
+    # priority generation), on top of its 8 standard slots. The two counts
+    # weight the queues: priority work never waits behind free stories, and
+    # free stories keep their own slots however busy the priority queue gets.
+    # 0 sends every story to the standard queue.
+    worker_priority_jobs: int = 4
+    # Each worker process writes a heartbeat to Redis this often. Its jobs are
+    # failed once three in a row are missed (see app/heartbeat.py).
+    worker_heartbeat_seconds: float = 5.0
+    # New stories are refused (503 + Retry-After) while the projected wait in
+    # their queue exceeds this, rather than joining a backlog of hours. 0 = never.
+    admission_max_wait_seconds: int = 900
 
     # --- Generation ---
     google_api_key: str = ""
@@ -34,8 +50,38 @@ class Settings(BaseSettings):
     image_model: str = "gemini-2.5-flash-image"
     max_prompt_chars: int = 500
     max_paragraphs: int = 5
-    image_concurrency: int = 4
+    # Image calls in flight across ALL stories this process is generating. They
+    # queue in one scheduler, round-robin by story, with priority plans first.
+    image_concurrency: int = 16
+    # The same ceiling across every worker, coordinated through Redis leases.
+    # 0 leaves each process to its own ceiling. Only used with JOB_BACKEND=arq.
+    image_concurrency_cluster: int = 0
     generation_call_timeout_seconds: int = 120
+    # Upper bound of the adaptive window shared by every Gemini call in a
+    # process. Throttling halves the window; successes grow it back to this.
+    provider_max_concurrency: int = 16
+    # Illustration results are written in batches rather than one transaction
+    # per image: a flush happens once this many are waiting, or this long after
+    # the first of them, whichever comes first. Progress lags by at most the window.
+    progress_flush_seconds: float = 0.5
+    progress_flush_batch: int = 4
+    # Save each scene and start its illustration as soon as the provider has
+    # written it, instead of waiting for the whole draft. Providers without a
+    # real stream fall back to the whole draft, so this is always safe to set.
+    stream_story_text: bool = False
+    # Illustrations are cached per family by what fully determines them (the
+    # built prompt and the image model), so a failed story asked for again or a
+    # repeated scene costs nothing. Least recently used entries are evicted
+    # past this many MB across all families; 0 turns the cache off.
+    illustration_cache_max_mb: int = 512
+    # Stored illustrations are re-encoded for display and given 3:2 thumbnails
+    # (see services/imaging.py). "avif" falls back to "webp" where Pillow
+    # cannot write it.
+    image_display_format: Literal["webp", "avif"] = "webp"
+    image_quality: int = 80
+    # Processes for CPU-bound work such as image encoding; 0 runs it in a
+    # thread instead, which still blocks the event loop while Pillow holds the GIL.
+    cpu_pool_workers: int = 2
 
     # --- Database pool (ignored for SQLite) ---
     db_pool_size: int = 10
@@ -51,10 +97,24 @@ class Settings(BaseSettings):
     s3_access_key_id: str = ""
     s3_secret_access_key: str = ""
     s3_public_base_url: str = ""
+    # Connections in the shared S3 client's pool: the ceiling on concurrent
+    # uploads and reads per process. botocore's default of 10 queues a single
+    # story's renditions behind each other.
+    s3_max_pool_connections: int = 32
+    # Objects above this go up as concurrent multipart parts of this size.
+    s3_multipart_threshold_mb: int = 8
+    # Private objects that are never handed to a browser (cached illustrations,
+    # rendered files). Empty means a directory beside MEDIA_ROOT, outside the
+    # /media mount, and the same bucket as images under an "artifacts/" prefix.
+    artifact_root: str = ""
+    s3_artifact_bucket: str = ""
 
     # --- Limits / quotas ---
     rate_limit_enabled: bool = True
     rate_limit_generate_per_hour: int = 10  # per user
+    # Single-page illustration redraws allowed per story, on top of its first
+    # set of pictures. Each one is a paid image call the daily quota does not see.
+    illustration_redraws_per_story: int = 5
     rate_limit_auth_per_10min: int = 10  # per IP and per target email
     # Hard ceiling on any request body. Starlette has no default limit and the
     # body is fully buffered and parsed before a single field validator runs, so
@@ -109,6 +169,25 @@ class Settings(BaseSettings):
     # built-in list (vendored assets, the Noto path in the Linux image, and
     # the Windows font folder on a dev box).
     pdf_font_dirs: str = ""
+    # Bind each book in the generation job's finalizing stage and store it, so
+    # the first download is a storage read rather than a render in the API
+    # process. Off by default: with JOB_BACKEND=inline the job runs in the API
+    # process anyway, and the stage would only delay "done".
+    pdf_prerender: bool = False
+    # Books render in a process pool of their own (services/pdf_renderer.py);
+    # 0 renders in a thread, one at a time. Beyond the renders running, at most
+    # PDF_RENDER_QUEUE wait; the rest get a 503 with Retry-After.
+    pdf_render_workers: int = 2
+    pdf_render_queue: int = 8
+    # Resolution illustrations are resampled to for the page they are printed
+    # on. 150 is sharp on any screen at a fraction of the bytes; print wants 300.
+    pdf_image_dpi: int = 150
+    # Print exports (POST /api/exports) render in the background at this DPI,
+    # upscaling the stored pictures. With an ICC output profile from the print
+    # vendor (a .icc path), pictures are separated to CMYK; without one they
+    # stay sRGB for the vendor's own conversion.
+    pdf_print_dpi: int = 300
+    pdf_print_icc_profile: str = ""
 
     # --- CORS (empty = same-origin only, no CORS needed) ---
     cors_origins: str = ""
@@ -118,6 +197,8 @@ class Settings(BaseSettings):
     sentry_dsn: str = ""
     log_level: str = "INFO"
     log_format: Literal["json", "text"] = "text"  # compose sets json in production
+    # Bearer token for GET /api/metrics. Empty keeps the endpoint a 404.
+    metrics_token: str = ""
 
     # --- Email (console prints the message to the log; no credentials needed) ---
     email_backend: Literal["console", "smtp"] = "console"
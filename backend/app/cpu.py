@@ -0,0 +1,96 @@
+"""Process pools for CPU-bound work: image encoding, PDF rendering, anything Pillow-heavy.
+
+asyncio.to_thread keeps blocking I/O off the event loop, but not CPU work:
+encoding holds the GIL for long stretches, so a thread still starves every
+request in the process. Work sent here runs in separate processes instead.
+
+Functions must be importable module-level callables with picklable arguments
+and results. Workers are spawned, not forked: forking a process with a running
+event loop and open sockets copies both into a child that must never use them.
+
+CPU_POOL_WORKERS=0 runs the same calls in a thread, for platforms where extra
+processes are unwelcome.
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class CpuPool:
+    """A lazily started process pool that replaces itself when a worker dies.
+
+    workers is read when the pool starts, so a setting changed in a test or a
+    reload applies from the next pool. initializer runs once in each worker,
+    e.g. to parse what every task would otherwise load for itself.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        workers: Callable[[], int],
+        *,
+        initializer: Callable[[], None] | None = None,
+    ) -> None:
+        self.name = name
+        self._workers = workers
+        self._initializer = initializer
+        self._pool: ProcessPoolExecutor | None = None
+
+    def _get(self) -> ProcessPoolExecutor | None:
+        workers = self._workers()
+        if workers <= 0:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self._initializer,
+                # Pillow's allocator holds on to what a large image needed; a
+                # recycled worker gives it back.
+                max_tasks_per_child=200,
+            )
+        return self._pool
+
+    async def run(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Any:
+        """Run fn(*args, **kwargs) in the pool and await its result."""
+        pool = self._get()
+        call = functools.partial(fn, *args, **kwargs)
+        if pool is None:
+            return await asyncio.to_thread(call)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, call)
+        except BrokenProcessPool:
+            # A worker died (usually the OOM killer). The executor refuses all
+            # further work once broken, so replace it for the next caller.
+            logger.error("%s pool broke; starting a new one", self.name)
+            if self._pool is pool:
+                self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+_cpu = CpuPool("CPU", lambda: get_settings().cpu_pool_workers)
+
+
+async def run_cpu(fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Any:
+    """Run fn(*args, **kwargs) in the shared CPU pool and await its result."""
+    return await _cpu.run(fn, *args, **kwargs)
+
+
+def shutdown_cpu_pool() -> None:
+    _cpu.shutdown()
@@ -6,7 +6,8 @@ from fastapi import Depends, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .db import get_db
+from . import kv
+from .db import get_db, get_session_factory
 from .errors import CodedHTTPException
 from .models import User
 from .security import decode_access_token
@@ -16,10 +17,7 @@ _bearer = HTTPBearer(auto_error=False)
 DbSession = Annotated[AsyncSession, Depends(get_db)]
 
 
-async def get_current_user(
-    db: DbSession,
-    credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(_bearer)],
-) -> User:
+def _token_payload(credentials: HTTPAuthorizationCredentials | None) -> tuple[str, dict]:
     if credentials is None:
         raise CodedHTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -34,6 +32,14 @@ async def get_current_user(
             code="auth.token_invalid",
             detail="Invalid or expired token",
         )
+    return user_id, payload
+
+
+async def get_current_user(
+    db: DbSession,
+    credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(_bearer)],
+) -> User:
+    user_id, payload = _token_payload(credentials)
     user = await db.get(User, user_id)
     if user is None:
         raise CodedHTTPException(
@@ -54,3 +60,48 @@ async def get_current_user(
 
 
 CurrentUser = Annotated[User, Depends(get_current_user)]
+
+
+# A user's token version, copied into the shared cache. Whatever bumps it or
+# deletes the user drops the copy (forget_token_version); the TTL bounds the
+# one race left, a miss reading the old version just before a bump.
+_TOKEN_VERSION_TTL = 60
+
+
+def _token_version_key(user_id: str) -> str:
+    return f"user-ver:{user_id}"
+
+
+async def forget_token_version(user_id: str) -> None:
+    await kv.delete(_token_version_key(user_id))
+
+
+async def get_current_user_id(
+    credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(_bearer)],
+) -> str:
+    """The caller's id, for hot endpoints that need nothing else about them.
+    The same rules as get_current_user, with the token version read from the
+    shared cache, so a poll authenticates without a database read."""
+    user_id, payload = _token_payload(credentials)
+    version = await kv.get(_token_version_key(user_id))
+    if version is None:
+        async with get_session_factory()() as session:
+            user = await session.get(User, user_id)
+        if user is None:
+            raise CodedHTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                code="auth.user_gone",
+                detail="User no longer exists",
+            )
+        version = str(user.token_version)
+        await kv.put(_token_version_key(user_id), version, ttl=_TOKEN_VERSION_TTL)
+    if str(payload.get("ver")) != version:
+        raise CodedHTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            code="auth.session_ended",
+            detail="This session has ended. Please log in again.",
+        )
+    return user_id
+
+
+CurrentUserId = Annotated[str, Depends(get_current_user_id)]
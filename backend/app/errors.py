@@ -79,3 +79,5 @@ GENERATION_STALLED = "generation.stalled"
 # the advice differs: this one is fixable by the parent, and the fix ("try a
 # gentler idea") is the whole value of the message.
 GENERATION_BLOCKED = "generation.blocked"
+# A print export failed or its worker vanished. Asking again starts a new one.
+EXPORT_FAILED = "export.failed"
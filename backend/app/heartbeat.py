@@ -0,0 +1,179 @@
+"""Worker heartbeats: each ARQ worker process says every few seconds that it
+is alive, and what it is doing.
+
+A beat is a small JSON record in the shared cache (app.kv) under
+worker-beat:{id}: the worker's id, host and pid, the jobs it is running, when
+one of them last made progress, and how late its event loop woke for this beat.
+A loop wedged by CPU-bound work or a blocking call beats late, then not at all.
+Beats expire after MISSED_BEATS intervals, so a worker that was killed, or is
+wedged, simply disappears.
+
+Jobs a worker takes are stamped with its id (worker_id on the job rows). The
+reaper fails stamped jobs whose worker has no beat within seconds, instead of
+waiting STALE_AFTER for updated_at to age. A worker shutting down cleanly
+clears its stamps first: ARQ runs the jobs it cancelled again, and the re-run
+must find them still running to resume them.
+
+Read the beats with `python -m app.heartbeat` (the compose healthcheck) or
+GET /api/health/workers.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import secrets
+import socket
+import sys
+from collections.abc import Iterator
+from contextlib import contextmanager, suppress
+from datetime import UTC, datetime
+
+from sqlalchemy import update
+
+from . import kv, metrics
+from .config import get_settings
+from .db import get_session_factory
+from .models import ExportJob, GenerationJob
+
+logger = logging.getLogger(__name__)
+
+_PREFIX = "worker-beat:"
+MISSED_BEATS = 3
+
+_worker_id = ""
+_started_at = ""
+_jobs: set[str] = set()
+_last_progress: datetime | None = None
+_loop_lag = 0.0
+_task: asyncio.Task | None = None
+
+
+def worker_id() -> str:
+    """This process's id while it beats; "" in one that does not (the API)."""
+    return _worker_id
+
+
+def beat_ttl() -> float:
+    """Seconds after its last beat that a worker counts as gone."""
+    return MISSED_BEATS * get_settings().worker_heartbeat_seconds
+
+
+@contextmanager
+def running(job: str) -> Iterator[None]:
+    """Report job (e.g. "story:<id>") in this worker's beats while it runs."""
+    _jobs.add(job)
+    progressed()
+    try:
+        yield
+    finally:
+        _jobs.discard(job)
+
+
+def progressed() -> None:
+    """A job in this process moved forward. Beats report when this last happened."""
+    global _last_progress
+    _last_progress = datetime.now(UTC)
+
+
+def _beat() -> dict:
+    return {
+        "worker_id": _worker_id,
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+        "started_at": _started_at,
+        "beat_at": datetime.now(UTC).isoformat(),
+        "jobs": sorted(_jobs),
+        "last_progress_at": _last_progress.isoformat() if _last_progress else None,
+        "loop_lag_ms": round(_loop_lag * 1000, 1),
+    }
+
+
+async def _write() -> None:
+    await kv.put(_PREFIX + _worker_id, json.dumps(_beat()), ttl=math.ceil(beat_ttl()))
+
+
+async def _run(interval: float) -> None:
+    global _loop_lag
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        _loop_lag = max(0.0, loop.time() - started - interval)
+        metrics.set_gauge("worker_loop_lag_seconds", _loop_lag)
+        await _write()
+
+
+async def start_heartbeat() -> None:
+    """Begin beating. The first beat is written before this returns, so no job
+    can be stamped with an id the reaper has never seen alive."""
+    global _worker_id, _started_at, _task
+    # The random part keeps a restarted container (same host, pid 1 again)
+    # from reviving the claims of the process it replaced.
+    _worker_id = f"{socket.gethostname()}-{os.getpid()}-{secrets.token_hex(3)}"
+    _started_at = datetime.now(UTC).isoformat()
+    await _write()
+    _task = asyncio.create_task(_run(get_settings().worker_heartbeat_seconds))
+    logger.info("Worker heartbeat started", extra={"worker_id": _worker_id})
+
+
+async def stop_heartbeat() -> None:
+    """Stop beating after a clean shutdown. Call it once this process's jobs
+    have been cancelled: their stamps are cleared so ARQ's re-run resumes them
+    (run_generation from its checkpoint, run_export from the start)."""
+    global _worker_id, _task
+    if not _worker_id:
+        return
+    if _task is not None:
+        _task.cancel()
+        with suppress(asyncio.CancelledError):
+            await _task
+        _task = None
+    try:
+        async with get_session_factory()() as session:
+            for model in (GenerationJob, ExportJob):
+                await session.execute(
+                    update(model)
+                    .where(model.worker_id == _worker_id, model.status.in_(("queued", "running")))
+                    .values(worker_id="")
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+    except Exception:
+        # Left stamped, the jobs are failed once the beat expires, which is
+        # where an unclean stop leaves them anyway.
+        logger.exception("Could not release this worker's jobs")
+    await kv.delete(_PREFIX + _worker_id)
+    _worker_id = ""
+
+
+async def beats() -> list[dict]:
+    """The latest beat of every live worker, by worker id. Raises when the
+    shared cache cannot be read, rather than reporting no workers."""
+    return sorted(
+        (json.loads(raw) for raw in (await kv.scan(_PREFIX)).values()), key=lambda b: b["worker_id"]
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Print the live ARQ workers' heartbeats.")
+    parser.add_argument(
+        "--local", action="store_true", help="only this host's workers; exit 1 when none is beating"
+    )
+    args = parser.parse_args(argv)
+    try:
+        found = asyncio.run(beats())
+    except Exception as e:
+        print(f"Could not read worker heartbeats: {e}", file=sys.stderr)
+        return 2
+    if args.local:
+        found = [b for b in found if b["host"] == socket.gethostname()]
+    for beat in found:
+        print(json.dumps(beat))
+    return 0 if found or not args.local else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
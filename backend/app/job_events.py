@@ -0,0 +1,156 @@
+"""Job progress pushed to clients instead of polled.
+
+Each change to a generation job publishes a snapshot of it (the JobOut
+fields), and GET /api/jobs/{id}/events streams those snapshots as
+Server-Sent Events. A client that used to ask every 1.2s, paying for auth, a
+join and a stale check each time, now makes one request per generation.
+
+With JOB_BACKEND=arq jobs run in the worker, so snapshots travel over Redis
+pub/sub on one channel per job. Each API process holds a single pattern
+subscription, not one per stream, and fans messages out to its own listeners.
+Inline, the publisher and the listeners share a process and nothing leaves it.
+
+Pub/sub delivers at most once: a message sent while the subscription was
+reconnecting is gone. Streams therefore re-read the job on every heartbeat,
+so a lost message delays an update by one heartbeat, never for good.
+
+The same snapshot, with the job's owner and when it was written, is kept in
+the shared cache (app.kv), so a poll of GET /api/jobs/{id} or a heartbeat is
+answered without Postgres. Every write to a job's row either replaces the
+snapshot or drops it; a job with no snapshot is read from the database.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime
+
+from . import kv
+from .config import get_settings
+from .models import GenerationJob
+from .schemas import JobOut
+
+logger = logging.getLogger(__name__)
+
+_CHANNEL = "job-events:"
+# Long enough to outlive any generation between two updates; a running job
+# refreshes it with every change.
+_SNAPSHOT_TTL = 3600
+
+
+def snapshot(job: GenerationJob) -> dict:
+    return JobOut.model_validate(job).model_dump()
+
+
+def event_id(snap: dict) -> str:
+    """Names a state, not a message: every event is the whole job, so a client
+    that reconnects with the id it last saw only needs the state if it differs."""
+    return f"{snap['status']}.{snap['stage']}.{snap['progress_current']}.{snap['progress_total']}"
+
+
+class _Hub:
+    """Listeners in this process, by job id."""
+
+    def __init__(self) -> None:
+        self._listeners: dict[str, set[asyncio.Queue]] = {}
+        self._reader: asyncio.Task | None = None
+
+    def dispatch(self, job_id: str, snap: dict) -> None:
+        for queue in self._listeners.get(job_id, ()):
+            queue.put_nowait(snap)
+
+    @contextlib.asynccontextmanager
+    async def listen(self, job_id: str) -> AsyncIterator[asyncio.Queue]:
+        if get_settings().job_backend == "arq" and (self._reader is None or self._reader.done()):
+            self._reader = asyncio.create_task(self._read())
+        queue: asyncio.Queue = asyncio.Queue()
+        self._listeners.setdefault(job_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            listeners = self._listeners.get(job_id)
+            if listeners is not None:
+                listeners.discard(queue)
+                if not listeners:
+                    del self._listeners[job_id]
+
+    async def _read(self) -> None:
+        while True:
+            pubsub = None
+            try:
+                pubsub = (await kv.get_redis()).pubsub()
+                await pubsub.psubscribe(_CHANNEL + "*")
+                async for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self.dispatch(message["channel"].removeprefix(_CHANNEL), json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Job event subscription lost; resubscribing: %s", e)
+                await asyncio.sleep(1)
+            finally:
+                if pubsub is not None:
+                    with contextlib.suppress(Exception):
+                        await pubsub.aclose()
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._reader
+            self._reader = None
+
+
+_hub = _Hub()
+
+
+def listen(job_id: str):
+    """Async context manager yielding a queue of the job's snapshots."""
+    return _hub.listen(job_id)
+
+
+async def publish_job(job: GenerationJob, owner_id: str = "") -> None:
+    """Announce the job's current state and cache it for polls. Never raises:
+    the database is the record, and a stream that misses this catches up on
+    its next heartbeat. Without owner_id the snapshot cannot be checked
+    against a caller, so the cached one is dropped instead of left behind."""
+    snap = snapshot(job)
+    if owner_id:
+        record = {**snap, "user_id": owner_id, "written_at": datetime.now(UTC).isoformat()}
+        await kv.put(_snapshot_key(job.id), json.dumps(record), ttl=_SNAPSHOT_TTL)
+    else:
+        await forget_jobs(job.id)
+    if get_settings().job_backend != "arq":
+        _hub.dispatch(job.id, snap)
+        return
+    try:
+        await (await kv.get_redis()).publish(_CHANNEL + job.id, json.dumps(snap))
+    except Exception as e:
+        logger.warning("Could not publish progress of job %s: %s", job.id, e)
+
+
+def _snapshot_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+async def cached_job(job_id: str) -> dict | None:
+    """The job's last published snapshot, with "user_id" (its owner) and
+    "written_at" (an aware datetime), or None when there is none."""
+    raw = await kv.get(_snapshot_key(job_id))
+    if raw is None:
+        return None
+    record = json.loads(raw)
+    record["written_at"] = datetime.fromisoformat(record["written_at"])
+    return record
+
+
+async def forget_jobs(*job_ids: str) -> None:
+    """Drop cached snapshots, for writes that have no owner to hand or that
+    change rows in bulk."""
+    await kv.delete(*(_snapshot_key(job_id) for job_id in job_ids))
+
+
+async def close_job_events() -> None:
+    await _hub.close()
@@ -2,12 +2,31 @@
 
 import asyncio
 import logging
+import time
 
+from . import metrics
 from .config import get_settings
-from .services.pipeline import run_generation
+from .reaper import STALE_AFTER
+from .services.exports import run_export
+from .services.pipeline import regenerate_illustration, run_generation
 
 logger = logging.getLogger(__name__)
 
+# Generations are split by plan. "standard" is ARQ's default queue, so redraws,
+# exports and anything enqueued before the split land where they always did.
+# Plans with priority generation get a queue of their own, drained by worker
+# slots that free stories cannot take (WORKER_PRIORITY_JOBS, see worker.py).
+STANDARD_QUEUE = "arq:queue"
+PRIORITY_QUEUE = "arq:queue:priority"
+QUEUES = {"priority": PRIORITY_QUEUE, "standard": STANDARD_QUEUE}
+# stories-waiting:{queue}: the stories enqueued there that no worker has
+# taken yet, scored by when they were enqueued. ARQ's own queue cannot say
+# this cheaply: it keeps a job until it finishes, and redraws and exports
+# share the standard queue.
+_WAITING = "stories-waiting:"
+# Standard-queue jobs each worker process runs at once (worker.py max_jobs).
+STANDARD_JOBS_PER_WORKER = 8
+
 _arq_pool = None
 _inline_tasks: set[asyncio.Task] = set()  # keep refs so tasks aren't garbage-collected
 
@@ -22,12 +41,27 @@ async def _get_arq_pool():
     return _arq_pool
 
 
-async def enqueue_generation(story_id: str) -> None:
+def queue_for(*, priority: bool) -> str:
+    """The queue a story goes to: "priority" or "standard". With no priority
+    slots configured nothing would drain the priority queue."""
+    return "priority" if priority and get_settings().worker_priority_jobs > 0 else "standard"
+
+
+def slots_per_worker(queue: str) -> int:
+    return get_settings().worker_priority_jobs if queue == "priority" else STANDARD_JOBS_PER_WORKER
+
+
+async def enqueue_generation(story_id: str, *, priority: bool = False) -> None:
+    """priority comes from the owner's plan. Inline there is one process and
+    no queue, and the image scheduler already serves priority plans first."""
     settings = get_settings()
     if settings.job_backend == "arq":
+        queue = queue_for(priority=priority)
         pool = await _get_arq_pool()
-        await pool.enqueue_job("generate_story", story_id)
-        logger.info("Enqueued story %s on ARQ", story_id)
+        await pool.enqueue_job("generate_story", story_id, _queue_name=QUEUES[queue])
+        await pool.zadd(_WAITING + queue, {story_id: time.time()})
+        metrics.incr("jobs_enqueued_total", queue=queue)
+        logger.info("Enqueued story %s on the %s queue", story_id, queue)
     else:
         task = asyncio.create_task(run_generation(story_id))
         _inline_tasks.add(task)
@@ -35,6 +69,61 @@ async def enqueue_generation(story_id: str) -> None:
         logger.info("Started inline generation for story %s", story_id)
 
 
+async def enqueue_illustration(story_id: str, position: int) -> None:
+    settings = get_settings()
+    if settings.job_backend == "arq":
+        pool = await _get_arq_pool()
+        await pool.enqueue_job("regenerate_illustration", story_id, position)
+        logger.info("Enqueued redraw of page %d of story %s on ARQ", position, story_id)
+    else:
+        task = asyncio.create_task(regenerate_illustration(story_id, position))
+        _inline_tasks.add(task)
+        task.add_done_callback(_inline_tasks.discard)
+        logger.info("Started inline redraw of page %d of story %s", position, story_id)
+
+
+async def enqueue_export(export_id: str) -> None:
+    settings = get_settings()
+    if settings.job_backend == "arq":
+        pool = await _get_arq_pool()
+        await pool.enqueue_job("export_book", export_id)
+        logger.info("Enqueued export %s on ARQ", export_id)
+    else:
+        task = asyncio.create_task(run_export(export_id))
+        _inline_tasks.add(task)
+        task.add_done_callback(_inline_tasks.discard)
+        logger.info("Started inline export %s", export_id)
+
+
+async def story_started(redis, queue: str, story_id: str) -> None:
+    """A worker took a story off queue: it no longer waits there. redis is the
+    worker's own connection. Idempotent, so a re-delivery changes nothing."""
+    try:
+        await redis.zrem(_WAITING + queue, story_id)
+    except Exception as e:
+        # It ages out of the count with STALE_AFTER.
+        logger.warning("Could not mark story %s started: %s", story_id, e)
+
+
+async def queue_depths() -> dict[str, tuple[int, float]]:
+    """Per queue: stories waiting, and how long the oldest of them has waited
+    in seconds. A few O(log n) reads per queue, however long the backlog. A
+    story still waiting after STALE_AFTER has been failed by the reaper (or its
+    job lost), so it is dropped from the count here."""
+    pool = await _get_arq_pool()
+    now = time.time()
+    depths: dict[str, tuple[int, float]] = {}
+    for name in QUEUES:
+        key = _WAITING + name
+        async with pool.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(key, "-inf", now - STALE_AFTER.total_seconds())
+            pipe.zcard(key)
+            pipe.zrange(key, 0, 0, withscores=True)
+            _, depth, oldest = await pipe.execute()
+        depths[name] = (depth, max(0.0, now - oldest[0][1]) if oldest else 0.0)
+    return depths
+
+
 async def close_job_pool() -> None:
     global _arq_pool
     if _arq_pool is not None:
@@ -0,0 +1,105 @@
+"""Short-lived shared values: Redis with JOB_BACKEND=arq, this process otherwise.
+
+For state that a hot read path would rather not ask Postgres for (a job's
+progress, a user's token version). Everything kept here is a copy of a row,
+written by whoever changes the row and dropped when it cannot be kept right,
+so a miss or an error only ever means "read the database", never a wrong answer.
+
+Inline, the worker and the API are one process and a dict is exact. It is
+bounded, oldest first, since nothing else ever removes entries from it.
+"""
+
+import logging
+import time
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_LOCAL_MAX_ENTRIES = 4096
+_local: dict[str, tuple[float, str]] = {}
+_redis = None
+
+
+def _shared() -> bool:
+    return get_settings().job_backend == "arq"
+
+
+async def get_redis():
+    """The process's Redis client, strings in and out. For what the functions
+    below do not cover: counters, sorted sets, pub/sub."""
+    global _redis
+    if _redis is None:
+        import redis.asyncio as aioredis
+
+        _redis = aioredis.from_url(get_settings().redis_url, decode_responses=True)
+    return _redis
+
+
+async def close_redis() -> None:
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
+
+
+async def get(key: str) -> str | None:
+    if not _shared():
+        entry = _local.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+    try:
+        return await (await get_redis()).get(key)
+    except Exception as e:
+        logger.warning("Shared cache read of %s failed: %s", key, e)
+        return None
+
+
+async def put(key: str, value: str, *, ttl: int) -> None:
+    if not _shared():
+        _local.pop(key, None)
+        while len(_local) >= _LOCAL_MAX_ENTRIES:
+            del _local[next(iter(_local))]
+        _local[key] = (time.monotonic() + ttl, value)
+        return
+    try:
+        await (await get_redis()).set(key, value, ex=ttl)
+    except Exception as e:
+        logger.warning("Shared cache write of %s failed: %s", key, e)
+
+
+async def delete(*keys: str) -> None:
+    if not keys:
+        return
+    if not _shared():
+        for key in keys:
+            _local.pop(key, None)
+        return
+    try:
+        await (await get_redis()).delete(*keys)
+    except Exception as e:
+        logger.warning("Shared cache delete failed: %s", e)
+
+
+async def scan(prefix: str) -> dict[str, str]:
+    """Every live entry whose key starts with prefix. Unlike the rest, raises
+    when Redis cannot be read: an empty answer would mean "there are none"."""
+    if not _shared():
+        now = time.monotonic()
+        return {
+            key: value
+            for key, (expires, value) in _local.items()
+            if key.startswith(prefix) and expires >= now
+        }
+    redis = await get_redis()
+    keys = [key async for key in redis.scan_iter(match=prefix + "*", count=500)]
+    if not keys:
+        return {}
+    # A key can expire between the scan and the read.
+    return {key: value for key, value in zip(keys, await redis.mget(keys), strict=True) if value is not None}
+
+
+def reset_kv() -> None:
+    """Test helper."""
+    _local.clear()
@@ -11,7 +11,7 @@ import logging
 import mimetypes
 import os
 import re
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -21,8 +21,10 @@ from fastapi.staticfiles import StaticFiles
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
+from . import kv
 from .billing_guard import validate_billing_settings
 from .config import get_settings
+from .cpu import shutdown_cpu_pool
 from .db import dispose_engine, init_db
 from .deps import DbSession
 from .errors import (
@@ -30,11 +32,15 @@ from .errors import (
     CodedHTTPException,
     coded_exception_handler,
 )
+from .job_events import close_job_events
 from .jobs import close_job_pool
 from .models import Story
 from .observability import CorrelationMiddleware, configure_logging
-from .quota import close_redis
-from .routers import auth, health, jobs, plans, profiles, stories
+from .reaper import run_reaper
+from .routers import auth, exports, health, jobs, plans, profiles, stories
+from .services.pdf import warm_fonts
+from .services.pdf_renderer import shutdown_pdf_renderer
+from .storage import close_storage
 
 configure_logging()
 logger = logging.getLogger(__name__)
@@ -49,6 +55,8 @@ FRONTEND_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", ".
 mimetypes.add_type("text/javascript", ".js")
 mimetypes.add_type("text/css", ".css")
 mimetypes.add_type("image/svg+xml", ".svg")
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
 
 
 def validate_production_settings(settings) -> None:
@@ -142,6 +150,17 @@ async def lifespan(app: FastAPI):
                 )
             )
             await session.commit()
+        # Inline there is no worker startup to do this.
+        from .services.illustration_cache import purge_shared_cache
+        from .storage import get_storage
+
+        await purge_shared_cache(get_storage())
+    # With ARQ the worker's cron runs the reaper; inline, nothing else would.
+    reaper_task = asyncio.create_task(run_reaper()) if settings.job_backend == "inline" else None
+    if settings.pdf_render_workers <= 0:
+        # Parse the PDF fonts before the first download has to. Renderer pool
+        # processes parse their own as they start.
+        await asyncio.to_thread(warm_fonts)
     logger.info(
         "KathaSajha up (env=%s, provider=%s, jobs=%s, storage=%s)",
         settings.environment,
@@ -150,9 +169,17 @@ async def lifespan(app: FastAPI):
         settings.storage_backend,
     )
     yield
+    if reaper_task is not None:
+        reaper_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await reaper_task
     await close_job_pool()
-    await close_redis()
+    await close_job_events()
+    await kv.close_redis()
     await dispose_engine()
+    await close_storage()
+    shutdown_cpu_pool()
+    shutdown_pdf_renderer()
 
 
 _SOCIAL_START = "<!--SOCIAL_META_START-->"
@@ -384,6 +411,7 @@ def create_app() -> FastAPI:
     app.include_router(auth.router)
     app.include_router(stories.router)
     app.include_router(jobs.router)
+    app.include_router(exports.router)
     app.include_router(plans.router)
     app.include_router(profiles.router)
     if settings.billing_enabled:
@@ -430,7 +458,9 @@ def create_app() -> FastAPI:
                 return HTMLResponse(shell)  # unknown slug: the SPA renders its own 404
 
             base = (get_settings().public_base_url or str(request.base_url)).rstrip("/")
-            cover = next((p.image_url for p in story.pages if p.image_url), "")
+            # The JPEG cover rendition where there is one: crawlers that
+            # cannot read WebP would otherwise show a link with no picture.
+            cover = next((p.thumb_cover_url or p.image_url for p in story.pages if p.image_url), "")
             opening = story.pages[0].text if story.pages else ""
             tags = _social_tags(
                 title=story.title or "A story from KathaSajha",
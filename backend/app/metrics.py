@@ -0,0 +1,50 @@
+"""In-process counters and gauges.
+
+Deliberately tiny. Every process (API replica, worker) keeps its own numbers
+and reports them at /api/metrics in Prometheus text format; adding them up
+across processes is the scraper's job. No client library: the values are
+plain floats in a dict, and one event loop per process means no locking.
+
+The endpoint is dormant until METRICS_TOKEN is set, same pattern as billing.
+"""
+
+_counters: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+_gauges: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+
+
+def _key(name: str, labels: dict[str, object]) -> tuple[str, tuple[tuple[str, str], ...]]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def incr(name: str, amount: float = 1.0, **labels: object) -> None:
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0.0) + amount
+
+
+def set_gauge(name: str, value: float, **labels: object) -> None:
+    _gauges[_key(name, labels)] = float(value)
+
+
+def value(name: str, **labels: object) -> float:
+    """Current value of one series; 0 for a series never touched."""
+    key = _key(name, labels)
+    return _counters.get(key, _gauges.get(key, 0.0))
+
+
+def render() -> str:
+    lines: list[str] = []
+    for kind, series in (("counter", _counters), ("gauge", _gauges)):
+        typed: set[str] = set()
+        for (name, labels), v in sorted(series.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} {kind}")
+                typed.add(name)
+            label_text = ",".join(f'{k}="{val}"' for k, val in labels)
+            lines.append(f"{name}{{{label_text}}} {v:g}" if label_text else f"{name} {v:g}")
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    """Test helper."""
+    _counters.clear()
+    _gauges.clear()
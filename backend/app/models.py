@@ -1,7 +1,7 @@
 """Database models."""
 
 import uuid
-from datetime import UTC, datetime
+from datetime import UTC, datetime, timedelta
 
 from sqlalchemy import (
     Boolean,
@@ -26,6 +26,10 @@ def utcnow() -> datetime:
     return datetime.now(UTC)
 
 
+# A redraw requested longer ago than this is presumed lost with its worker.
+IMAGE_REDRAW_STALE_AFTER = timedelta(minutes=15)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -226,6 +230,8 @@ class Story(Base):
     error_code: Mapped[str] = mapped_column(String(40), default="", server_default="")
     share_slug: Mapped[str | None] = mapped_column(String(32), unique=True, nullable=True, index=True)
     provider: Mapped[str] = mapped_column(String(20), default="")
+    # Single-page redraws requested so far; bounded by ILLUSTRATION_REDRAWS_PER_STORY.
+    image_redraws: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, index=True)
 
     owner: Mapped["User"] = relationship(back_populates="stories")
@@ -235,6 +241,7 @@ class Story(Base):
     job: Mapped["GenerationJob | None"] = relationship(
         back_populates="story", cascade="all, delete-orphan", uselist=False
     )
+    exports: Mapped[list["ExportJob"]] = relationship(back_populates="story", cascade="all, delete-orphan")
 
     __table_args__ = (
         UniqueConstraint("id", "user_id", name="uq_story_owner"),
@@ -253,10 +260,27 @@ class StoryPage(Base):
     text: Mapped[str] = mapped_column(Text)
     image_prompt: Mapped[str] = mapped_column(Text, default="")
     image_url: Mapped[str] = mapped_column(String(500), default="")  # empty = no image
+    # Fixed-size 3:2 renditions of the same picture; empty when there is no
+    # image or it predates thumbnails (clients fall back to image_url).
+    thumb_cover_url: Mapped[str] = mapped_column(String(500), default="", server_default="")
+    thumb_grid_url: Mapped[str] = mapped_column(String(500), default="", server_default="")
     image_error: Mapped[str] = mapped_column(Text, default="")
+    # Set while a single-page redraw is queued or running; None otherwise.
+    # A timestamp rather than a flag so a redraw whose worker died stops
+    # blocking the page once it is old enough to be presumed lost.
+    image_requested_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
     story: Mapped[Story] = relationship(back_populates="pages")
 
+    @property
+    def image_pending(self) -> bool:
+        requested = self.image_requested_at
+        if requested is None:
+            return False
+        if requested.tzinfo is None:  # SQLite returns naive datetimes
+            requested = requested.replace(tzinfo=UTC)
+        return utcnow() - requested < IMAGE_REDRAW_STALE_AFTER
+
     __table_args__ = (UniqueConstraint("story_id", "position", name="uq_page_story_position"),)
 
 
@@ -275,7 +299,42 @@ class GenerationJob(Base):
     progress_total: Mapped[int] = mapped_column(Integer, default=0)
     error: Mapped[str] = mapped_column(Text, default="")
     error_code: Mapped[str] = mapped_column(String(40), default="", server_default="")
+    # The last stage whose output is durable, so a re-run of this job resumes
+    # after it instead of paying for it again. "" = nothing yet;
+    # "story_written" = title, pages and the text's usage are all committed.
+    checkpoint: Mapped[str] = mapped_column(String(40), default="", server_default="")
+    # The worker process running the job (app.heartbeat), "" when none is
+    # known. Its heartbeats stopping is what fails the job early.
+    worker_id: Mapped[str] = mapped_column(String(64), default="", server_default="")
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
 
     story: Mapped[Story] = relationship(back_populates="job")
+
+
+class ExportJob(Base):
+    """A book rendered for a purpose other than the screen (a print-on-demand
+    file), in the background and polled like a GenerationJob."""
+
+    __tablename__ = "export_jobs"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True, default=_uuid)
+    story_id: Mapped[str] = mapped_column(ForeignKey("stories.id", ondelete="CASCADE"), index=True)
+    profile: Mapped[str] = mapped_column(String(16), default="print")
+    # The story as the export saw it (services.pdf_cache.book_digest); names
+    # the file, and lets a repeat request reuse a finished or running export.
+    digest: Mapped[str] = mapped_column(String(64))
+    status: Mapped[str] = mapped_column(String(20), default="queued")
+    # queued -> running -> complete | failed
+    stage: Mapped[str] = mapped_column(String(50), default="queued")
+    # queued | rendering | saving | done | failed
+    progress_current: Mapped[int] = mapped_column(Integer, default=0)
+    progress_total: Mapped[int] = mapped_column(Integer, default=0)
+    size_bytes: Mapped[int] = mapped_column(Integer, default=0)
+    error: Mapped[str] = mapped_column(Text, default="")
+    error_code: Mapped[str] = mapped_column(String(40), default="")
+    worker_id: Mapped[str] = mapped_column(String(64), default="", server_default="")
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+
+    story: Mapped[Story] = relationship(back_populates="exports")
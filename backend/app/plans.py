@@ -31,6 +31,9 @@ class Plan:
     features: list[str] = field(default_factory=list)
     purchasable: bool = False
     highlight: bool = False
+    # Served first by the image scheduler. Must agree with `features`: this is
+    # what makes the "Priority generation" line true.
+    priority: bool = False
 
 
 # A subscription in any of these is live enough that a second one would
@@ -76,6 +79,7 @@ PLANS: dict[str, Plan] = {
         # the API until Stripe credentials and a price id exist.
         purchasable=True,
         highlight=True,
+        priority=True,
     ),
 }
 
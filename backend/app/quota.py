@@ -9,6 +9,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from .config import get_settings
 from .errors import CodedHTTPException
+from .kv import get_redis
 from .models import GenerationEvent, User
 from .plans import daily_stories_for, effective_plan_code, monthly_stories_for
 
@@ -17,17 +18,6 @@ logger = logging.getLogger(__name__)
 # Entitlements live in plans.py so the pricing page and the enforcement code can
 # never drift apart. An unknown plan string resolves to free, never to more.
 
-_redis = None
-
-
-async def _get_redis():
-    global _redis
-    if _redis is None:
-        import redis.asyncio as aioredis
-
-        _redis = aioredis.from_url(get_settings().redis_url, decode_responses=True)
-    return _redis
-
 
 def effective_plan_for(user: User) -> str:
     """The single place entitlement is decided. Every limit and every piece of
@@ -177,7 +167,7 @@ async def enforce_burst_limit(user: User) -> None:
     if not settings.rate_limit_enabled:
         return
     try:
-        r = await _get_redis()
+        r = await get_redis()
         hour = datetime.now(UTC).strftime("%Y%m%d%H")
         key = f"rl:gen:{user.id}:{hour}"
         count = await r.incr(key)
@@ -203,7 +193,7 @@ async def enforce_auth_attempt_limit(scope: str, identifier: str) -> None:
     if not settings.rate_limit_enabled:
         return
     try:
-        r = await _get_redis()
+        r = await get_redis()
         window = datetime.now(UTC).strftime("%Y%m%d%H%M")[:-1]  # 10-minute bucket
         key = f"rl:auth:{scope}:{identifier}:{window}"
         count = await r.incr(key)
@@ -219,10 +209,3 @@ async def enforce_auth_attempt_limit(scope: str, identifier: str) -> None:
         raise
     except Exception as e:
         logger.warning("Auth rate limiter unavailable, failing open: %s", e)
-
-
-async def close_redis() -> None:
-    global _redis
-    if _redis is not None:
-        await _redis.aclose()
-        _redis = None
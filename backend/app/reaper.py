@@ -0,0 +1,219 @@
+"""Stale-job reaper: fails jobs whose worker died, in the background.
+
+A queued or running job untouched for STALE_AFTER has lost its worker (a
+deploy, the OOM killer, a crashed inline task). The reaper fails those jobs
+and their stories, refunds the ledger entries, and fails stuck book exports,
+for every user at once in a few statements per batch. It runs every
+REAP_EVERY_SECONDS: as an ARQ cron job in the worker, or as a task in the API
+process with the inline backend.
+
+Reads used to do this themselves, which made every library refresh and story
+read a write transaction. Now they only read; a dead generation shows as
+running until the next sweep, at most a minute past STALE_AFTER.
+
+Jobs stamped with the worker running them need not wait that long:
+reap_orphaned_jobs fails those whose worker has stopped beating
+(app.heartbeat), and the ARQ worker runs it every few seconds.
+"""
+
+import asyncio
+import logging
+import math
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import ColumnElement, select, update
+
+from . import heartbeat, kv, metrics
+from .db import get_session_factory
+from .errors import EXPORT_FAILED, GENERATION_STALLED
+from .job_events import forget_jobs
+from .models import ExportJob, GenerationEvent, GenerationJob, Story
+
+logger = logging.getLogger(__name__)
+
+STALE_AFTER = timedelta(minutes=15)
+REAP_EVERY_SECONDS = 60
+# Jobs failed per transaction: a backlog after an outage is worked through in
+# short transactions rather than one that locks every row it touches.
+_BATCH = 500
+
+_ACTIVE = ("queued", "running")
+# worker-missing:{id}: when a sweep first found a stamped worker without a beat.
+_MISSING = "worker-missing:"
+
+
+def stale(status: str, last_touch: datetime) -> bool:
+    if status not in _ACTIVE:
+        return False
+    if last_touch.tzinfo is None:  # SQLite returns naive datetimes
+        last_touch = last_touch.replace(tzinfo=UTC)
+    return datetime.now(UTC) - last_touch > STALE_AFTER
+
+
+def is_stale(job: GenerationJob | ExportJob) -> bool:
+    return stale(job.status, job.updated_at or job.created_at)
+
+
+async def _reap_generations(*dead: ColumnElement[bool], message: str, reason: str) -> int:
+    reaped = 0
+    while True:
+        async with get_session_factory()() as session:
+            candidates = (
+                (
+                    await session.execute(
+                        select(GenerationJob.id).where(GenerationJob.status.in_(_ACTIVE), *dead).limit(_BATCH)
+                    )
+                )
+                .scalars()
+                .all()
+            )
+            if not candidates:
+                return reaped
+            # The test is repeated: a job that moved since the SELECT has a
+            # worker after all and is left alone.
+            failed = (
+                await session.execute(
+                    update(GenerationJob)
+                    .where(GenerationJob.id.in_(candidates), GenerationJob.status.in_(_ACTIVE), *dead)
+                    .values(status="failed", stage="failed", error=message, error_code=GENERATION_STALLED)
+                    .returning(GenerationJob.id, GenerationJob.story_id)
+                    .execution_options(synchronize_session=False)
+                )
+            ).all()
+            story_ids = [story_id for _, story_id in failed]
+            if story_ids:
+                await session.execute(
+                    update(Story)
+                    .where(Story.id.in_(story_ids), Story.status.in_(["pending", "generating"]))
+                    .values(status="failed", error=message, error_code=GENERATION_STALLED)
+                    .execution_options(synchronize_session=False)
+                )
+                # Our failure, so the user keeps the allowance.
+                await session.execute(
+                    update(GenerationEvent)
+                    .where(GenerationEvent.story_id.in_(story_ids), GenerationEvent.refunded.is_(False))
+                    .values(refunded=True, refund_reason=reason)
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+        await forget_jobs(*(job_id for job_id, _ in failed))
+        reaped += len(failed)
+        if len(candidates) < _BATCH:
+            return reaped
+
+
+async def _reap_exports(*dead: ColumnElement[bool], message: str) -> int:
+    async with get_session_factory()() as session:
+        result = await session.execute(
+            update(ExportJob)
+            .where(ExportJob.status.in_(_ACTIVE), *dead)
+            .values(
+                status="failed",
+                stage="failed",
+                error=message,
+                error_code=EXPORT_FAILED,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+    return result.rowcount
+
+
+def _record(generations: int, exports: int, reason: str) -> None:
+    if generations or exports:
+        metrics.incr("jobs_reaped_total", generations, kind="generation", reason=reason)
+        metrics.incr("jobs_reaped_total", exports, kind="export", reason=reason)
+        logger.warning(
+            "Failed %d generation(s) and %d export(s): %s",
+            generations,
+            exports,
+            reason,
+            extra={"reason": reason},
+        )
+
+
+async def reap_stale_jobs() -> int:
+    """One sweep. Returns how many jobs it failed."""
+    cutoff = datetime.now(UTC) - STALE_AFTER
+    generations = await _reap_generations(
+        GenerationJob.updated_at < cutoff,
+        message="Generation timed out. Please try again.",
+        reason="stale_timeout",
+    )
+    exports = await _reap_exports(
+        ExportJob.updated_at < cutoff, message="Preparing the book for print took too long. Please try again."
+    )
+    _record(generations, exports, "stale_timeout")
+    return generations + exports
+
+
+async def _missing_workers(live: list[str]) -> list[str]:
+    """Workers that stamped active jobs and have had no beat for a beat's
+    lifetime, as seen by the sweeps rather than by one of them.
+
+    A single sweep that finds no beat is not enough: a Redis restart, flush or
+    eviction drops every beat at once, and live workers only write theirs
+    again at their next interval. The first sweep to miss a worker notes when;
+    a later one that still misses it a beat's lifetime on counts it gone."""
+    async with get_session_factory()() as session:
+        stamped = set()
+        for model in (GenerationJob, ExportJob):
+            stamped.update(
+                (
+                    await session.execute(
+                        select(model.worker_id)
+                        .where(model.status.in_(_ACTIVE), model.worker_id != "", model.worker_id.not_in(live))
+                        .distinct()
+                    )
+                ).scalars()
+            )
+    ttl = heartbeat.beat_ttl()
+    now = datetime.now(UTC).timestamp()
+    gone = []
+    for worker in sorted(stamped):
+        since = await kv.get(_MISSING + worker)
+        if since is None:
+            await kv.put(_MISSING + worker, str(now), ttl=math.ceil(2 * ttl))
+        elif now - float(since) >= ttl:
+            gone.append(worker)
+    return gone
+
+
+async def reap_orphaned_jobs() -> int:
+    """Fail jobs whose worker has stopped beating. Returns how many it failed.
+
+    A job must also be untouched for a beat's lifetime: one written to just
+    now, by a worker whose beat is late rather than gone, waits for the next
+    sweep. When the beats cannot be read at all the sweep is skipped."""
+    try:
+        live = [beat["worker_id"] for beat in await heartbeat.beats()]
+    except Exception as e:
+        logger.warning("Worker heartbeats unreadable; orphaned-job sweep skipped: %s", e)
+        return 0
+    gone = await _missing_workers(live)
+    if not gone:
+        return 0
+    cutoff = datetime.now(UTC) - timedelta(seconds=heartbeat.beat_ttl())
+    generations = await _reap_generations(
+        GenerationJob.worker_id.in_(gone),
+        GenerationJob.updated_at < cutoff,
+        message="Generation stopped unexpectedly. Please try again.",
+        reason="worker_lost",
+    )
+    exports = await _reap_exports(
+        ExportJob.worker_id.in_(gone),
+        ExportJob.updated_at < cutoff,
+        message="The book could not be prepared for print. Please try again.",
+    )
+    _record(generations, exports, "worker_lost")
+    return generations + exports
+
+
+async def run_reaper() -> None:
+    """The inline backend's reaper: sweep, sleep, repeat, until cancelled."""
+    while True:
+        try:
+            await reap_stale_jobs()
+        except Exception:
+            logger.exception("Stale-job sweep failed")
+        await asyncio.sleep(REAP_EVERY_SECONDS)
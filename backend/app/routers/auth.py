@@ -7,7 +7,7 @@ from fastapi import APIRouter, Request, status
 from sqlalchemy import select, update
 
 from ..config import get_settings
-from ..deps import CurrentUser, DbSession
+from ..deps import CurrentUser, DbSession, forget_token_version
 from ..errors import CodedHTTPException
 from ..models import BillingEventRecord, PasswordResetToken, Story, User
 from ..plans import ACTIVE_SUBSCRIPTION_STATUSES
@@ -40,6 +40,7 @@ from ..security import (
     verify_password,
 )
 from ..services.email import get_email_sender
+from ..services.illustration_cache import forget_user
 from ..storage import get_storage
 
 logger = logging.getLogger(__name__)
@@ -178,6 +179,7 @@ async def reset_password(body: ResetPasswordRequest, db: DbSession, request: Req
     user.token_version += 1
     record.used_at = now
     await db.commit()
+    await forget_token_version(user.id)
     logger.info("Password reset completed", extra={"user_id": user.id})
     # Log them straight in: a parent who just reset should not face another form.
     return TokenResponse(access_token=create_access_token(user.id, user.token_version))
@@ -194,6 +196,7 @@ async def change_password(body: ChangePasswordRequest, user: CurrentUser, db: Db
     user.password_hash = hash_password(body.new_password)
     user.token_version += 1
     await db.commit()
+    await forget_token_version(user.id)
     # Every session is now retired, including this caller's. Hand back a fresh
     # token so securing the account does not log them out of it.
     return ChangePasswordResponse(
@@ -249,6 +252,7 @@ async def delete_account(body: DeleteAccountRequest, user: CurrentUser, db: DbSe
     user_id = user.id
     await db.delete(user)  # cascades stories/pages/jobs/tokens/interest; ledger SET NULL
     await db.commit()
+    await forget_token_version(user_id)
 
     # Media AFTER the commit, matching delete_story's order: a failed commit
     # would otherwise leave an intact account whose illustrations were erased.
@@ -258,6 +262,7 @@ async def delete_account(body: DeleteAccountRequest, user: CurrentUser, db: DbSe
             await storage.delete_story_media(story_id)
         except Exception as e:
             logger.warning("Media cleanup for %s failed during deletion: %s", story_id, e)
+    await forget_user(storage, user_id)
     logger.info("Account deleted", extra={"user_id": user_id, "stories": len(story_ids)})
     return MessageResponse(message="Your account and all of your stories have been deleted.")
 
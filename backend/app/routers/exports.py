@@ -0,0 +1,155 @@
+"""Background book exports: request one, poll it, download the file."""
+
+import asyncio
+import logging
+
+from fastapi import APIRouter, status
+from fastapi.responses import FileResponse
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+from starlette.background import BackgroundTask
+
+from ..deps import CurrentUser, DbSession
+from ..errors import EXPORT_FAILED, CodedHTTPException
+from ..jobs import enqueue_export
+from ..models import ExportJob, Story
+from ..quota import enforce_auth_attempt_limit
+from ..reaper import is_stale
+from ..schemas import CreateExportRequest, ExportOut
+from ..services.pdf_cache import (
+    attachment_disposition,
+    book_digest,
+    export_key,
+    remove_scratch,
+    scratch_dir,
+)
+from ..storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/exports", tags=["exports"])
+
+
+def _out(export: ExportJob) -> ExportOut:
+    out = ExportOut.model_validate(export)
+    if export.status == "complete":
+        out.download_url = f"/api/exports/{export.id}/pdf"
+    return out
+
+
+async def _load_owned_export(db, user, export_id: str) -> ExportJob:
+    export = (
+        await db.execute(
+            select(ExportJob)
+            .join(Story, Story.id == ExportJob.story_id)
+            .where(ExportJob.id == export_id, Story.user_id == user.id)
+            .options(joinedload(ExportJob.story))
+        )
+    ).scalar_one_or_none()
+    if export is None:
+        raise CodedHTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, code="export.not_found", detail="Export not found"
+        )
+    return export
+
+
+@router.post("", response_model=ExportOut, status_code=status.HTTP_202_ACCEPTED)
+async def create_export(body: CreateExportRequest, user: CurrentUser, db: DbSession):
+    """Start preparing a story's print file, or return the export already
+    running or finished for the story as it is now."""
+    await enforce_auth_attempt_limit("export", user.id)
+    story = (
+        await db.execute(
+            select(Story)
+            .where(Story.id == body.story_id, Story.user_id == user.id)
+            .options(selectinload(Story.pages))
+        )
+    ).scalar_one_or_none()
+    if story is None:
+        raise CodedHTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, code="story.not_found", detail="Story not found"
+        )
+    if story.status != "complete":
+        raise CodedHTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            code="story.pdf_not_ready",
+            detail="The story is still being created; the book can be saved once it finishes.",
+        )
+    digest = book_digest(story, body.profile)
+    existing = (
+        (
+            await db.execute(
+                select(ExportJob)
+                .where(
+                    ExportJob.story_id == story.id,
+                    ExportJob.profile == body.profile,
+                    ExportJob.digest == digest,
+                    ExportJob.status != "failed",
+                )
+                .order_by(ExportJob.created_at.desc())
+            )
+        )
+        .scalars()
+        .first()
+    )
+    if existing is not None and not is_stale(existing):
+        return _out(existing)
+
+    export = ExportJob(story_id=story.id, profile=body.profile, digest=digest)
+    db.add(export)
+    await db.commit()
+    try:
+        await enqueue_export(export.id)
+    except Exception as e:
+        logger.error("Failed to enqueue export %s: %s", export.id, e, exc_info=True)
+        # Failed, so the next request starts a new export instead of returning this one.
+        export.status, export.stage = "failed", "failed"
+        export.error = "The book could not be prepared for print. Please try again."
+        export.error_code = EXPORT_FAILED
+        await db.commit()
+        raise CodedHTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            code="export.service_unavailable",
+            detail="Book printing is briefly unavailable. Please try again.",
+        ) from e
+    return _out(export)
+
+
+@router.get("/{export_id}", response_model=ExportOut)
+async def get_export(export_id: str, user: CurrentUser, db: DbSession):
+    return _out(await _load_owned_export(db, user, export_id))
+
+
+@router.get("/{export_id}/pdf")
+async def download_export(export_id: str, user: CurrentUser, db: DbSession):
+    export = await _load_owned_export(db, user, export_id)
+    if export.status != "complete":
+        raise CodedHTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            code="export.not_ready",
+            detail="The book is still being prepared for print.",
+        )
+    workdir = scratch_dir()
+    path = await get_storage().load_artifact_file(
+        export_key(export.story_id, export.profile, export.digest), f"{workdir}/book.pdf"
+    )
+    if path is None:
+        await asyncio.to_thread(remove_scratch, workdir)
+        raise CodedHTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            code="export.not_found",
+            detail="This export's file is gone. Please prepare the book again.",
+        )
+    headers = {
+        "ETag": f'"{export.digest}"',
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": attachment_disposition(export.story.title or "story", f"-{export.profile}"),
+        # Compressed already; see the story PDF endpoint.
+        "Content-Encoding": "identity",
+    }
+    return FileResponse(
+        path,
+        media_type="application/pdf",
+        headers=headers,
+        background=BackgroundTask(remove_scratch, workdir),
+    )
@@ -1,14 +1,32 @@
 """Liveness/readiness for load balancers and compose healthchecks."""
 
-from fastapi import APIRouter
+import hmac
+import logging
+from datetime import UTC, datetime
+
+from fastapi import APIRouter, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from sqlalchemy import text
 
+from .. import heartbeat, metrics
 from ..config import get_settings
 from ..deps import DbSession
+from ..jobs import queue_depths
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["health"])
 
 
+def _scraper(request: Request) -> bool:
+    """Whether the caller holds METRICS_TOKEN. Endpoints that answer only to it
+    return the same bare 404 as an unknown route otherwise: they should not
+    advertise themselves to someone probing the API."""
+    token = get_settings().metrics_token
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    return bool(token) and hmac.compare_digest(supplied.encode(), token.encode())
+
+
 @router.get("/api/health")
 async def health(db: DbSession):
     settings = get_settings()
@@ -19,3 +37,38 @@ async def health(db: DbSession):
         "provider": settings.resolved_provider,
         "job_backend": settings.job_backend,
     }
+
+
+@router.get("/api/metrics", include_in_schema=False)
+async def metrics_text(request: Request):
+    """This process's counters, for a scraper holding METRICS_TOKEN, plus
+    the depth and oldest wait of each generation queue when they are in Redis."""
+    if not _scraper(request):
+        return JSONResponse({"detail": "Not Found"}, status_code=status.HTTP_404_NOT_FOUND)
+    if get_settings().job_backend == "arq":
+        try:
+            for queue, (depth, oldest_wait) in (await queue_depths()).items():
+                metrics.set_gauge("queue_depth", depth, queue=queue)
+                metrics.set_gauge("queue_oldest_wait_seconds", oldest_wait, queue=queue)
+        except Exception as e:
+            logger.warning("Could not read queue depths: %s", e)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/api/health/workers", include_in_schema=False)
+async def workers(request: Request):
+    """The live ARQ workers' last heartbeats (app.heartbeat), for the same
+    scraper. 503 when they cannot be read, since "no workers" would be a guess."""
+    if not _scraper(request):
+        return JSONResponse({"detail": "Not Found"}, status_code=status.HTTP_404_NOT_FOUND)
+    try:
+        found = await heartbeat.beats()
+    except Exception as e:
+        logger.warning("Could not read worker heartbeats: %s", e)
+        return JSONResponse(
+            {"detail": "Worker heartbeats unavailable"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    now = datetime.now(UTC)
+    for beat in found:
+        beat["age_seconds"] = round((now - datetime.fromisoformat(beat["beat_at"])).total_seconds(), 1)
+    return {"workers": found}
@@ -1,126 +1,115 @@
-"""Job progress polling + stale-job failover shared with the stories router."""
+"""Job progress, polled or streamed as Server-Sent Events.
 
+Both are answered from the job's cached snapshot (app.job_events) when there is
+a fresh one, so the traffic of every client watching a story never reaches
+Postgres; a miss, or a snapshot a dead worker left behind, reads the row. Both
+only read: jobs whose worker died are failed by the reaper (app.reaper)."""
+
+import asyncio
+import json
 import logging
-from datetime import UTC, datetime, timedelta
+from collections.abc import AsyncIterator
 
-from fastapi import APIRouter, status
-from sqlalchemy import select, update
+from fastapi import APIRouter, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..deps import CurrentUser, DbSession
-from ..errors import GENERATION_STALLED, CodedHTTPException
-from ..models import GenerationEvent, GenerationJob, Story
+from ..config import get_settings
+from ..db import get_session_factory
+from ..deps import CurrentUserId, DbSession
+from ..errors import CodedHTTPException
+from ..job_events import cached_job, event_id, listen, snapshot
+from ..models import GenerationJob, Story
+from ..reaper import stale
 from ..schemas import JobOut
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/jobs", tags=["jobs"])
 
-STALE_AFTER = timedelta(minutes=15)
-
-
-def _is_stale(job: GenerationJob) -> bool:
-    if job.status not in ("queued", "running"):
-        return False
-    last_touch = job.updated_at or job.created_at
-    if last_touch.tzinfo is None:  # SQLite returns naive datetimes
-        last_touch = last_touch.replace(tzinfo=UTC)
-    return datetime.now(UTC) - last_touch > STALE_AFTER
-
-
-async def fail_job_if_stale(db: AsyncSession, job: GenerationJob) -> bool:
-    """A queued/running job with no heartbeat for STALE_AFTER means the worker
-    died mid-flight; fail it so clients stop polling and the user can retry.
-    Returns True if the job was failed."""
-    if not _is_stale(job):
-        return False
-    job.status = "failed"
-    job.stage = "failed"
-    job.error = "Generation timed out. Please try again."
-    job.error_code = GENERATION_STALLED
-    story = await db.get(Story, job.story_id)
-    if story is not None and story.status in ("pending", "generating"):
-        story.status = "failed"
-        story.error = job.error
-        story.error_code = job.error_code
-    # Our failure, so the user keeps the allowance.
-    await db.execute(
-        update(GenerationEvent)
-        .where(GenerationEvent.story_id == job.story_id, GenerationEvent.refunded.is_(False))
-        .values(refunded=True, refund_reason="stale_timeout")
-    )
-    await db.commit()
-    return True
-
-
-async def fail_stale_jobs_for_user(db: AsyncSession, user_id: str) -> None:
-    """Bulk version of the stale-job failover for the library listing.
-
-    Two statements and one commit regardless of library size, instead of a
-    SELECT plus a COMMIT per story.
-    """
-    cutoff = datetime.now(UTC) - STALE_AFTER
-    stale_story_ids = (
-        (
-            await db.execute(
-                select(GenerationJob.story_id)
-                .join(Story, Story.id == GenerationJob.story_id)
-                .where(
-                    Story.user_id == user_id,
-                    GenerationJob.status.in_(["queued", "running"]),
-                    GenerationJob.updated_at < cutoff,
-                )
-            )
-        )
-        .scalars()
-        .all()
-    )
-    if not stale_story_ids:
-        return
-    message = "Generation timed out. Please try again."
-    await db.execute(
-        update(GenerationJob)
-        .where(GenerationJob.story_id.in_(stale_story_ids))
-        .values(status="failed", stage="failed", error=message, error_code=GENERATION_STALLED)
-    )
-    await db.execute(
-        update(Story)
-        .where(Story.id.in_(stale_story_ids), Story.status.in_(["pending", "generating"]))
-        .values(status="failed", error=message, error_code=GENERATION_STALLED)
-    )
-    # Our failure, so refund the ledger entries too.
-    await db.execute(
-        update(GenerationEvent)
-        .where(GenerationEvent.story_id.in_(stale_story_ids), GenerationEvent.refunded.is_(False))
-        .values(refunded=True, refund_reason="stale_timeout")
-    )
-    await db.commit()
-    logger.warning("Failed %d stale generation(s)", len(stale_story_ids), extra={"user_id": user_id})
-
 
-async def fail_story_job_if_stale(db: AsyncSession, story: Story) -> None:
-    """Same failover, but entered from a story read (e.g. after a page refresh
-    the client no longer knows the job id)."""
-    if story.status not in ("pending", "generating"):
-        return
-    job = (
-        await db.execute(select(GenerationJob).where(GenerationJob.story_id == story.id))
-    ).scalar_one_or_none()
-    if job is not None:
-        await fail_job_if_stale(db, job)
-
-
-@router.get("/{job_id}", response_model=JobOut)
-async def get_job(job_id: str, user: CurrentUser, db: DbSession):
+async def _load_owned_job(db: AsyncSession, user_id: str, job_id: str) -> GenerationJob:
     job = (
         await db.execute(
             select(GenerationJob)
             .join(Story, Story.id == GenerationJob.story_id)
-            .where(GenerationJob.id == job_id, Story.user_id == user.id)
+            .where(GenerationJob.id == job_id, Story.user_id == user_id)
         )
     ).scalar_one_or_none()
     if job is None:
         raise CodedHTTPException(
             status_code=status.HTTP_404_NOT_FOUND, code="job.not_found", detail="Job not found"
         )
-    await fail_job_if_stale(db, job)
     return job
+
+
+async def _fresh_snapshot(job_id: str) -> dict | None:
+    """The cached snapshot, unless it is one a dead worker left behind: the
+    row is what the reaper fails."""
+    record = await cached_job(job_id)
+    if record is None or stale(record["status"], record["written_at"]):
+        return None
+    return record
+
+
+@router.get("/{job_id}", response_model=JobOut)
+async def get_job(job_id: str, user_id: CurrentUserId, db: DbSession):
+    # The session opens a connection only when first used: on a miss.
+    record = await _fresh_snapshot(job_id)
+    if record is not None and record["user_id"] == user_id:
+        return record
+    return await _load_owned_job(db, user_id, job_id)
+
+
+async def _current(job_id: str) -> dict | None:
+    record = await _fresh_snapshot(job_id)
+    if record is not None:
+        return JobOut.model_validate(record).model_dump()
+    async with get_session_factory()() as session:
+        job = await session.get(GenerationJob, job_id)
+        return snapshot(job) if job is not None else None
+
+
+def _sse(snap: dict) -> str:
+    return f"id: {event_id(snap)}\nevent: job\ndata: {json.dumps(snap)}\n\n"
+
+
+async def _job_stream(job_id: str, last_event_id: str) -> AsyncIterator[str]:
+    """The job's state now, then each change, until it completes or fails.
+
+    Subscribed before the first read, so nothing published in between is
+    missed. An event repeating the state last sent is dropped, which is also
+    how a reconnect with Last-Event-ID skips what the client already has."""
+    heartbeat = get_settings().job_events_heartbeat_seconds
+    sent = last_event_id
+    async with listen(job_id) as queue:
+        snap = await _current(job_id)
+        while snap is not None:
+            if event_id(snap) != sent:
+                sent = event_id(snap)
+                yield _sse(snap)
+            if snap["status"] in ("complete", "failed"):
+                return
+            try:
+                snap = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except TimeoutError:
+                yield ": ping\n\n"
+                snap = await _current(job_id)
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, user_id: CurrentUserId, db: DbSession, request: Request):
+    """The job as Server-Sent Events, each a JobOut snapshot, ending once it
+    completes or fails. Replaces polling GET /api/jobs/{job_id}."""
+    record = await cached_job(job_id)
+    if record is None or record["user_id"] != user_id:
+        await _load_owned_job(db, user_id, job_id)
+        # The stream can last minutes; it must not hold a pooled connection.
+        await db.close()
+    return StreamingResponse(
+        _job_stream(job_id, request.headers.get("last-event-id", "")),
+        media_type="text/event-stream",
+        # A proxy that buffers or compresses the stream would hold every event
+        # until the job ended.
+        headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"},
+    )
@@ -2,18 +2,21 @@
 
 import asyncio
 import logging
-import re
+import math
 import uuid
-from urllib.parse import quote
 
 from fastapi import APIRouter, Request, Response, status
+from fastapi.responses import FileResponse
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
+from starlette.background import BackgroundTask
 
+from ..admission import admit, start_time
 from ..config import get_settings
 from ..deps import CurrentUser, DbSession
 from ..errors import GENERATION_FAILED, CodedHTTPException
-from ..jobs import enqueue_generation
+from ..job_events import forget_jobs, publish_job
+from ..jobs import enqueue_generation, enqueue_illustration
 from ..models import (
     ChildProfile,
     CompanionCharacter,
@@ -22,15 +25,17 @@ from ..models import (
     Story,
     StoryPage,
     User,
+    utcnow,
 )
+from ..plans import get_plan
 from ..quota import (
+    effective_plan_for,
     enforce_auth_attempt_limit,
     enforce_burst_limit,
     enforce_daily_quota,
     enforce_global_budget,
     enforce_monthly_quota,
 )
-from ..routers.jobs import fail_stale_jobs_for_user, fail_story_job_if_stale
 from ..schemas import (
     CastMemberOut,
     CreateStoryRequest,
@@ -38,10 +43,21 @@ from ..schemas import (
     SharedStoryOut,
     ShareResponse,
     StoryOut,
+    StoryPageOut,
     StorySummaryOut,
 )
 from ..services import cast as cast_service
-from ..services.pdf import PdfPage, PdfUnavailableError, build_story_pdf
+from ..services.illustration_cache import cached_illustrations, forget_illustrations
+from ..services.pdf import PdfUnavailableError
+from ..services.pdf_cache import (
+    attachment_disposition,
+    book_digest,
+    cached_book,
+    remove_scratch,
+    render_book,
+    scratch_dir,
+)
+from ..services.pdf_renderer import RendererBusyError
 from ..services.reading_level import resolve_band
 from ..storage import get_storage
 from .auth import _client_ip
@@ -144,6 +160,9 @@ async def create_story(body: CreateStoryRequest, user: CurrentUser, db: DbSessio
     # "resets tomorrow" would simply be false.
     await enforce_monthly_quota(db, user)
     await enforce_daily_quota(db, user)
+    # Last, so a parent out of allowance hears that rather than "busy".
+    priority = get_plan(effective_plan_for(user)).priority
+    wait = await admit(priority=priority)
 
     cast = await _resolve_cast(db, user, body)
     # The youngest selected child sets the reading level for the whole book,
@@ -169,9 +188,11 @@ async def create_story(body: CreateStoryRequest, user: CurrentUser, db: DbSessio
     event = GenerationEvent(user_id=user.id, story_id=story.id)
     db.add(event)
     await db.commit()
+    # Before the enqueue, so the worker's first update cannot be overwritten.
+    await publish_job(job, user.id)
 
     try:
-        await enqueue_generation(story.id)
+        await enqueue_generation(story.id, priority=priority)
     except Exception as e:
         logger.error("Failed to enqueue story %s: %s", story.id, e, exc_info=True)
         story.status = "failed"
@@ -185,27 +206,31 @@ async def create_story(body: CreateStoryRequest, user: CurrentUser, db: DbSessio
         event.refunded = True
         event.refund_reason = "enqueue_failed"
         await db.commit()
+        await publish_job(job, user.id)
         raise CodedHTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             code="story.service_unavailable",
             detail="Story service is briefly unavailable. Please try again.",
         ) from e
-    return CreateStoryResponse(story_id=story.id, job_id=job.id)
+    return CreateStoryResponse(
+        story_id=story.id,
+        job_id=job.id,
+        estimated_wait_seconds=None if wait is None else math.ceil(wait),
+        estimated_start_at=start_time(wait),
+    )
 
 
 @router.get("", response_model=list[StorySummaryOut])
 async def list_stories(user: CurrentUser, db: DbSession, limit: int = 50, offset: int = 0):
     """The home screen, polled every few seconds while anything is generating.
 
-    Deliberately three statements regardless of library size: fail stale jobs in
-    bulk, fetch the story rows, fetch only the cover image URLs. It previously
+    Deliberately two statements regardless of library size, and no writes:
+    fetch the story rows, fetch only the cover image URLs. It previously
     hydrated every page's full paragraph text just to pick one cover, then ran a
-    SELECT and a COMMIT per story.
+    SELECT and a COMMIT per story. Dead generations are failed by the reaper.
     """
     limit = min(max(limit, 1), 100)
 
-    await fail_stale_jobs_for_user(db, user.id)
-
     rows = (
         (
             await db.execute(
@@ -222,24 +247,26 @@ async def list_stories(user: CurrentUser, db: DbSession, limit: int = 50, offset
     if not rows:
         return []
 
-    # One extra query for covers: just the URL column, only illustrated pages,
+    # One extra query for covers: just the URL columns, only illustrated pages,
     # lowest position first so the first row per story is the cover.
     story_ids = [s.id for s in rows]
     cover_rows = (
         await db.execute(
-            select(StoryPage.story_id, StoryPage.image_url)
+            select(
+                StoryPage.story_id, StoryPage.image_url, StoryPage.thumb_cover_url, StoryPage.thumb_grid_url
+            )
             .where(StoryPage.story_id.in_(story_ids), StoryPage.image_url != "")
             .order_by(StoryPage.story_id, StoryPage.position)
         )
     ).all()
-    covers: dict[str, str] = {}
-    for story_id, image_url in cover_rows:
-        covers.setdefault(story_id, image_url)
+    covers: dict[str, tuple[str, str, str]] = {}
+    for story_id, *urls in cover_rows:
+        covers.setdefault(story_id, tuple(urls))
 
     out = []
     for s in rows:
         item = StorySummaryOut.model_validate(s)
-        item.cover_image_url = covers.get(s.id, "")
+        item.cover_image_url, item.thumb_cover_url, item.thumb_grid_url = covers.get(s.id, ("", "", ""))
         out.append(item)
     return out
 
@@ -278,29 +305,54 @@ async def get_shared_story(slug: str, db: DbSession):
     return story
 
 
-# Rendering is CPU-bound thread work. The Redis limiters fail open when Redis
-# is down, so this semaphore is the line that holds regardless: it bounds
-# concurrent renders process-wide for both the owner and the public endpoint.
-_PDF_RENDER_LIMIT = asyncio.Semaphore(4)
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """RFC 9110 weak comparison, which is what If-None-Match uses."""
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+async def _story_pdf_response(story: Story, request: Request) -> Response:
+    """The story as a storybook PDF: from the cache when it has been rendered
+    before, rendered and cached otherwise, or a 304 if the client has it.
 
+    Streamed from a file, never held whole, with Range support, so a resumed
+    download on a flaky mobile connection fetches only what it is missing."""
+    digest = book_digest(story)
+    # private: an owner's book must never sit in a shared cache. no-cache: the
+    # browser keeps it but asks first, which costs one SELECT and a 304.
+    headers = {"ETag": f'"{digest}"', "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match", ""), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-async def _story_pdf_response(story: Story) -> Response:
-    """Render a story as a storybook PDF and wrap it for download."""
-    storage = get_storage()
-    pdf_pages = []
-    for page in story.pages:
-        image = await storage.load_image(page.image_url) if page.image_url else None
-        pdf_pages.append(PdfPage(text=page.text, image=image))
+    workdir = scratch_dir()
     try:
-        async with _PDF_RENDER_LIMIT:
-            data = await asyncio.to_thread(
-                build_story_pdf,
-                title=story.title or "A KathaSajha story",
-                language=story.language,
-                hero_name=story.hero_name,
-                pages=pdf_pages,
-                created_at=story.created_at,
-            )
+        path = await cached_book(story, digest, workdir, _render_pdf)
+    except BaseException:
+        await asyncio.to_thread(remove_scratch, workdir)
+        raise
+    headers["Content-Disposition"] = attachment_disposition(story.title or "story")
+    # The PDF's streams are compressed already. Declared identity, GZip leaves
+    # it alone, so ranges index the file itself and Content-Length stays.
+    headers["Content-Encoding"] = "identity"
+    return FileResponse(
+        path,
+        media_type="application/pdf",
+        headers=headers,
+        background=BackgroundTask(remove_scratch, workdir),
+    )
+
+
+async def _render_pdf(story: Story, workdir: str) -> str:
+    try:
+        return await render_book(story, workdir)
+    except RendererBusyError as e:
+        raise CodedHTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            code="story.pdf_busy",
+            detail="Lots of books are being made right now. Please try again in a moment.",
+            headers={"Retry-After": str(e.retry_after)},
+        ) from e
     except PdfUnavailableError as e:
         logger.error("PDF rendering unavailable: %s", e)
         raise CodedHTTPException(
@@ -308,19 +360,6 @@ async def _story_pdf_response(story: Story) -> Response:
             code="story.pdf_unavailable",
             detail="PDF export is temporarily unavailable. Please try again later.",
         ) from e
-    title = story.title or "story"
-    # ASCII fallback plus RFC 5987 UTF-8 name, so Devanagari titles survive.
-    ascii_name = re.sub(r"[^A-Za-z0-9_-]+", "_", title).strip("_")[:60] or "story"
-    # safe="" so '/' is percent-encoded too; quote() already leaves nothing
-    # that could split the header, but an unescaped slash is invalid RFC 5987.
-    disposition = (
-        f"attachment; filename=\"{ascii_name}.pdf\"; filename*=UTF-8''{quote(title[:80], safe='')}.pdf"
-    )
-    return Response(
-        content=data,
-        media_type="application/pdf",
-        headers={"Content-Disposition": disposition},
-    )
 
 
 @router.get("/shared/{slug}/pdf")
@@ -347,13 +386,13 @@ async def shared_story_pdf(slug: str, db: DbSession, request: Request):
             code="story.shared_not_found",
             detail="Shared story not found",
         )
-    return await _story_pdf_response(story)
+    return await _story_pdf_response(story, request)
 
 
 @router.get("/{story_id}/pdf")
-async def story_pdf(story_id: str, user: CurrentUser, db: DbSession):
+async def story_pdf(story_id: str, user: CurrentUser, db: DbSession, request: Request):
     # Authenticated but still unmetered CPU; a modest per-user window plus the
-    # render semaphore keeps one account from monopolising the process.
+    # renderer's bounded queue keeps one account from monopolising the pool.
     await enforce_auth_attempt_limit("owner-pdf", user.id)
     story = await _load_owned_story(db, user, story_id)
     if story.status != "complete":
@@ -362,13 +401,70 @@ async def story_pdf(story_id: str, user: CurrentUser, db: DbSession):
             code="story.pdf_not_ready",
             detail="The story is still being created; the book can be saved once it finishes.",
         )
-    return await _story_pdf_response(story)
+    return await _story_pdf_response(story, request)
+
+
+@router.post(
+    "/{story_id}/pages/{position}/illustration",
+    response_model=StoryPageOut,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def redraw_illustration(story_id: str, position: int, user: CurrentUser, db: DbSession):
+    """Queue a new picture for one page. The old one stays until it is replaced;
+    poll the story and watch the page's image_pending."""
+    await enforce_burst_limit(user)
+    await enforce_global_budget(db)
+    # Lock the story row first so two taps on the same button serialize: both
+    # would otherwise pass the pending and allowance checks and pay twice.
+    await db.execute(select(Story.id).where(Story.id == story_id, Story.user_id == user.id).with_for_update())
+    story = await _load_owned_story(db, user, story_id)
+    if story.status != "complete":
+        raise CodedHTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            code="story.redraw_not_ready",
+            detail="The story is still being created; pictures can be redrawn once it finishes.",
+        )
+    page = next((p for p in story.pages if p.position == position), None)
+    if page is None:
+        raise CodedHTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, code="story.page_not_found", detail="Page not found"
+        )
+    if page.image_pending:
+        raise CodedHTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            code="story.redraw_in_progress",
+            detail="A new picture for this page is already being drawn.",
+        )
+    allowed = get_settings().illustration_redraws_per_story
+    if story.image_redraws >= allowed:
+        raise CodedHTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            code="story.redraw_limit",
+            detail=f"This story's pictures have been redrawn the most times allowed ({allowed}).",
+            params={"max": allowed},
+        )
+
+    page.image_requested_at = utcnow()
+    story.image_redraws += 1
+    await db.commit()
+    try:
+        await enqueue_illustration(story.id, position)
+    except Exception as e:
+        logger.error("Failed to enqueue redraw for story %s: %s", story.id, e, exc_info=True)
+        page.image_requested_at = None
+        story.image_redraws -= 1
+        await db.commit()
+        raise CodedHTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            code="story.service_unavailable",
+            detail="Story service is briefly unavailable. Please try again.",
+        ) from e
+    return StoryPageOut.model_validate(page)
 
 
 @router.get("/{story_id}", response_model=StoryOut)
 async def get_story(story_id: str, user: CurrentUser, db: DbSession):
     story = await _load_owned_story(db, user, story_id)
-    await fail_story_job_if_stale(db, story)
     out = StoryOut.model_validate(story)
     # Names only. The age band steers generation and is never returned.
     out.cast = [
@@ -409,11 +505,20 @@ async def delete_story(story_id: str, user: CurrentUser, db: DbSession):
             code="story.delete_while_generating",
             detail="Story is still generating; wait for it to finish before deleting",
         )
+    job_ids = (
+        (await db.execute(select(GenerationJob.id).where(GenerationJob.story_id == story_id))).scalars().all()
+    )
+    from ..services.pipeline import get_provider
+
+    # Its pictures may still be cached for the family; they go with it.
+    cached = cached_illustrations(get_provider(), user.id, story)
     await db.delete(story)
     await db.commit()
+    await forget_jobs(*job_ids)
     try:
         await get_storage().delete_story_media(story_id)
     except Exception as e:
         # Media cleanup is best-effort; the DB row is already gone. Log it so
         # orphaned files are discoverable rather than silently accumulating.
         logger.warning("Could not delete media for story %s: %s", story_id, e)
+    await forget_illustrations(get_storage(), cached)
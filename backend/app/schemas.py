@@ -3,6 +3,7 @@
 import re
 import unicodedata
 from datetime import datetime
+from typing import Literal
 
 from pydantic import BaseModel, EmailStr, Field, field_validator
 
@@ -301,7 +302,12 @@ class StoryPageOut(BaseModel):
     position: int
     text: str
     image_url: str
+    thumb_cover_url: str = ""
+    thumb_grid_url: str = ""
     image_error: str
+    # True while a redraw of this page is queued or running. image_url keeps
+    # the old picture until the new one replaces it.
+    image_pending: bool = False
 
     model_config = {"from_attributes": True}
 
@@ -315,6 +321,9 @@ class StorySummaryOut(BaseModel):
     share_slug: str | None
     created_at: datetime
     cover_image_url: str = ""
+    # Thumbnails of that same picture; a library card needs only the grid one.
+    thumb_cover_url: str = ""
+    thumb_grid_url: str = ""
 
     model_config = {"from_attributes": True}
 
@@ -371,6 +380,10 @@ class SharedStoryOut(BaseModel):
 class CreateStoryResponse(BaseModel):
     story_id: str
     job_id: str
+    # How long until a worker starts it, by the queue ahead (app.admission).
+    # 0 when it starts at once; None when the queue could not be read.
+    estimated_wait_seconds: int | None = None
+    estimated_start_at: datetime | None = None
 
 
 class JobOut(BaseModel):
@@ -386,6 +399,28 @@ class JobOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class CreateExportRequest(BaseModel):
+    story_id: str
+    profile: Literal["print"] = "print"
+
+
+class ExportOut(BaseModel):
+    id: str
+    story_id: str
+    profile: str
+    status: str
+    stage: str
+    progress_current: int
+    progress_total: int
+    size_bytes: int
+    error: str
+    error_code: str = ""
+    # Where to fetch the file; empty until the export is complete.
+    download_url: str = ""
+
+    model_config = {"from_attributes": True}
+
+
 class ShareResponse(BaseModel):
     share_slug: str
     share_url: str
@@ -1,6 +1,7 @@
 """Generation provider contract shared by Gemini and mock implementations."""
 
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
 from dataclasses import dataclass, field
 
 
@@ -26,6 +27,20 @@ class Usage:
         )
 
 
+@dataclass
+class DraftScene:
+    """One finished page of a draft that is still being written.
+
+    Carries the title because the illustration prompt needs it, and a stream
+    knows the title before it knows the first paragraph.
+    """
+
+    position: int
+    title: str
+    text: str
+    image_prompt: str
+
+
 @dataclass
 class StoryDraft:
     title: str
@@ -34,6 +49,12 @@ class StoryDraft:
     moral: str = ""
     usage: Usage = field(default_factory=Usage)
 
+    def scenes(self) -> list[DraftScene]:
+        return [
+            DraftScene(position=i, title=self.title, text=text, image_prompt=prompt)
+            for i, (text, prompt) in enumerate(zip(self.paragraphs, self.image_prompts, strict=False))
+        ]
+
 
 @dataclass
 class GeneratedImage:
@@ -67,10 +88,31 @@ class GenerationProvider(ABC):
     async def write_story(self, req: StoryRequest) -> StoryDraft:
         """Generate title + paragraphs + per-paragraph illustration prompts in ONE call."""
 
+    async def write_story_stream(self, req: StoryRequest) -> AsyncIterator[DraftScene | StoryDraft]:
+        """Yield each scene as soon as it is final, then the complete draft last.
+
+        The default has nothing to stream: it waits for write_story and replays
+        the result, so every provider works in streaming mode and only gains by
+        overriding this. The final draft is what usage and the moral come from.
+        """
+        draft = await self.write_story(req)
+        for scene in draft.scenes():
+            yield scene
+        yield draft
+
     @abstractmethod
     async def illustrate(self, image_prompt: str, *, title: str, position: int) -> GeneratedImage:
         """Generate a single illustration. Must not raise; return .error instead."""
 
+    def illustration_cache_key(self, image_prompt: str, *, title: str, position: int) -> str | None:
+        """Everything that determines this illustration, as one string, or None.
+
+        Two calls with the same key must be interchangeable, so it names the
+        model and the exact prompt sent. None opts out of the illustration
+        cache, which is the right answer for anything free or non-repeatable.
+        """
+        return None
+
 
 class GenerationError(Exception):
     """Raised when story text generation fails (images fail soft, stories fail hard)."""
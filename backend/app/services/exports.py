@@ -0,0 +1,102 @@
+"""Background book exports: the print-on-demand file.
+
+A print book carries four times the screen book's pixels (300 DPI, pictures
+upscaled and sharpened) and takes seconds to bind, so it never runs on a
+request. POST /api/exports records an ExportJob and enqueues it; the client
+polls the job like a GenerationJob and downloads the file once it is
+complete. The file is stored beside the story's cached books and is deleted
+with its media.
+"""
+
+import asyncio
+import logging
+import os
+
+from sqlalchemy.orm import selectinload
+
+from .. import heartbeat, metrics
+from ..db import get_session_factory
+from ..errors import EXPORT_FAILED
+from ..models import ExportJob, Story
+from ..storage import get_storage
+from .pdf import PdfUnavailableError
+from .pdf_cache import export_key, remove_scratch, render_book, scratch_dir
+
+logger = logging.getLogger(__name__)
+
+# rendering (pictures read, prepared for press, bound), saving
+_STEPS = 2
+
+
+async def _update_export(export_id: str, **fields) -> None:
+    async with get_session_factory()() as session:
+        export = await session.get(ExportJob, export_id)
+        if export is None:
+            return
+        for k, v in fields.items():
+            setattr(export, k, v)
+        await session.commit()
+    heartbeat.progressed()
+
+
+async def _abandoned(worker_id: str) -> bool:
+    """Whether a running export has no live owner: released by a clean
+    shutdown, whose cancelled jobs ARQ runs again, or stamped by a worker that
+    has stopped beating."""
+    if not worker_id:
+        return True
+    try:
+        return worker_id not in {beat["worker_id"] for beat in await heartbeat.beats()}
+    except Exception as e:
+        # Cannot tell; the reapers settle it once the beats are readable.
+        logger.warning("Worker heartbeats unreadable; export left to its owner: %s", e)
+        return False
+
+
+async def run_export(export_id: str) -> None:
+    """Entry point invoked by the job backend. Owns the export's lifecycle.
+
+    A re-delivered export that is still running with no live owner is
+    rendered again from the start: nothing of a half-bound book is kept."""
+    async with get_session_factory()() as session:
+        export = await session.get(
+            ExportJob, export_id, options=[selectinload(ExportJob.story).selectinload(Story.pages)]
+        )
+        if export is None or export.status not in ("queued", "running"):
+            return
+        if export.status == "running" and not await _abandoned(export.worker_id):
+            logger.info("run_export: export %s is still being rendered", export_id)
+            return
+        story, profile, digest = export.story, export.profile, export.digest
+        export.status, export.stage = "running", "rendering"
+        export.worker_id = heartbeat.worker_id()
+        export.progress_current, export.progress_total = 0, _STEPS
+        await session.commit()
+
+    workdir = scratch_dir()
+    try:
+        path = await render_book(story, workdir, profile)
+        await _update_export(export_id, stage="saving", progress_current=1)
+        await get_storage().save_artifact_file(
+            export_key(story.id, profile, digest), path, content_type="application/pdf"
+        )
+        size = await asyncio.to_thread(os.path.getsize, path)
+    except Exception as e:
+        if isinstance(e, PdfUnavailableError):
+            logger.error("PDF rendering unavailable: %s", e)
+        else:
+            logger.exception("Export %s of story %s failed", export_id, story.id)
+        metrics.incr("pdf_exports_failed_total", profile=profile)
+        await _update_export(
+            export_id,
+            status="failed",
+            stage="failed",
+            error="The book could not be prepared for print. Please try again.",
+            error_code=EXPORT_FAILED,
+        )
+        return
+    finally:
+        await asyncio.to_thread(remove_scratch, workdir)
+    metrics.incr("pdf_exports_total", profile=profile)
+    await _update_export(export_id, status="complete", stage="done", progress_current=_STEPS, size_bytes=size)
+    logger.info("Exported story %s for %s (%d bytes)", story.id, profile, size)
@@ -1,25 +1,147 @@
 """Gemini provider using the current google-genai SDK.
 
-One structured-JSON call produces title + paragraphs + per-paragraph image
-prompts (no per-paragraph summary calls), then illustrations run in parallel
-under a semaphore controlled by the pipeline.
+One structured-JSON call produces title + scenes (each a paragraph and its
+image prompt) + moral, with no per-paragraph summary calls; illustrations then
+run in parallel under a semaphore controlled by the pipeline. Streamed, each
+scene is handed over as soon as its JSON object closes.
 """
 
 import asyncio
+import json
 import logging
+import random
+import re
 import secrets
+import time
+from collections.abc import AsyncIterator
+from typing import Literal
 
 from pydantic import BaseModel, Field
 
+from .. import metrics
 from ..config import get_settings
 from ..errors import GENERATION_BLOCKED
 from . import cast as cast_service
 from . import reading_level
-from .base import GeneratedImage, GenerationError, GenerationProvider, StoryDraft, StoryRequest, Usage
+from .base import (
+    DraftScene,
+    GeneratedImage,
+    GenerationError,
+    GenerationProvider,
+    StoryDraft,
+    StoryRequest,
+    Usage,
+)
 
 logger = logging.getLogger(__name__)
 
 _RETRYABLE_MARKERS = ("429", "500", "503", "RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE")
+# The subset that means "you, specifically, are sending too much": these shrink
+# the shared window. A 500 is the provider's problem and slowing down fixes nothing.
+_THROTTLE_MARKERS = ("429", "RESOURCE_EXHAUSTED")
+# Gemini puts its hint in the error body as RetryInfo ("retryDelay": "12s");
+# a plain HTTP Retry-After may arrive in the message too.
+_RETRY_HINT = re.compile(r"retry[-_ ]?(?:delay|after)['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+
+def _classify(e: Exception) -> tuple[Literal["throttled", "failed"], float, bool]:
+    """What a failed call means: the limiter outcome, the provider's retry
+    hint in seconds, and whether trying again can help."""
+    throttled = any(m in str(e) for m in _THROTTLE_MARKERS)
+    hint = _retry_after(e) if throttled else 0.0
+    retryable = isinstance(e, asyncio.TimeoutError) or any(m in str(e) for m in _RETRYABLE_MARKERS)
+    return ("throttled" if throttled else "failed"), hint, retryable
+
+
+def _backoff(attempt: int, hint: float, base_delay: float) -> float:
+    # Jittered so the calls that failed together do not retry together.
+    return max(hint, base_delay * (2**attempt) * random.uniform(0.5, 1.5))
+
+
+def _retry_after(e: Exception) -> float:
+    """Seconds the provider asked us to wait, or 0 when it did not say."""
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    try:
+        if headers and headers.get("retry-after"):
+            return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        pass
+    match = _RETRY_HINT.search(str(e))
+    return float(match.group(1)) if match else 0.0
+
+
+class _AdaptiveLimiter:
+    """AIMD concurrency window shared by every Gemini call in the process.
+
+    Without it each call retried on its own schedule, so a 429 hit every
+    in-flight task at once and they all came back in the same instant. Now a
+    throttle halves the window (once per burst: the other calls failing from
+    the same overload are one signal, not many), each success widens it by
+    1/window, and a retry-after hint pauses new calls for everyone. Any other
+    failure (a 500, a timeout, a cancelled call) says nothing about capacity
+    and leaves the window as it is.
+    """
+
+    def __init__(self, max_window: int, *, cooldown: float = 1.0):
+        self.max_window = max(1, max_window)
+        self.window = float(self.max_window)
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._last_shrink = 0.0
+        self._changed = asyncio.Condition()
+        metrics.set_gauge("gemini_concurrency_window", self.window)
+
+    async def acquire(self) -> None:
+        async with self._changed:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    # Released while sleeping so other waiters see the pause too.
+                    self._changed.release()
+                    try:
+                        await asyncio.sleep(pause)
+                    finally:
+                        await self._changed.acquire()
+                    continue
+                if self.in_flight < int(self.window):
+                    self.in_flight += 1
+                    return
+                await self._changed.wait()
+
+    async def release(
+        self, outcome: Literal["ok", "throttled", "failed"] = "ok", *, retry_after: float = 0.0
+    ) -> None:
+        async with self._changed:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if outcome == "throttled":
+                if now - self._last_shrink >= self.cooldown:
+                    self.window = max(1.0, self.window / 2)
+                    self._last_shrink = now
+                    metrics.incr("gemini_throttled_total")
+            elif outcome == "ok":
+                self.window = min(float(self.max_window), self.window + 1 / self.window)
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            metrics.set_gauge("gemini_concurrency_window", self.window)
+            self._changed.notify_all()
+
+
+_limiter: _AdaptiveLimiter | None = None
+
+
+def _get_limiter() -> _AdaptiveLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = _AdaptiveLimiter(get_settings().provider_max_concurrency)
+    return _limiter
+
+
+def reset_limiter() -> None:
+    """Test helper."""
+    global _limiter
+    _limiter = None
 
 
 def _usage_of(resp, *, images: int = 0) -> Usage:
@@ -39,21 +161,174 @@ def _usage_of(resp, *, images: int = 0) -> Usage:
     )
 
 
+def _illustration_prompt(image_prompt: str, title: str) -> str:
+    return (
+        f"Children's picture-book illustration for the story '{title}'. {image_prompt} "
+        "Style: warm, colorful, whimsical storybook art, soft lighting, no text or captions in the image."
+    )
+
+
+class _SceneSchema(BaseModel):
+    text: str = Field(description="The paragraph for this scene.")
+    image_prompt: str = Field(
+        description=(
+            "The illustration prompt for this paragraph. Describes the scene visually (characters, "
+            "setting, mood) for a children's picture-book illustrator. Always written in English."
+        )
+    )
+
+
 class _StorySchema(BaseModel):
+    # Field order is the order the model writes in (the SDK sends it as
+    # propertyOrdering): the title first, so a stream can hand over each scene
+    # the moment it is written, and the moral last.
     title: str = Field(description="Short, magical story title. No markdown.")
-    moral: str = Field(description="One-sentence positive lesson of the story.")
     # Deliberately free of numbers: the instruction carries the paragraph and
     # word counts for the chosen age band, and a second figure here would
     # contradict it for every band except the default.
-    paragraphs: list[str] = Field(
-        description="Story paragraphs, one per scene, in order. Follow the counts in the instruction."
+    scenes: list[_SceneSchema] = Field(
+        description="The story, one scene per paragraph, in order. Follow the counts in the instruction."
     )
-    image_prompts: list[str] = Field(
-        description=(
-            "Exactly one illustration prompt per paragraph, in the same order. Each describes the "
-            "scene visually (characters, setting, mood) for a children's picture-book illustrator. "
-            "Always write image prompts in English."
+    moral: str = Field(description="One-sentence positive lesson of the story.")
+
+
+def _clean_scene(text: str, image_prompt: str) -> tuple[str, str] | None:
+    """A scene as it goes on a page, or None for an empty one. A missing
+    prompt falls back to that SAME scene's text, so art never lands on the
+    wrong page."""
+    text = (text or "").strip()
+    if not text:
+        return None
+    return text, (image_prompt or "").strip() or text
+
+
+class _SceneStream:
+    """Picks finished scenes out of a story's JSON while it is still arriving.
+
+    A small scanner over the text so far: it tracks strings and nesting, reads
+    the root object's keys, and parses each object of the "scenes" array as
+    soon as its closing brace arrives. Scenes found before the title wait for
+    it; the whole text is validated against the schema once the stream ends.
+    """
+
+    def __init__(self, max_paragraphs: int):
+        self.max_paragraphs = max_paragraphs
+        self.text = ""
+        self.title: str | None = None
+        self.scenes: list[DraftScene] = []
+        self.usage = Usage()
+        self.feedback = None
+        self._pending: list[tuple[str, str]] = []
+        self._scanned = 0
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._expect_key = False
+        self._key: str | None = None
+        self._scene_start: int | None = None
+
+    def feed(self, chunk) -> list[DraftScene]:
+        """Take one streamed chunk; return the scenes it finished."""
+        if getattr(chunk, "usage_metadata", None) is not None:
+            self.usage = _usage_of(chunk)  # cumulative: the last chunk has the total
+        self.feedback = getattr(chunk, "prompt_feedback", None) or self.feedback
+        self.text += getattr(chunk, "text", None) or ""
+        for i in range(self._scanned, len(self.text)):
+            self._scan(i, self.text[i])
+        self._scanned = len(self.text)
+        return self._ready()
+
+    def _scan(self, i: int, c: str) -> None:
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif c == "\\":
+                self._escaped = True
+            elif c == '"':
+                self._in_string = False
+                self._string_closed(i)
+        elif c == '"':
+            self._in_string = True
+            self._string_start = i
+        elif c in "{[":
+            if c == "{" and self._stack == ["{", "["] and self._key == "scenes":
+                self._scene_start = i
+            self._stack.append(c)
+            self._expect_key = self._stack == ["{"]
+        elif c in "}]":
+            if self._stack:
+                self._stack.pop()
+            if c == "}" and self._scene_start is not None and self._stack == ["{", "["]:
+                raw = json.loads(self.text[self._scene_start : i + 1])
+                self._scene_start = None
+                self._scene_closed(raw if isinstance(raw, dict) else {})
+        elif c == "," and self._stack == ["{"]:
+            self._expect_key = True
+
+    def _string_closed(self, end: int) -> None:
+        if self._stack != ["{"]:
+            return
+        value = json.loads(self.text[self._string_start : end + 1])
+        if self._expect_key:
+            self._key = value
+            self._expect_key = False
+        elif self._key == "title":
+            self.title = value.strip() or "Untitled Story"
+
+    def _scene_closed(self, raw: dict) -> None:
+        if len(self.scenes) + len(self._pending) >= self.max_paragraphs:
+            return
+        scene = _clean_scene(str(raw.get("text") or ""), str(raw.get("image_prompt") or ""))
+        if scene is not None:
+            self._pending.append(scene)
+
+    def _ready(self) -> list[DraftScene]:
+        if self.title is None:
+            return []
+        ready = [
+            DraftScene(position=len(self.scenes) + n, title=self.title, text=text, image_prompt=prompt)
+            for n, (text, prompt) in enumerate(self._pending)
+        ]
+        self._pending = []
+        self.scenes.extend(ready)
+        return ready
+
+    def finish(self) -> tuple[list[DraftScene], StoryDraft]:
+        """The scenes still held back, and the complete draft."""
+        try:
+            parsed = _StorySchema.model_validate_json(self.text)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            if self.scenes:
+                raise GenerationError("Story stream ended partway through the draft")
+            raise _blocked(self.feedback)
+        if self.title is None:
+            self.title = parsed.title.strip() or "Untitled Story"
+        rest = self._ready()
+        if not self.scenes:
+            raise GenerationError("Story model returned no paragraphs")
+        draft = StoryDraft(
+            title=self.title,
+            paragraphs=[scene.text for scene in self.scenes],
+            image_prompts=[scene.image_prompt for scene in self.scenes],
+            moral=parsed.moral,
+            usage=self.usage,
         )
+        return rest, draft
+
+
+def _blocked(feedback) -> GenerationError:
+    """Blocked or empty response — surface safety feedback if present."""
+    return GenerationError(
+        f"Story model returned no parsable content (feedback: {feedback})",
+        user_message="We couldn't write a story for that idea. Please try a gentler, kid-friendly idea.",
+        # Must be set wherever user_message is. The client prefers the
+        # code over the stored prose, so leaving this generic would tell
+        # a Nepali parent only "it failed, try again" and translate away
+        # the one instruction that changes the outcome — soften the idea.
+        code=GENERATION_BLOCKED,
     )
 
 
@@ -177,39 +452,48 @@ class GeminiProvider(GenerationProvider):
 
     async def _with_retry(self, fn, *, attempts: int = 3, base_delay: float = 2.0):
         timeout = get_settings().generation_call_timeout_seconds
+        limiter = _get_limiter()
         last: Exception | None = None
         for attempt in range(attempts):
+            await limiter.acquire()
             try:
                 # Hard per-call timeout: a hung connection must not pin a worker
                 # slot until the queue-level job timeout.
-                return await asyncio.wait_for(fn(), timeout=timeout)
+                result = await asyncio.wait_for(fn(), timeout=timeout)
             except Exception as e:  # SDK raises many exception types; classify by message
                 last = e
-                retryable = isinstance(e, asyncio.TimeoutError) or any(
-                    m in str(e) for m in _RETRYABLE_MARKERS
-                )
+                outcome, hint, retryable = _classify(e)
+                await limiter.release(outcome, retry_after=hint)
                 if attempt < attempts - 1 and retryable:
-                    delay = base_delay * (2**attempt)
+                    delay = _backoff(attempt, hint, base_delay)
                     logger.warning(
                         "Gemini call failed (attempt %d, retrying in %.1fs): %s", attempt + 1, delay, e
                     )
                     await asyncio.sleep(delay)
                     continue
                 raise
+            except BaseException:
+                await limiter.release("failed")
+                raise
+            await limiter.release()
+            return result
         raise last  # pragma: no cover
 
-    async def write_story(self, req: StoryRequest) -> StoryDraft:
+    def _story_config(self):
         from google.genai import types
 
+        return types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=_StorySchema,
+            temperature=0.9,
+        )
+
+    async def write_story(self, req: StoryRequest) -> StoryDraft:
         async def call():
             return await self.client.aio.models.generate_content(
                 model=self.story_model,
                 contents=_story_instruction(req),
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json",
-                    response_schema=_StorySchema,
-                    temperature=0.9,
-                ),
+                config=self._story_config(),
             )
 
         try:
@@ -220,42 +504,84 @@ class GeminiProvider(GenerationProvider):
 
         parsed: _StorySchema | None = getattr(resp, "parsed", None)
         if parsed is None:
-            # Blocked or empty response — surface safety feedback if present.
-            feedback = getattr(resp, "prompt_feedback", None)
-            raise GenerationError(
-                f"Story model returned no parsable content (feedback: {feedback})",
-                user_message="We couldn't write a story for that idea. Please try a gentler, kid-friendly idea.",
-                # Must be set wherever user_message is. The client prefers the
-                # code over the stored prose, so leaving this generic would tell
-                # a Nepali parent only "it failed, try again" and translate away
-                # the one instruction that changes the outcome — soften the idea.
-                code=GENERATION_BLOCKED,
-            )
+            raise _blocked(getattr(resp, "prompt_feedback", None))
 
-        paragraphs = [p.strip() for p in parsed.paragraphs if p.strip()][: req.max_paragraphs]
-        prompts = [p.strip() for p in parsed.image_prompts]
-        # Realign defensively: exactly one image prompt per paragraph; a missing
-        # prompt falls back to that SAME paragraph's text, keeping scenes matched.
-        prompts = [
-            prompts[i] if i < len(prompts) and prompts[i] else paragraphs[i] for i in range(len(paragraphs))
-        ]
-        if not paragraphs:
+        scenes = [s for s in (_clean_scene(s.text, s.image_prompt) for s in parsed.scenes) if s]
+        scenes = scenes[: req.max_paragraphs]
+        if not scenes:
             raise GenerationError("Story model returned no paragraphs")
         return StoryDraft(
             title=parsed.title.strip() or "Untitled Story",
-            paragraphs=paragraphs,
-            image_prompts=prompts,
+            paragraphs=[text for text, _ in scenes],
+            image_prompts=[prompt for _, prompt in scenes],
             moral=parsed.moral,
             usage=_usage_of(resp),
         )
 
+    async def write_story_stream(self, req: StoryRequest) -> AsyncIterator[DraftScene | StoryDraft]:
+        """The story from generate_content_stream, each scene yielded as soon
+        as its JSON object closes. Retried like any call until the first scene
+        is out; after that the pages are saved and a failure fails the story.
+
+        The limiter slot is held for the whole stream: it is one call, however
+        long the model takes to write it.
+        """
+        timeout = get_settings().generation_call_timeout_seconds
+        limiter = _get_limiter()
+        attempts = 3
+        for attempt in range(attempts):
+            stream = _SceneStream(req.max_paragraphs)
+            await limiter.acquire()
+            try:
+                # Hard per-call timeout on the opening and on every chunk: a
+                # stalled stream is a hung call like any other.
+                chunks = await asyncio.wait_for(
+                    self.client.aio.models.generate_content_stream(
+                        model=self.story_model,
+                        contents=_story_instruction(req),
+                        config=self._story_config(),
+                    ),
+                    timeout=timeout,
+                )
+                chunks = aiter(chunks)
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(anext(chunks), timeout=timeout)
+                    except StopAsyncIteration:
+                        break
+                    for scene in stream.feed(chunk):
+                        yield scene
+            except Exception as e:
+                outcome, hint, retryable = _classify(e)
+                await limiter.release(outcome, retry_after=hint)
+                if not stream.scenes and retryable and attempt < attempts - 1:
+                    delay = _backoff(attempt, hint, 2.0)
+                    logger.warning(
+                        "Gemini stream failed (attempt %d, retrying in %.1fs): %s", attempt + 1, delay, e
+                    )
+                    await asyncio.sleep(delay)
+                    continue
+                logger.error("Story generation failed: %s", e, exc_info=True)
+                raise GenerationError(f"Story generation failed: {e}") from e
+            except BaseException:
+                await limiter.release("failed")
+                raise
+            await limiter.release()
+            rest, draft = stream.finish()
+            for scene in rest:
+                yield scene
+            yield draft
+            return
+
+    def illustration_cache_key(self, image_prompt: str, *, title: str, position: int) -> str | None:
+        # Whitespace is normalised: the story model is inconsistent about it and
+        # it changes nothing the image model draws.
+        return f"{self.image_model}\n{' '.join(_illustration_prompt(image_prompt, title).split())}"
+
     async def illustrate(self, image_prompt: str, *, title: str, position: int) -> GeneratedImage:
         from google.genai import types
 
-        full_prompt = (
-            f"Children's picture-book illustration for the story '{title}'. {image_prompt} "
-            "Style: warm, colorful, whimsical storybook art, soft lighting, no text or captions in the image."
-        )
+        full_prompt = _illustration_prompt(image_prompt, title)
 
         async def call():
             return await self.client.aio.models.generate_content(
@@ -0,0 +1,263 @@
+"""Content-addressed illustration cache in front of any provider.
+
+An illustration is paid for once per distinct (model, built prompt). A failed
+story asked for again, a repeated idea, or a scene repeated on another page
+asks for the same pictures again; those come back from storage with no
+provider call and zero usage, so the ledger shows what was actually spent.
+
+Prompts carry a child's name and details, so entries belong to the family
+that paid for them: they live under users/{id}/illustrations/, named by a
+SHA-256 of the provider's cache key (the prompt itself is never stored in a
+name), and one family's prompt never answers another's. They go with the
+account, and a story's own pictures go with the story.
+
+The size bound is an LRU index shared by every process: a sorted set of
+entries by last use, with their sizes, in Redis with ARQ, and in this process
+inline. Entries written while the index was unreachable join it when they are
+next hit; an object-store lifecycle rule is the backstop for the rest.
+"""
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterable
+
+from .. import kv, metrics
+from ..config import get_settings
+from ..storage import Storage
+from .base import DraftScene, GeneratedImage, GenerationProvider, StoryDraft, StoryRequest, Usage
+
+logger = logging.getLogger(__name__)
+
+# Where the cache shared by every family once lived; see purge_shared_cache.
+_SHARED_PREFIX = "illustrations/"
+_LRU = "illustration-cache:lru"
+_SIZES = "illustration-cache:sizes"
+_BYTES = "illustration-cache:bytes"
+
+
+def _sniff_mime(data: bytes) -> str:
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/png"
+
+
+def user_prefix(user_id: str) -> str:
+    return f"users/{user_id}/illustrations/"
+
+
+def entry_key(user_id: str, cache_key: str) -> str:
+    return user_prefix(user_id) + hashlib.sha256(cache_key.encode()).hexdigest()
+
+
+class _LocalIndex:
+    """Inline: the worker and the API are one process, so a dict is exact."""
+
+    def __init__(self):
+        self._sizes: OrderedDict[str, int] = OrderedDict()  # entry -> size, oldest first
+        self._bytes = 0
+
+    async def touch(self, entry: str, size: int) -> int:
+        if entry in self._sizes:
+            self._sizes.move_to_end(entry)
+        else:
+            self._sizes[entry] = size
+            self._bytes += size
+        return self._bytes
+
+    async def pop_oldest(self) -> tuple[str, int] | None:
+        if not self._sizes:
+            return None
+        entry, size = self._sizes.popitem(last=False)
+        self._bytes -= size
+        return entry, size
+
+    async def remove(self, entries: Iterable[str]) -> None:
+        for entry in entries:
+            self._bytes -= self._sizes.pop(entry, 0)
+
+    async def matching(self, prefix: str) -> list[str]:
+        return [entry for entry in self._sizes if entry.startswith(prefix)]
+
+
+class _RedisIndex:
+    """With ARQ: every API and worker process shares one bound. ZPOPMIN is
+    atomic, so two processes evicting at once never pick the same entry."""
+
+    async def touch(self, entry: str, size: int) -> int:
+        redis = await kv.get_redis()
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(_LRU, {entry: time.time()})
+            pipe.hsetnx(_SIZES, entry, size)
+            _, added = await pipe.execute()
+        if added:
+            return await redis.incrby(_BYTES, size)
+        return int(await redis.get(_BYTES) or 0)
+
+    async def pop_oldest(self) -> tuple[str, int] | None:
+        redis = await kv.get_redis()
+        popped = await redis.zpopmin(_LRU)
+        if not popped:
+            return None
+        entry = popped[0][0]
+        return entry, await self._drop_size(redis, entry)
+
+    async def remove(self, entries: Iterable[str]) -> None:
+        redis = await kv.get_redis()
+        for entry in entries:
+            await redis.zrem(_LRU, entry)
+            await self._drop_size(redis, entry)
+
+    @staticmethod
+    async def _drop_size(redis, entry: str) -> int:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hget(_SIZES, entry)
+            pipe.hdel(_SIZES, entry)
+            size, removed = await pipe.execute()
+        # Only the caller that removed the size takes it off the total.
+        if not removed or not size:
+            return 0
+        await redis.decrby(_BYTES, int(size))
+        return int(size)
+
+    async def matching(self, prefix: str) -> list[str]:
+        redis = await kv.get_redis()
+        return [entry async for entry, _ in redis.zscan_iter(_LRU, match=prefix + "*")]
+
+
+_index: _LocalIndex | _RedisIndex | None = None
+
+
+def _get_index() -> _LocalIndex | _RedisIndex:
+    global _index
+    if _index is None:
+        _index = _RedisIndex() if get_settings().job_backend == "arq" else _LocalIndex()
+    return _index
+
+
+def reset_cache_index() -> None:
+    """Test helper."""
+    global _index
+    _index = None
+
+
+class CachingProvider(GenerationProvider):
+    """Wraps a provider for one family's stories; story text passes straight
+    through, illustrations are cached."""
+
+    def __init__(self, inner: GenerationProvider, *, storage: Storage, user_id: str, max_bytes: int):
+        self.inner = inner
+        self.name = inner.name
+        self.storage = storage
+        self.user_id = user_id
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    async def write_story(self, req: StoryRequest) -> StoryDraft:
+        return await self.inner.write_story(req)
+
+    async def write_story_stream(self, req: StoryRequest) -> AsyncIterator[DraftScene | StoryDraft]:
+        async for item in self.inner.write_story_stream(req):
+            yield item
+
+    def illustration_cache_key(self, image_prompt: str, *, title: str, position: int) -> str | None:
+        return self.inner.illustration_cache_key(image_prompt, title=title, position=position)
+
+    async def illustrate(self, image_prompt: str, *, title: str, position: int) -> GeneratedImage:
+        key = self.inner.illustration_cache_key(image_prompt, title=title, position=position)
+        if key is None:
+            return await self.inner.illustrate(image_prompt, title=title, position=position)
+
+        entry = entry_key(self.user_id, key)
+        data = await self.storage.load_artifact(entry)
+        if data:
+            self.hits += 1
+            metrics.incr("illustration_cache_hits_total", provider=self.name)
+            await self._remember(entry, len(data))
+            return GeneratedImage(data=data, mime=_sniff_mime(data), usage=Usage())
+
+        self.misses += 1
+        metrics.incr("illustration_cache_misses_total", provider=self.name)
+        image = await self.inner.illustrate(image_prompt, title=title, position=position)
+        if image.ok and len(image.data) <= self.max_bytes:
+            try:
+                await self.storage.save_artifact(entry, image.data, content_type=image.mime)
+            except Exception as e:  # the picture is already paid for; never lose it to the cache
+                logger.warning("Could not cache illustration %d: %s", position, e)
+            else:
+                await self._remember(entry, len(image.data))
+        return image
+
+    async def _remember(self, entry: str, size: int) -> None:
+        """Mark an entry most recently used, then evict from the cold end."""
+        index = _get_index()
+        try:
+            total = await index.touch(entry, size)
+            while total > self.max_bytes:
+                popped = await index.pop_oldest()
+                if popped is None:
+                    break
+                victim, size = popped
+                total -= size
+                metrics.incr("illustration_cache_evictions_total", provider=self.name)
+                await self.storage.delete_artifacts(victim)
+            metrics.set_gauge("illustration_cache_bytes", max(0, total), provider=self.name)
+        except Exception as e:
+            # Unbounded until the index is back; the lifecycle rule still applies.
+            logger.warning("Illustration cache index unavailable: %s", e)
+
+
+def cached_illustrations(provider: GenerationProvider, user_id: str, story) -> set[str]:
+    """The entries a story's pages were (or would be) cached under; its pages
+    must be loaded. Entries drawn under a model the provider no longer uses
+    are left to the LRU and to account deletion."""
+    return {
+        entry_key(user_id, key)
+        for page in story.pages
+        if (
+            key := provider.illustration_cache_key(
+                page.image_prompt, title=story.title, position=page.position
+            )
+        )
+    }
+
+
+async def forget_user(storage: Storage, user_id: str) -> None:
+    """Remove a deleted account's whole cache."""
+    try:
+        entries = await _get_index().matching(user_prefix(user_id))
+        await _get_index().remove(entries)
+    except Exception as e:
+        logger.warning("Illustration cache index unavailable: %s", e)
+    try:
+        await storage.delete_artifacts(user_prefix(user_id))
+    except Exception as e:
+        logger.warning("Could not remove cached illustrations of a deleted account: %s", e)
+
+
+async def forget_illustrations(storage: Storage, entries: set[str]) -> None:
+    """Remove entries (from cached_illustrations) from the cache. Best effort."""
+    if not entries:
+        return
+    try:
+        await _get_index().remove(entries)
+    except Exception as e:
+        logger.warning("Illustration cache index unavailable: %s", e)
+    for entry in entries:
+        try:
+            await storage.delete_artifacts(entry)
+        except Exception as e:
+            logger.warning("Could not remove a cached illustration: %s", e)
+
+
+async def purge_shared_cache(storage: Storage) -> None:
+    """Delete the entries of the cache every family used to share. They were
+    never removed with their stories; once gone this is one empty listing."""
+    try:
+        await storage.delete_artifacts(_SHARED_PREFIX)
+    except Exception as e:
+        logger.warning("Could not purge the shared illustration cache: %s", e)
@@ -0,0 +1,86 @@
+"""Illustration post-processing: a compressed display image plus fixed-size thumbnails.
+
+Providers return full-size PNGs. Served as they are, a library of twelve covers
+is tens of megabytes. Each stored illustration becomes:
+
+- display: the reader's image, at most DISPLAY_MAX_SIDE, in WebP (or AVIF)
+- cover:   up to COVER_SIZE, cropped to 3:2, JPEG because it is also the
+           og:image and link-preview crawlers still do not all read WebP
+- grid:    up to GRID_SIZE, cropped to 3:2, for the library cards
+
+Everything here runs in the CPU pool (app.cpu), so this module imports
+nothing from the app: a spawned worker imports only Pillow and this file.
+"""
+
+import io
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps, features
+
+DISPLAY_MAX_SIDE = 1536
+COVER_SIZE = (960, 640)
+GRID_SIZE = (480, 320)
+
+_MIME = {"webp": "image/webp", "avif": "image/avif", "jpeg": "image/jpeg"}
+
+
+@dataclass(frozen=True)
+class Rendition:
+    data: bytes
+    mime: str
+
+
+@dataclass(frozen=True)
+class ProcessedImage:
+    display: Rendition
+    cover: Rendition
+    grid: Rendition
+
+
+def resolve_format(requested: str) -> str:
+    """The display format to use: AVIF only where this Pillow build can write it."""
+    if requested == "avif" and not features.check("avif"):
+        return "webp"
+    return requested
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> Rendition:
+    buf = io.BytesIO()
+    if fmt == "jpeg":
+        if img.mode != "RGB":
+            # JPEG has no alpha; flatten onto white, the colour of the page.
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A") if "A" in img.getbands() else None)
+            img = background
+        img.save(buf, "JPEG", quality=quality, optimize=True, progressive=True)
+    elif fmt == "webp":
+        img.save(buf, "WEBP", quality=quality, method=4)
+    else:
+        img.save(buf, fmt.upper(), quality=quality)
+    return Rendition(buf.getvalue(), _MIME[fmt])
+
+
+def _fit(img: Image.Image, size: tuple[int, int]) -> Image.Image:
+    """Crop to size's aspect ratio and scale down to it, never up: enlarging
+    a small source only spends bytes on blur."""
+    scale = min(1.0, img.width / size[0], img.height / size[1])
+    target = (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+    return ImageOps.fit(img, target, Image.Resampling.LANCZOS)
+
+
+def process_illustration(data: bytes, *, fmt: str = "webp", quality: int = 80) -> ProcessedImage:
+    """Decode once, emit every rendition. Raises on bytes Pillow cannot read."""
+    with Image.open(io.BytesIO(data)) as src:
+        src.load()
+        img = src.convert("RGBA" if "A" in src.getbands() or "transparency" in src.info else "RGB")
+
+    display = img.copy()
+    display.thumbnail((DISPLAY_MAX_SIDE, DISPLAY_MAX_SIDE), Image.Resampling.LANCZOS)
+    cover = _fit(img, COVER_SIZE)
+    # From the cover, not the original: same crop, far fewer pixels to filter.
+    grid = _fit(cover, GRID_SIZE)
+    return ProcessedImage(
+        display=_encode(display, fmt, quality),
+        cover=_encode(cover, "jpeg", quality),
+        grid=_encode(grid, fmt, quality),
+    )
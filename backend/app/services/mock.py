@@ -1,20 +1,22 @@
 """Deterministic mock provider — full pipeline works with no API key.
 
 Stories are templated from the prompt; illustrations are generated locally with
-Pillow (soft gradient + simple shapes + caption), so the end-to-end flow
+Pillow (soft gradient + simple shapes + caption) in the CPU pool, so the end-to-end flow
 (queue, progress, storage, frontend, PDF) is fully testable offline.
 """
 
 import asyncio
 import hashlib
 import random
+from collections.abc import AsyncIterator
 from io import BytesIO
 
 from PIL import Image, ImageDraw
 
+from ..cpu import run_cpu
 from . import cast as cast_service
 from . import reading_level
-from .base import GeneratedImage, GenerationProvider, StoryDraft, StoryRequest
+from .base import DraftScene, GeneratedImage, GenerationProvider, StoryDraft, StoryRequest
 
 _PALETTES = [
     ((255, 214, 165), (255, 111, 97)),  # sunrise
@@ -92,6 +94,25 @@ class MockProvider(GenerationProvider):
 
     async def write_story(self, req: StoryRequest) -> StoryDraft:
         await asyncio.sleep(0.8)  # simulate model latency so progress UI is visible
+        return self._draft(req)
+
+    async def write_story_stream(self, req: StoryRequest) -> AsyncIterator[DraftScene | StoryDraft]:
+        """Same story, delivered the way a streaming model delivers it.
+
+        The same 0.8s in total, but the first scene lands well before the
+        last, so the overlap of writing and illustrating is genuinely
+        exercised offline rather than collapsing into the whole-draft path.
+        """
+        draft = self._draft(req)
+        scenes = draft.scenes()
+        await asyncio.sleep(0.35)
+        for i, scene in enumerate(scenes):
+            if i:
+                await asyncio.sleep(0.45 / max(1, len(scenes) - 1))
+            yield scene
+        yield draft
+
+    def _draft(self, req: StoryRequest) -> StoryDraft:
         rng = random.Random(hashlib.sha256(req.prompt.encode()).hexdigest())
         cast = cast_service.from_json(req.cast_json)
         kids = cast_service.children(cast)
@@ -140,47 +161,56 @@ class MockProvider(GenerationProvider):
 
     async def illustrate(self, image_prompt: str, *, title: str, position: int) -> GeneratedImage:
         await asyncio.sleep(0.5 + (position % 3) * 0.3)  # staggered latency for realistic progress
-        seed = int(hashlib.sha256(f"{title}:{position}".encode()).hexdigest(), 16)
-        rng = random.Random(seed)
-        top, bottom = _PALETTES[seed % len(_PALETTES)]
-
-        w, h = 768, 512
-        img = Image.new("RGB", (w, h))
-        draw = ImageDraw.Draw(img)
-        for y in range(h):  # vertical gradient
-            t = y / h
-            draw.line(
-                [(0, y), (w, y)],
-                fill=tuple(int(top[c] + (bottom[c] - top[c]) * t) for c in range(3)),
-            )
-        # hills
-        hill = tuple(max(0, c - 60) for c in bottom)
-        draw.polygon(
-            [(0, h), (0, h - 90), (w * 0.35, h - 190), (w * 0.7, h - 80), (w, h - 150), (w, h)], fill=hill
-        )
-        # sun/moon
-        cx, cy, r = rng.randint(100, w - 100), rng.randint(70, 160), rng.randint(35, 55)
-        draw.ellipse([cx - r, cy - r, cx + r, cy + r], fill=(255, 250, 235))
-        # sparkles
-        for _ in range(24):
-            x, y = rng.randint(0, w), rng.randint(0, h - 200)
-            s = rng.randint(1, 3)
-            draw.ellipse([x, y, x + s, y + s], fill=(255, 255, 255))
-        # simple character: circle body + head
-        bx, by = w // 2 + rng.randint(-120, 120), h - 130
-        body = tuple(min(255, c + 40) for c in top)
-        draw.ellipse([bx - 38, by - 30, bx + 38, by + 60], fill=body, outline=(60, 40, 30), width=3)
-        draw.ellipse(
-            [bx - 24, by - 78, bx + 24, by - 30], fill=(250, 224, 196), outline=(60, 40, 30), width=3
-        )
-        draw.ellipse([bx - 12, by - 62, bx - 6, by - 56], fill=(40, 30, 30))
-        draw.ellipse([bx + 6, by - 62, bx + 12, by - 56], fill=(40, 30, 30))
-        draw.arc([bx - 10, by - 56, bx + 10, by - 42], 20, 160, fill=(40, 30, 30), width=2)
-        # scene number badge
-        draw.ellipse([w - 64, 16, w - 16, 64], fill=(255, 255, 255))
-        draw.text((w - 46, 28), str(position + 1), fill=(60, 40, 30))
-        draw.text((20, h - 30), "KathaSajha mock illustration", fill=(255, 255, 255))
-
-        buf = BytesIO()
-        img.save(buf, format="PNG")
-        return GeneratedImage(data=buf.getvalue(), mime="image/png")
+        # Drawing and PNG encoding are CPU work; on the event loop they stall
+        # every request in the process, and a load test would measure the mock.
+        data = await run_cpu(_render_illustration, title, position)
+        return GeneratedImage(data=data, mime="image/png")
+
+
+def _render_illustration(title: str, position: int) -> bytes:
+    """Draw the mock picture. Module-level and pure so it can run in the CPU pool."""
+    seed = int(hashlib.sha256(f"{title}:{position}".encode()).hexdigest(), 16)
+    rng = random.Random(seed)
+    top, bottom = _PALETTES[seed % len(_PALETTES)]
+
+    w, h = 768, 512
+    # Vertical gradient without a draw call per row: map a one-pixel-wide
+    # 0..255 ramp through a lookup table per channel, then stretch it sideways.
+    ramp = Image.linear_gradient("L").resize((1, h), Image.Resampling.BILINEAR)
+    column = Image.merge(
+        "RGB",
+        [ramp.point([round(top[c] + (bottom[c] - top[c]) * v / 255) for v in range(256)]) for c in range(3)],
+    )
+    img = column.resize((w, h), Image.Resampling.NEAREST)
+    draw = ImageDraw.Draw(img)
+    # hills
+    hill = tuple(max(0, c - 60) for c in bottom)
+    draw.polygon(
+        [(0, h), (0, h - 90), (w * 0.35, h - 190), (w * 0.7, h - 80), (w, h - 150), (w, h)], fill=hill
+    )
+    # sun/moon
+    cx, cy, r = rng.randint(100, w - 100), rng.randint(70, 160), rng.randint(35, 55)
+    draw.ellipse([cx - r, cy - r, cx + r, cy + r], fill=(255, 250, 235))
+    # sparkles
+    for _ in range(24):
+        x, y = rng.randint(0, w), rng.randint(0, h - 200)
+        s = rng.randint(1, 3)
+        draw.ellipse([x, y, x + s, y + s], fill=(255, 255, 255))
+    # simple character: circle body + head
+    bx, by = w // 2 + rng.randint(-120, 120), h - 130
+    body = tuple(min(255, c + 40) for c in top)
+    draw.ellipse([bx - 38, by - 30, bx + 38, by + 60], fill=body, outline=(60, 40, 30), width=3)
+    draw.ellipse([bx - 24, by - 78, bx + 24, by - 30], fill=(250, 224, 196), outline=(60, 40, 30), width=3)
+    draw.ellipse([bx - 12, by - 62, bx - 6, by - 56], fill=(40, 30, 30))
+    draw.ellipse([bx + 6, by - 62, bx + 12, by - 56], fill=(40, 30, 30))
+    draw.arc([bx - 10, by - 56, bx + 10, by - 42], 20, 160, fill=(40, 30, 30), width=2)
+    # scene number badge
+    draw.ellipse([w - 64, 16, w - 16, 64], fill=(255, 255, 255))
+    draw.text((w - 46, 28), str(position + 1), fill=(60, 40, 30))
+    draw.text((20, h - 30), "KathaSajha mock illustration", fill=(255, 255, 255))
+
+    buf = BytesIO()
+    # Light compression: the pipeline re-encodes it anyway, and level 6 spends
+    # most of this function's time squeezing bytes nobody keeps.
+    img.save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
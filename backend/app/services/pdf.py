@@ -20,25 +20,44 @@ Nothing is bundled and no download happens at render time.
 
 from __future__ import annotations
 
+import copy
+import functools
 import logging
 import os
+import threading
+import unicodedata
 from dataclasses import dataclass
 from datetime import UTC, datetime
 from io import BytesIO
 from pathlib import Path
+from typing import Literal
 
+from fontTools import ttLib
 from fpdf import FPDF
 from fpdf.enums import MethodReturnValue
-from PIL import Image
+from fpdf.fonts import SubsetMap, TTFFont
+from fpdf.line_break import BREAKING_SPACE_SYMBOLS_STR, FORM_FEED, NBSP, SOFT_HYPHEN
+from fpdf.util import FloatTolerance
+from PIL import Image, ImageFilter
 
 from ..config import get_settings
 
+try:
+    import uharfbuzz as hb
+    from fpdf.fonts import HarfBuzzFont
+except ImportError:  # no shaping; fpdf2 then renders Devanagari unshaped
+    hb = None
+
 logger = logging.getLogger(__name__)
 
 # The subsetter narrates every dropped glyph table at INFO — ~200 lines per
 # export with system Devanagari fonts. Real problems still surface as WARNING.
 logging.getLogger("fontTools.subset").setLevel(logging.WARNING)
 
+# Bump whenever a change here alters the bytes of a book already rendered.
+# Cached PDFs are keyed by it, so a bump retires every stored copy at once.
+RENDERER_VERSION = "2"
+
 PAGE_W, PAGE_H = 8.5, 11.0  # letter, inches
 MARGIN = 0.85
 TEXT_W = 6.4
@@ -54,7 +73,8 @@ class PdfUnavailableError(RuntimeError):
 @dataclass
 class PdfPage:
     text: str
-    image: bytes | None = None
+    # The illustration's bytes, or the path of a file holding them.
+    image: bytes | str | None = None
 
 
 # Preference order: serif reads more like a printed book, sans is a fine
@@ -68,9 +88,9 @@ _DEVA = ("NotoSerifDevanagari-Regular.ttf", "NotoSansDevanagari-Regular.ttf", "N
 _DEVA_BOLD = ("NotoSerifDevanagari-Bold.ttf", "NotoSansDevanagari-Bold.ttf", "NirmalaB.ttf", "mangalb.ttf")
 
 
-def _font_dirs() -> list[Path]:
+def _font_dirs(extra: str) -> list[Path]:
     dirs: list[Path] = []
-    for entry in get_settings().pdf_font_dirs.split(","):
+    for entry in extra.split(","):
         if entry.strip():
             dirs.append(Path(entry.strip()))
     backend = Path(__file__).resolve().parents[2]
@@ -80,8 +100,8 @@ def _font_dirs() -> list[Path]:
     return dirs
 
 
-def _find_font(candidates: tuple[str, ...]) -> Path | None:
-    for directory in _font_dirs():
+def _find_font(dirs: list[Path], candidates: tuple[str, ...]) -> Path | None:
+    for directory in dirs:
         for name in candidates:
             path = directory / name
             try:
@@ -92,34 +112,141 @@ def _find_font(candidates: tuple[str, ...]) -> Path | None:
     return None
 
 
+@dataclass(frozen=True)
+class _FontFiles:
+    latin: Path | None
+    latin_bold: Path | None
+    deva: Path | None
+    deva_bold: Path | None
+
+
+@functools.lru_cache(maxsize=4)
+def _resolve_fonts(extra_dirs: str) -> _FontFiles:
+    dirs = _font_dirs(extra_dirs)
+    latin = _find_font(dirs, _LATIN)
+    deva = _find_font(dirs, _DEVA)
+    return _FontFiles(
+        latin=latin,
+        latin_bold=_find_font(dirs, _LATIN_BOLD) or latin,
+        deva=deva,
+        deva_bold=_find_font(dirs, _DEVA_BOLD) or deva,
+    )
+
+
+def _font_files() -> _FontFiles:
+    """The fonts this host renders with, probed once per PDF_FONT_DIRS value.
+    A font installed while the process runs is picked up on restart."""
+    return _resolve_fonts(get_settings().pdf_font_dirs)
+
+
 def devanagari_font_available() -> bool:
     """Lets tests skip Nepali rendering on hosts with no Devanagari font."""
-    return _find_font(_DEVA) is not None
+    return _font_files().deva is not None
+
+
+@dataclass(frozen=True)
+class _ParsedFont:
+    template: TTFFont
+    data: bytes
+    face: object | None  # uharfbuzz.Face, when shaping is installed
+
+
+class _FontRegistry:
+    """Parsed fonts shared by every render in the process.
+
+    fpdf2's add_font reads and parses the whole TTF for each document, and the
+    Devanagari faces are large. Most of that work (cmap, widths, glyph ids) is
+    a property of the file, so it is done once per file here and each document
+    gets a shallow copy of the result. What a document changes is replaced on
+    its copy: the subset map and missing-glyph list, the fontTools object
+    (output() subsets it in place), and the HarfBuzz font (shaping sets its
+    size). The copy's fontTools object opens lazily from bytes held in memory,
+    so registering a font no longer touches the disk.
+
+    This leans on TTFFont's attributes, which fpdf2 does not promise; the
+    version is pinned, and anything unexpected falls back to add_font.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._parsed: dict[tuple[Path, str], _ParsedFont | None] = {}
+
+    def add(self, pdf: FPDF, family: str, style: str, path: Path) -> None:
+        parsed = self.parsed(family, style, path)
+        if parsed is None:
+            pdf.add_font(family, style, str(path))
+            return
+        font = copy.copy(parsed.template)
+        font.i = len(pdf.fonts) + 1
+        font.ttfont = ttLib.TTFont(BytesIO(parsed.data), recalcTimestamp=False, lazy=True)
+        font.subset = SubsetMap(font)
+        font.missing_glyphs = []
+        font.biggest_size_pt = 0
+        font._hbfont = HarfBuzzFont(parsed.face) if parsed.face is not None else None
+        pdf.fonts[font.fontkey] = font
+
+    def parsed(self, family: str, style: str, path: Path) -> _ParsedFont | None:
+        key = (path, f"{family}{style}")
+        with self._lock:  # renders run in threads; parse each file once
+            if key not in self._parsed:
+                self._parsed[key] = self._parse(path, f"{family}{style}", style)
+            return self._parsed[key]
+
+    @staticmethod
+    def _parse(path: Path, fontkey: str, style: str) -> _ParsedFont | None:
+        try:
+            data = path.read_bytes()
+            template = TTFFont(FPDF(), path, fontkey, style)
+            if template.color_font is not None or (template.is_cff and template.is_cid_keyed):
+                # Bound to the document they were parsed for; let fpdf2 handle them.
+                return None
+            face = hb.Face(hb.Blob(data)) if hb is not None else None
+        except Exception as e:
+            logger.warning("Font %s is registered per render instead of shared: %s", path.name, e)
+            return None
+        return _ParsedFont(template=template, data=data, face=face)
+
+
+_fonts = _FontRegistry()
+
+
+def warm_fonts() -> None:
+    """Probe and parse every font now, so the first book does not pay for it.
+    Called at startup; a host with no usable font only logs, since the PDF
+    endpoints already answer that with a 503."""
+    files = _font_files()
+    if files.latin is None:
+        logger.warning("No usable PDF font on this host; PDF export will be unavailable")
+        return
+    for family, style, path in _font_plan(files):
+        _fonts.parsed(family, style, path)
+
+
+def _font_plan(files: _FontFiles) -> list[tuple[str, str, Path]]:
+    plan = [("latin", "", files.latin), ("latin", "B", files.latin_bold)]
+    if files.deva is not None:
+        plan += [("deva", "", files.deva), ("deva", "B", files.deva_bold)]
+    return plan
 
 
 def _register_fonts(pdf: FPDF, language: str) -> str:
     """Register fonts and return the primary family for this language."""
-    latin = _find_font(_LATIN)
-    if latin is None:
+    files = _font_files()
+    if files.latin is None:
         raise PdfUnavailableError(
             "No usable font found. Install fonts-noto-core (Linux) or set PDF_FONT_DIRS."
         )
-    pdf.add_font("latin", "", str(latin))
-    pdf.add_font("latin", "B", str(_find_font(_LATIN_BOLD) or latin))
-
-    deva = _find_font(_DEVA)
-    if deva is not None:
-        pdf.add_font("deva", "", str(deva))
-        pdf.add_font("deva", "B", str(_find_font(_DEVA_BOLD) or deva))
+    for family, style, path in _font_plan(files):
+        _fonts.add(pdf, family, style, path)
 
     if language == "ne":
-        if deva is None:
+        if files.deva is None:
             raise PdfUnavailableError("Nepali story but no Devanagari-capable font on this host.")
         primary = "deva"
         pdf.set_fallback_fonts(["latin"])  # brand strings stay Latin
     else:
         primary = "latin"
-        if deva is not None:
+        if files.deva is not None:
             pdf.set_fallback_fonts(["deva"])  # a Nepali word inside an English story
 
     try:
@@ -131,19 +258,154 @@ def _register_fonts(pdf: FPDF, language: str) -> str:
     return primary
 
 
-def _image_size(data: bytes) -> tuple[int, int] | None:
+# An illustration's slot on a story page. The cover draws the same picture
+# smaller, so one copy prepared for this slot serves both.
+PICTURE_W, PICTURE_H = 6.3, 5.0
+
+
+@dataclass(frozen=True)
+class _Picture:
+    """An illustration decoded once and re-encoded for the size it is printed at."""
+
+    data: bytes
+    size: tuple[int, int]
+
+
+def _has_alpha(img: Image.Image) -> bool:
+    return img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+
+
+@functools.lru_cache(maxsize=2)
+def _cmyk_transform(icc_path: str):
+    from PIL import ImageCms
+
+    return ImageCms.buildTransform(
+        ImageCms.createProfile("sRGB"),
+        ImageCms.getOpenProfile(icc_path),
+        "RGB",
+        "CMYK",
+        renderingIntent=ImageCms.Intent.PERCEPTUAL,
+    )
+
+
+def _to_cmyk(img: Image.Image, icc_path: str) -> Image.Image:
+    from PIL import ImageCms
+
+    return ImageCms.applyTransform(img, _cmyk_transform(icc_path))
+
+
+def _prepare_image(
+    data: bytes | str, *, dpi: int, quality: int, for_print: bool = False, cmyk_profile: str = ""
+) -> _Picture | None:
+    """Resample an illustration to its slot at dpi and compress it, or None
+    when the bytes do not decode.
+
+    Embedded as stored, a full-size PNG costs megabytes per page of Flate
+    data for detail no screen shows and no printer resolves past its DPI.
+    Opaque pictures become JPEG; ones with real transparency stay PNG so the
+    cover's cream shows through. A JPEG already no larger than its slot is
+    kept byte for byte, since re-encoding it would only lose quality.
+
+    for_print also scales UP to dpi, sharpening a little to offset the
+    interpolation: stored illustrations are screen-sized, and a press shows
+    every soft pixel. Transparency is flattened onto the white page, since
+    print preflight rejects soft masks. With cmyk_profile, an ICC output
+    profile from the print vendor, colours are separated here rather than
+    left to the vendor's RIP.
+
+    The whole image is decoded here, not just its header: a truncated file
+    parses its header fine and only fails when the pixels are read.
+    """
     try:
-        with Image.open(BytesIO(data)) as im:
-            return im.size
+        with Image.open(BytesIO(data) if isinstance(data, bytes) else data) as src:
+            w, h = _fitted(src.size, PICTURE_W, PICTURE_H)
+            target = (max(1, round(w * dpi)), max(1, round(h * dpi)))
+            if not for_print and src.format == "JPEG" and src.mode == "RGB" and src.width <= target[0]:
+                src.load()
+                return _Picture(data if isinstance(data, bytes) else Path(data).read_bytes(), src.size)
+            size = src.size
+            # JPEG only: decode at the smallest power-of-two scale still
+            # at least target, so the resample below starts from fewer pixels.
+            src.draft("RGB", target)
+            src.load()
+            img = src.convert("RGBA" if _has_alpha(src) else "RGB")
     except Exception:
         return None
+    if img.width > target[0]:
+        img = img.resize(target, Image.Resampling.LANCZOS)
+    elif for_print and img.width < target[0]:
+        img = img.resize(target, Image.Resampling.LANCZOS)
+        img = img.filter(ImageFilter.UnsharpMask(radius=1.2, percent=60, threshold=2))
+    if for_print and img.mode == "RGBA":
+        flat = Image.new("RGB", img.size, (255, 255, 255))
+        flat.paste(img, mask=img.getchannel("A"))
+        img = flat
+    buf = BytesIO()
+    if img.mode == "RGBA" and img.getchannel("A").getextrema()[0] < 255:
+        img.save(buf, "PNG")
+    elif cmyk_profile:
+        _to_cmyk(img.convert("RGB"), cmyk_profile).save(buf, "JPEG", quality=quality, optimize=True)
+    else:
+        img.convert("RGB").save(buf, "JPEG", quality=quality, optimize=True)
+    return _Picture(buf.getvalue(), size)
+
+
+# A print sheet is the letter trim plus BLEED of artwork past it on every
+# side, so the guillotine's tolerance never leaves a white hairline, plus a
+# slug beyond that which carries the trim marks.
+BLEED = 0.125
+SLUG = 0.25
+
+
+class _Book(FPDF):
+    """The book's pages, laid out in letter trim coordinates.
 
+    On screen the sheet is the trim. For print (bleed > 0) each page sits
+    centred on a larger sheet, with trim marks in the slug and TrimBox and
+    BleedBox telling the printer where the page really is.
+    """
+
+    def __init__(self, *, bleed: float = 0.0) -> None:
+        self.bleed = bleed
+        self.offset = bleed + SLUG if bleed else 0.0
+        super().__init__(unit="in", format=(PAGE_W + 2 * self.offset, PAGE_H + 2 * self.offset))
+
+    def header(self) -> None:
+        if not self.offset:
+            return
+        k = self.k
+        # Every layout function draws in trim coordinates, exactly as for the
+        # screen; one transform at the top of the page's content stream moves
+        # all of it onto the sheet. fpdf2 has no public translate.
+        self._out(f"1 0 0 1 {self.offset * k:.2f} {-self.offset * k:.2f} cm")
+        # Nor an API for page boxes. media_box is written into the page
+        # dictionary verbatim, so the other two boxes ride along with it.
+        w, h, t, b = self.w * k, self.h * k, self.offset * k, SLUG * k
+        self.pages[self.page].media_box = (
+            f"[0 0 {w:.2f} {h:.2f}] /BleedBox [{b:.2f} {b:.2f} {w - b:.2f} {h - b:.2f}]"
+            f" /TrimBox [{t:.2f} {t:.2f} {w - t:.2f} {h - t:.2f}]"
+        )
+
+    def footer(self) -> None:
+        if not self.offset:
+            return
+        # Registration black, kept out of the bleed so trimming never shows one.
+        self.set_draw_color(0, 0, 0)
+        self.set_line_width(0.25 / 72)
+        near, far = self.bleed, self.offset
+        for x, y, dx, dy in ((0, 0, -1, -1), (PAGE_W, 0, 1, -1), (0, PAGE_H, -1, 1), (PAGE_W, PAGE_H, 1, 1)):
+            self.line(x + dx * near, y, x + dx * far, y)
+            self.line(x, y + dy * near, x, y + dy * far)
 
-def _cream_page(pdf: FPDF) -> None:
+
+def _cream_page(pdf: _Book) -> None:
     """Background and double frame shared by the cover and back cover."""
     pdf.add_page()
     pdf.set_fill_color(*CREAM)
-    pdf.rect(0, 0, PAGE_W, PAGE_H, style="F")
+    # Into the bleed on a print sheet: the cream must run off the trimmed edge.
+    bleed = pdf.bleed
+    edge = -bleed if bleed else 0.0  # not -0.0, which would change every screen book's bytes
+    pdf.rect(edge, edge, PAGE_W + 2 * bleed, PAGE_H + 2 * bleed, style="F")
     pdf.set_draw_color(*SEPIA)
     pdf.set_line_width(0.016)
     pdf.rect(0.42, 0.42, PAGE_W - 0.84, PAGE_H - 0.84)
@@ -162,24 +424,27 @@ def _fitted(size: tuple[int, int] | None, max_w: float, max_h: float) -> tuple[f
     return w, h
 
 
-def _framed_image(pdf: FPDF, data: bytes, *, y: float, max_w: float, max_h: float) -> float | None:
+def _framed_image(
+    pdf: FPDF, picture: _Picture | None, *, y: float, max_w: float, max_h: float
+) -> float | None:
     """Draw a centered image with a thin frame; return the y below it.
 
-    Returns None when the bytes cannot be drawn — a truncated file from an
-    interrupted write, or a zero-byte blob the provider marked "ok". One bad
-    image must degrade one page, never fail the book: the whole endpoint
-    500-ing over a corrupt illustration would break a share link that was
-    already handed out. The size probe alone is not enough — a truncated PNG
-    parses its header fine and only fails at draw time — so the draw itself
-    is guarded too.
+    Returns None when there is nothing to draw — a truncated file from an
+    interrupted write, or a zero-byte blob the provider marked "ok", which
+    _prepare_image already turned into None. One bad image must degrade one
+    page, never fail the book: the whole endpoint 500-ing over a corrupt
+    illustration would break a share link that was already handed out, so the
+    draw itself is guarded too.
+
+    fpdf2 embeds identical bytes once, so the cover and its page share one
+    image object.
     """
-    size = _image_size(data)
-    if size is None:
+    if picture is None:
         return None
-    w, h = _fitted(size, max_w, max_h)
+    w, h = _fitted(picture.size, max_w, max_h)
     x = (PAGE_W - w) / 2
     try:
-        pdf.image(BytesIO(data), x=x, y=y, w=w, h=h)
+        pdf.image(BytesIO(picture.data), x=x, y=y, w=w, h=h)
     except Exception as e:
         logger.warning("Illustration could not be drawn, degrading the page: %s", e)
         return None
@@ -189,6 +454,118 @@ def _framed_image(pdf: FPDF, data: bytes, *, y: float, max_w: float, max_h: floa
     return y + h
 
 
+# Characters fpdf2's line breaker treats specially (breaks, joins, hyphenates
+# or drops). Text containing any of them is measured by multi_cell itself.
+_SPECIAL = set(BREAKING_SPACE_SYMBOLS_STR + NBSP + SOFT_HYPHEN + FORM_FEED + "\r\t") - {" "}
+_RTL = {"R", "AL", "AN", "RLE", "RLO", "RLI"}
+# Within this fraction of the line width a scaled estimate is not trusted and
+# the break is decided the way fpdf2 decides it. Kerning across word
+# boundaries moves a line's width by far less.
+_AMBIGUOUS = 0.02
+
+
+class _Wrap:
+    """Line counts for one paragraph at any size, from one shaping pass.
+
+    multi_cell re-shapes the line so far for every character it adds, so a
+    dry run costs as much as the render, and _fit_text used to make up to five
+    of them before rendering. Advances scale linearly with size, so here each
+    word is shaped once and fpdf2's greedy wrap is replayed at any size by
+    scaling. Where the estimate lands within _AMBIGUOUS of the line width the
+    break is settled with fpdf2's own per-character test, so the count always
+    matches what multi_cell would produce.
+
+    Only plain text qualifies: every character in the current font (no
+    fallback font), left to right, single spaces and nothing in _SPECIAL.
+    of() returns None for anything else, and lines() returns None where
+    fpdf2 would have to break inside a word; the caller then asks multi_cell.
+    """
+
+    def __init__(self, pdf: FPDF, text: str) -> None:
+        self._pdf = pdf
+        self._font = pdf.current_font
+        self._size = pdf.font_size_pt
+        self._segments = [segment.split(" ") if segment else [] for segment in text.split("\n")]
+        self._widths: dict[str, float] = {}
+        # fpdf2 tests each character as (line so far) + (that character alone),
+        # so a kerned pair such as "V." counts at its unkerned width there. A
+        # word's peak is the furthest any of its characters reaches that way.
+        self._peaks: dict[str, float] = {}
+        for word in {word for segment in self._segments for word in segment}:
+            self._widths[word] = self._exact(word, self._size)
+            self._peaks[word] = max(
+                self._exact(word[:j], self._size) + self._exact(word[j], self._size) for j in range(len(word))
+            )
+        self._space = self._exact(" ", self._size)
+
+    @classmethod
+    def of(cls, pdf: FPDF, text: str) -> _Wrap | None:
+        cmap = getattr(pdf.current_font, "cmap", None)
+        if not text or not cmap:
+            return None
+        for c in text:
+            if c in _SPECIAL or unicodedata.bidirectional(c) in _RTL:
+                return None
+            if c not in " \n" and ord(c) not in cmap:
+                return None
+        for segment in text.split("\n"):
+            if segment != segment.strip(" ") or "  " in segment:
+                return None
+        return cls(pdf, text)
+
+    def _exact(self, text: str, size: float) -> float:
+        """Width exactly as fpdf2's line breaker computes it, in user units."""
+        if not text:
+            return 0.0
+        return self._font.get_text_width(text, size, self._pdf.text_shaping)[1] / self._pdf.k
+
+    def _overflows(self, line: str, word: str, size: float, limit: float) -> bool:
+        """fpdf2's test: does any character of word (and the space before it,
+        when line is not empty) take the line past the limit?"""
+        full = f"{line} {word}" if line else word
+        for j in range(len(line), len(full)):
+            width = self._exact(full[:j], size) + self._exact(full[j], size)
+            if width - limit > FloatTolerance.TOLERANCE:
+                return True
+        return False
+
+    def lines(self, size: float, width: float) -> int | None:
+        limit = width - 2 * self._pdf.c_margin
+        scale = size / self._size
+        slack = limit * _AMBIGUOUS
+        count = 0
+        for i, words in enumerate(self._segments):
+            line: list[str] = []
+            used = 0.0
+            for word in words:
+                if line:
+                    reach = used + (self._space + self._peaks[word]) * scale
+                    if reach <= limit - slack or (
+                        reach <= limit + slack and not self._overflows(" ".join(line), word, size, limit)
+                    ):
+                        line.append(word)
+                        used += (self._space + self._widths[word]) * scale
+                        continue
+                    count += 1
+                if self._peaks[word] * scale > limit - slack and self._overflows("", word, size, limit):
+                    return None  # wider than the line: fpdf2 breaks it mid-word
+                line = [word]
+                used = self._widths[word] * scale
+            # A newline ends a line even when it is empty; the text's end only
+            # ends one that has something on it.
+            if line or i < len(self._segments) - 1:
+                count += 1
+        return max(1, count)
+
+
+def _text_height(lines: int, leading: float) -> float:
+    """multi_cell's height for that many lines, summed the way it sums it."""
+    height = 0.0
+    for _ in range(lines):
+        height += leading
+    return height
+
+
 def _fit_text(pdf: FPDF, family: str, text: str, language: str, avail_h: float) -> tuple[float, float]:
     """Pick the largest size at which the paragraph fits the remaining sheet.
 
@@ -196,17 +573,36 @@ def _fit_text(pdf: FPDF, family: str, text: str, language: str, avail_h: float)
     pin. The model is asked for 60-110 words but nothing enforces it, and at
     ~150 words the text used to spill onto a continuation sheet that then
     carried the page number: the old exporter's blank-sheet bug, reborn.
+
+    Fitting only gets easier as the size drops, so the sizes are binary
+    searched, each measured by _Wrap rather than a multi_cell dry run.
     """
     base = 13.5
     base_leading = 0.34 if language == "ne" else 0.31
-    for size in (13.5, 12.5, 11.5, 10.5, 9.5):
+    sizes = (13.5, 12.5, 11.5, 10.5, 9.5)
+    pdf.set_font(family, "", base)
+    wrap = _Wrap.of(pdf, text)
+
+    def fits(size: float) -> bool:
         leading = base_leading * (size / base)
+        lines = wrap.lines(size, TEXT_W) if wrap is not None else None
+        if lines is not None:
+            return _text_height(lines, leading) <= avail_h
         pdf.set_font(family, "", size)
         height = pdf.multi_cell(
             TEXT_W, leading, text, align="L", dry_run=True, output=MethodReturnValue.HEIGHT
         )
-        if height <= avail_h:
-            return size, leading
+        return height <= avail_h
+
+    lo, hi = 0, len(sizes)  # the first fitting size is in sizes[lo:hi], or none is
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if fits(sizes[mid]):
+            hi = mid
+        else:
+            lo = mid + 1
+    if lo < len(sizes):
+        return sizes[lo], base_leading * (sizes[lo] / base)
     logger.warning("Story text does not fit even at 9.5pt; the tail will be clipped")
     return 9.5, base_leading * (9.5 / base)
 
@@ -224,7 +620,7 @@ def _page_furniture(pdf: FPDF, draw) -> None:
 
 
 def _cover(
-    pdf: FPDF, primary: str, *, title: str, hero_name: str, language: str, image: bytes | None
+    pdf: FPDF, primary: str, *, title: str, hero_name: str, language: str, image: _Picture | None
 ) -> None:
     _cream_page(pdf)
     # A cover is a fixed layout; nothing on it may ever paginate. With auto
@@ -234,9 +630,14 @@ def _cover(
     pdf.set_text_color(*SEPIA)
     title_size = 30.0
     pdf.set_font(primary, "B", title_size)
-    title_h = pdf.multi_cell(
-        PAGE_W - 1.9, 0.52, title, align="C", dry_run=True, output=MethodReturnValue.HEIGHT
-    )
+    wrap = _Wrap.of(pdf, title)
+    title_lines = wrap.lines(title_size, PAGE_W - 1.9) if wrap is not None else None
+    if title_lines is not None:
+        title_h = _text_height(title_lines, 0.52)
+    else:
+        title_h = pdf.multi_cell(
+            PAGE_W - 1.9, 0.52, title, align="C", dry_run=True, output=MethodReturnValue.HEIGHT
+        )
     if title_h > 3.0:  # a prompt-length title wraps to many lines at 30pt
         title_size = 22.0
         pdf.set_font(primary, "B", title_size)
@@ -264,19 +665,20 @@ def _cover(
     pdf.set_auto_page_break(True, margin=MARGIN)
 
 
-def _story_page(pdf: FPDF, primary: str, *, index: int, page: PdfPage, language: str) -> None:
+def _story_page(
+    pdf: FPDF, primary: str, *, index: int, page: PdfPage, picture: _Picture | None, language: str
+) -> None:
     pdf.add_page()
     top = 0.8
     text_y = None
-    if page.image is not None:
-        image_bottom = _framed_image(pdf, page.image, y=top, max_w=6.3, max_h=5.0)
-        if image_bottom is not None:
-            text_y = image_bottom + 0.45
+    image_bottom = _framed_image(pdf, picture, y=top, max_w=PICTURE_W, max_h=PICTURE_H)
+    if image_bottom is not None:
+        text_y = image_bottom + 0.45
     if text_y is None:
         # A missing illustration degrades the page; it never loses the story.
-        x = (PAGE_W - 6.3) / 2
+        x = (PAGE_W - PICTURE_W) / 2
         pdf.set_fill_color(*CREAM)
-        pdf.rect(x, top, 6.3, 2.0, style="F")
+        pdf.rect(x, top, PICTURE_W, 2.0, style="F")
         pdf.set_text_color(*SEPIA)
         pdf.set_font(primary, "", 11)
         pdf.set_xy(x, top + 0.85)
@@ -285,7 +687,7 @@ def _story_page(pdf: FPDF, primary: str, *, index: int, page: PdfPage, language:
             if language == "ne"
             else "The illustration for this page could not be created."
         )
-        pdf.multi_cell(6.3, 0.26, note, align="C")
+        pdf.multi_cell(PICTURE_W, 0.26, note, align="C")
         text_y = top + 2.45
 
     # One scene, one sheet: size the text to the space that is left, and keep
@@ -336,24 +738,44 @@ def build_story_pdf(
     hero_name: str,
     pages: list[PdfPage],
     created_at: datetime | None = None,
+    image_dpi: int = 150,
+    image_quality: int = 85,
+    profile: Literal["screen", "print"] = "screen",
+    cmyk_profile: str = "",
 ) -> bytes:
     """Render a story as a book: cover, one page per scene, back cover.
 
     Page count is exactly len(pages) + 2 — the property the old exporter
-    violated, and the one the tests pin.
+    violated, and the one the tests pin. Illustrations are embedded at
+    image_dpi: 150 reads sharp on any screen, print wants 300.
+
+    profile="print" is the print-on-demand file: bleed, trim marks and page
+    boxes around the same layout, pictures prepared for press (see
+    _prepare_image; cmyk_profile is an ICC output profile path).
     """
-    pdf = FPDF(unit="in", format="letter")
+    for_print = profile == "print"
+    pdf = _Book(bleed=BLEED if for_print else 0.0)
     pdf.set_margins(1.05, MARGIN)
     pdf.set_auto_page_break(True, margin=MARGIN)
     primary = _register_fonts(pdf, language)
 
+    pictures = [
+        _prepare_image(
+            p.image,
+            dpi=image_dpi,
+            quality=image_quality,
+            for_print=for_print,
+            cmyk_profile=cmyk_profile if for_print else "",
+        )
+        if p.image is not None
+        else None
+        for p in pages
+    ]
     # The first image that actually decodes; a corrupt first page must not
     # cost the cover its picture (or worse, the render).
-    cover_image = next(
-        (p.image for p in pages if p.image is not None and _image_size(p.image) is not None), None
-    )
+    cover_image = next((p for p in pictures if p is not None), None)
     _cover(pdf, primary, title=title, hero_name=hero_name, language=language, image=cover_image)
-    for i, page in enumerate(pages, start=1):
-        _story_page(pdf, primary, index=i, page=page, language=language)
+    for i, (page, picture) in enumerate(zip(pages, pictures, strict=True), start=1):
+        _story_page(pdf, primary, index=i, page=page, picture=picture, language=language)
     _back_cover(pdf, primary, language=language, hero_name=hero_name, created_at=created_at)
     return bytes(pdf.output())
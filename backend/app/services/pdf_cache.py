@@ -0,0 +1,218 @@
+"""Rendered-PDF cache, and the one render path that fills it.
+
+A complete story does not change, so neither does its book.
+
+Entries are keyed by a digest of everything the renderer reads (title,
+language, hero name, each page's text and image URL, the image DPI) plus
+RENDERER_VERSION.
+The same digest is the ETag, so a client revalidating gets a 304 from the
+story row alone: no storage read, no render. Anything that changes the book,
+such as a redrawn picture, changes the digest, so a stale entry is never
+served. Entries live under the story's artifact prefix and are deleted with
+its media, or when a redraw replaces one of their pictures.
+
+With PDF_PRERENDER the generation pipeline fills the cache in its finalizing
+stage, so the download endpoint only renders for books bound before that
+(or whose render failed there).
+
+Concurrent downloads of the same uncached book in one process share one
+render (cached_book): the first renders and saves it, the rest wait and then
+read the entry it saved.
+
+Books move as files, never as one bytes object: pictures are spooled to a
+scratch directory for the renderer, which writes the PDF there, and the
+endpoint streams it from disk. An export's memory stays flat however many
+pages it has.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+from collections.abc import Awaitable, Callable
+from typing import Literal
+from urllib.parse import quote
+
+from .. import metrics
+from ..config import get_settings
+from ..models import Story
+from ..storage import get_storage
+from .pdf import RENDERER_VERSION, PdfPage, build_story_pdf
+from .pdf_renderer import get_pdf_renderer
+
+logger = logging.getLogger(__name__)
+
+Profile = Literal["screen", "print"]
+
+# "{story_id}/{digest}" -> resolved once that book's render has ended, with
+# the exception that ended it, if any.
+_rendering: dict[str, asyncio.Future[Exception | None]] = {}
+
+
+# Pictures for press get more JPEG quality than the screen's: the file is
+# downloaded once by a print vendor, not by every phone on a slow network.
+_PRINT_QUALITY = 92
+
+
+def _render_options(profile: Profile) -> dict:
+    """build_story_pdf's profile-dependent arguments, from settings."""
+    s = get_settings()
+    if profile == "print":
+        return {
+            "profile": "print",
+            "image_dpi": s.pdf_print_dpi,
+            "image_quality": _PRINT_QUALITY,
+            "cmyk_profile": s.pdf_print_icc_profile,
+        }
+    return {"image_dpi": s.pdf_image_dpi}
+
+
+def book_digest(story: Story, profile: Profile = "screen") -> str:
+    """Content hash of a story as the renderer sees it. Pages must be loaded."""
+    material = [
+        RENDERER_VERSION,
+        *_render_options(profile).values(),
+        story.id,
+        story.title,
+        story.language,
+        story.hero_name,
+        [[page.text, page.image_url] for page in story.pages],
+    ]
+    return hashlib.sha256(json.dumps(material, ensure_ascii=False).encode()).hexdigest()
+
+
+def attachment_disposition(title: str, suffix: str = "") -> str:
+    """Content-Disposition for a downloaded book: an ASCII fallback name plus
+    the RFC 5987 UTF-8 one, so Devanagari titles survive."""
+    ascii_name = re.sub(r"[^A-Za-z0-9_-]+", "_", title).strip("_")[:60] or "story"
+    # safe="" so '/' is percent-encoded too; quote() already leaves nothing
+    # that could split the header, but an unescaped slash is invalid RFC 5987.
+    return (
+        f'attachment; filename="{ascii_name}{suffix}.pdf"; '
+        f"filename*=UTF-8''{quote(title[:80], safe='')}{suffix}.pdf"
+    )
+
+
+def scratch_dir() -> str:
+    """A private directory for one export's files: the pictures on their way
+    to the renderer and the book on its way out. Remove it with
+    remove_scratch once the book has been sent."""
+    return tempfile.mkdtemp(prefix="book-")
+
+
+def remove_scratch(workdir: str) -> None:
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _write_book(path: str, **book) -> None:
+    """Renderer side: the book goes back to the API as a file name, not as
+    bytes pickled across the process boundary and held there."""
+    data = build_story_pdf(**book)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+async def render_book(story: Story, workdir: str, profile: Profile = "screen") -> str:
+    """Render a story's book into workdir in the renderer pool; return its path.
+    Pages must be loaded. Raises PdfUnavailableError when the host has no
+    usable font, and RendererBusyError when the render queue is full. A print
+    render belongs to a background job, which waits for a slot instead.
+
+    The pictures are spooled to workdir as they are read and the renderer
+    reads them from there, so the API holds at most a few of them at once,
+    however long the book."""
+    path = os.path.join(workdir, "book.pdf")
+    renderer = get_pdf_renderer()
+    async with renderer.admitted() if profile == "screen" else contextlib.nullcontext():
+        images = await get_storage().spool_images([page.image_url for page in story.pages], workdir)
+        pdf_pages = [
+            PdfPage(text=page.text, image=image) for page, image in zip(story.pages, images, strict=True)
+        ]
+        await renderer.run(
+            _write_book,
+            path=path,
+            title=story.title or "A KathaSajha story",
+            language=story.language,
+            hero_name=story.hero_name,
+            pages=pdf_pages,
+            created_at=story.created_at,
+            **_render_options(profile),
+        )
+    return path
+
+
+def _key(story_id: str, digest: str) -> str:
+    return f"stories/{story_id}/pdf/{digest}.pdf"
+
+
+def export_key(story_id: str, profile: Profile, digest: str) -> str:
+    """Where a background export keeps its file. Not under pdf/, so a redraw
+    that drops the cached screen books leaves a finished print file alone."""
+    return f"stories/{story_id}/{profile}/{digest}.pdf"
+
+
+async def load_book(story_id: str, digest: str, workdir: str) -> str | None:
+    """The cached book as a file to serve, or None. Never write to the result:
+    on local storage it is the cache entry itself."""
+    path = await get_storage().load_artifact_file(_key(story_id, digest), os.path.join(workdir, "book.pdf"))
+    metrics.incr("pdf_cache_hits_total" if path else "pdf_cache_misses_total")
+    return path
+
+
+async def save_book(story_id: str, digest: str, path: str) -> None:
+    """Best-effort: the caller already has the book it came for."""
+    try:
+        await get_storage().save_artifact_file(_key(story_id, digest), path, content_type="application/pdf")
+    except Exception as e:
+        logger.warning("Could not cache the PDF for story %s: %s", story_id, e)
+
+
+async def cached_book(
+    story: Story, digest: str, workdir: str, render: Callable[[Story, str], Awaitable[str]]
+) -> str:
+    """The book as a file to serve: the cached entry, or one render(story,
+    workdir) saved to the cache. A miss while the same book is being rendered
+    waits for that render instead of starting another, then reads its entry,
+    or fails the way it did."""
+    key = f"{story.id}/{digest}"
+    while True:
+        path = await load_book(story.id, digest, workdir)
+        if path is not None:
+            return path
+        pending = _rendering.get(key)
+        if pending is None:
+            break
+        # wait(), not await: this caller's cancellation must not cancel the render.
+        await asyncio.wait({pending})
+        error = pending.result()
+        if error is not None:
+            raise error
+        # Saved, or not (the save is best-effort): look again, render if need be.
+
+    done: asyncio.Future[Exception | None] = asyncio.get_running_loop().create_future()
+    _rendering[key] = done
+    try:
+        path = await render(story, workdir)
+        await save_book(story.id, digest, path)
+    except Exception as e:
+        done.set_result(e)
+        raise
+    finally:
+        # Saved, or cancelled: either way the waiters look again.
+        if not done.done():
+            done.set_result(None)
+        del _rendering[key]
+    return path
+
+
+async def drop_books(story_id: str) -> None:
+    """Forget every rendered copy of a story, e.g. after one of its pictures changed."""
+    try:
+        await get_storage().delete_artifacts(f"stories/{story_id}/pdf/")
+    except Exception as e:
+        logger.warning("Could not drop cached PDFs for story %s: %s", story_id, e)
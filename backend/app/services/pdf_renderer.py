@@ -0,0 +1,113 @@
+"""The PDF renderer: its own process pool, behind a bounded queue.
+
+fpdf2's layout and HarfBuzz shaping are pure Python and hold the GIL, so a
+render in a thread stalls every request its process is serving. Renders run in
+a pool of their own (PDF_RENDER_WORKERS processes, fonts parsed once in each)
+so a burst of books cannot take the image encoders' slots either.
+
+Admission is bounded: at most PDF_RENDER_QUEUE renders wait behind the ones
+running. Past that the caller gets RendererBusyError carrying an estimate of
+when a slot frees, which the endpoints turn into a 503 with Retry-After. A
+share link going viral then costs its late arrivals a retry, not the API its
+latency. The cache in front (pdf_cache) means that burst is for one book, so
+the first render that lands serves everyone after it.
+
+PDF_RENDER_WORKERS=0 renders in a thread, one at a time, as before.
+"""
+
+import asyncio
+import math
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from typing import TypeVar
+
+from .. import metrics
+from ..config import get_settings
+from ..cpu import CpuPool
+from .pdf import warm_fonts
+
+T = TypeVar("T")
+
+# A first guess at one render, until real ones have been timed.
+_INITIAL_RENDER_SECONDS = 1.0
+_SMOOTHING = 0.2
+
+
+class RendererBusyError(RuntimeError):
+    """The render queue is full. retry_after is a whole number of seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"PDF renderer busy; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class PdfRenderer:
+    def __init__(self, workers: int, queue: int):
+        self.slots = max(1, workers)
+        self.capacity = self.slots + max(0, queue)
+        self._pool = CpuPool("PDF", lambda: workers, initializer=warm_fonts)
+        self._running = asyncio.Semaphore(self.slots)
+        self._pending = 0
+        self._render_seconds = _INITIAL_RENDER_SECONDS
+
+    @property
+    def pending(self) -> int:
+        """Renders running or waiting for a slot."""
+        return self._pending
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog has drained, by recent render times."""
+        return max(1, math.ceil(self._render_seconds * self._pending / self.slots))
+
+    @asynccontextmanager
+    async def admitted(self) -> AsyncIterator[None]:
+        """Hold a place in the queue. Raises RendererBusyError when it is full.
+        Taken before a render's inputs are read, so a rejection costs nothing."""
+        if self._pending >= self.capacity:
+            metrics.incr("pdf_renders_rejected_total")
+            raise RendererBusyError(self.retry_after())
+        self._pending += 1
+        metrics.set_gauge("pdf_renders_pending", self._pending)
+        try:
+            yield
+        finally:
+            self._pending -= 1
+            metrics.set_gauge("pdf_renders_pending", self._pending)
+
+    async def run(self, fn: Callable[..., T], /, **kwargs) -> T:
+        """Run fn(**kwargs) in the pool, once a slot is free. Call it admitted."""
+        async with self._running:
+            started = time.monotonic()
+            result = await self._pool.run(fn, **kwargs)
+            took = time.monotonic() - started
+        self._render_seconds += _SMOOTHING * (took - self._render_seconds)
+        metrics.incr("pdf_render_seconds_total", took)
+        metrics.incr("pdf_renders_total")
+        return result
+
+    def shutdown(self) -> None:
+        self._pool.shutdown()
+
+
+_renderer: PdfRenderer | None = None
+
+
+def get_pdf_renderer() -> PdfRenderer:
+    global _renderer
+    if _renderer is None:
+        s = get_settings()
+        _renderer = PdfRenderer(s.pdf_render_workers, s.pdf_render_queue)
+    return _renderer
+
+
+def shutdown_pdf_renderer() -> None:
+    global _renderer
+    if _renderer is not None:
+        _renderer.shutdown()
+        _renderer = None
+
+
+def reset_pdf_renderer() -> None:
+    """Test helper."""
+    shutdown_pdf_renderer()
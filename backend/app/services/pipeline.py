@@ -1,21 +1,52 @@
 """Story generation pipeline — runs inside the ARQ worker or inline in the API process.
 
-Stages: writing_story -> illustrating (parallel, progress per image) -> done.
+Stages: writing_story -> illustrating (parallel, progress per image)
+-> finalizing (with PDF_PRERENDER: the book is rendered and cached) -> done.
+With STREAM_STORY_TEXT the two overlap: each scene is saved and its
+illustration started as soon as the provider has finished writing it.
 Story text failure fails the job; individual image failures degrade gracefully.
+Each picture is re-encoded and thumbnailed in the CPU pool before it is stored.
+
+A single page's picture can also be redrawn on its own (regenerate_illustration):
+one image call, with the text and every other page left as they are.
+
+Re-running a job resumes it. Once the text is committed the job records a
+checkpoint, and a later run rebuilds the draft from the saved pages and only
+illustrates pages that never got a result, so a crash at image 4 of 5 costs
+one image on retry, not the whole story.
 """
 
 import asyncio
 import logging
+from dataclasses import dataclass
 
-from sqlalchemy import delete, select, update
+from sqlalchemy import ColumnElement, case, delete, select, update
+from sqlalchemy.orm import selectinload
 
+from .. import heartbeat, metrics
 from ..config import get_settings
+from ..cpu import run_cpu
 from ..db import get_session_factory
 from ..errors import GENERATION_FAILED
-from ..models import GenerationEvent, GenerationJob, Story, StoryPage
+from ..job_events import publish_job
+from ..models import GenerationEvent, GenerationJob, Story, StoryPage, User
+from ..plans import get_plan
+from ..quota import effective_plan_for
 from ..storage import get_storage
 from . import cast as cast_service
-from .base import GenerationError, GenerationProvider, StoryRequest, Usage
+from .base import (
+    DraftScene,
+    GeneratedImage,
+    GenerationError,
+    GenerationProvider,
+    StoryDraft,
+    StoryRequest,
+    Usage,
+)
+from .illustration_cache import CachingProvider
+from .imaging import process_illustration, resolve_format
+from .pdf_cache import book_digest, drop_books, remove_scratch, render_book, save_book, scratch_dir
+from .scheduler import ImageScheduler, get_image_scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -44,57 +75,631 @@ def reset_provider() -> None:
     _provider = None
 
 
-async def _record_usage(story_id: str, provider_name: str, usage: Usage) -> None:
-    """Attach consumption to this story's ledger entry.
+# Value of GenerationJob.checkpoint once the story text is durable.
+STORY_WRITTEN = "story_written"
+
+
+async def _add_usage(session, story_id: str, usage: Usage, *, provider_name: str = "") -> None:
+    """Add consumption to this story's ledger entry, inside the caller's transaction.
 
-    Best-effort telemetry: a failure here must never fail a story the customer
-    already has. Units are stored rather than money, so cost can be recomputed
-    for historical rows when rates are set or change.
+    Added rather than set, and written as it happens rather than at the end:
+    a job that crashes and resumes has paid for work across two runs, and
+    units are stored rather than money so cost can be recomputed for
+    historical rows when rates are set or change.
     """
+    values = {
+        "input_tokens": GenerationEvent.input_tokens + usage.input_tokens,
+        "output_tokens": GenerationEvent.output_tokens + usage.output_tokens,
+        "images": GenerationEvent.images + usage.images,
+    }
+    if provider_name:
+        values["provider"] = provider_name
+    await session.execute(
+        update(GenerationEvent)
+        .where(GenerationEvent.story_id == story_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def _log_usage(story_id: str) -> None:
+    """Log what this story consumed in total. Best-effort telemetry: a failure
+    here must never fail a story the customer already has."""
     try:
         settings = get_settings()
         async with get_session_factory()() as session:
             event = (
                 await session.execute(select(GenerationEvent).where(GenerationEvent.story_id == story_id))
             ).scalar_one_or_none()
-            if event is None:
-                return
-            event.provider = provider_name
-            event.input_tokens = usage.input_tokens
-            event.output_tokens = usage.output_tokens
-            event.images = usage.images
-            await session.commit()
+        if event is None:
+            return
         cost = settings.estimate_cost_usd(
-            input_tokens=usage.input_tokens,
-            output_tokens=usage.output_tokens,
-            images=usage.images,
+            input_tokens=event.input_tokens,
+            output_tokens=event.output_tokens,
+            images=event.images,
         )
         logger.info(
             "Generation cost recorded",
             extra={
                 "story_id": story_id,
-                "provider": provider_name,
-                "input_tokens": usage.input_tokens,
-                "output_tokens": usage.output_tokens,
-                "images": usage.images,
+                "provider": event.provider,
+                "input_tokens": event.input_tokens,
+                "output_tokens": event.output_tokens,
+                "images": event.images,
                 "estimated_cost_usd": cost,
                 "rates_configured": settings.cost_rates_configured,
             },
         )
     except Exception as e:
-        logger.error("Could not record usage for story %s: %s", story_id, e, exc_info=True)
+        logger.error("Could not log usage for story %s: %s", story_id, e, exc_info=True)
+
+
+class _JobLost(Exception):
+    """The job is no longer this run's to write."""
+
+
+def _owned(job_id: str) -> tuple[ColumnElement[bool], ...]:
+    """The job is still active and unclaimed or claimed by this worker. The
+    reaper fails (and refunds) the jobs of a worker that stops beating; one
+    that was only wedged must not come back and write them to life again."""
+    return (
+        GenerationJob.id == job_id,
+        GenerationJob.status.in_(("queued", "running")),
+        GenerationJob.worker_id.in_(("", heartbeat.worker_id())),
+    )
+
+
+async def _write_job(session, job_id: str, **fields) -> GenerationJob:
+    """Apply fields to the job inside the caller's transaction, in one guarded
+    UPDATE. Raises _JobLost when the job is gone or no longer this run's."""
+    job = (
+        await session.execute(
+            update(GenerationJob)
+            .where(*_owned(job_id))
+            .values(**fields)
+            .returning(GenerationJob)
+            .execution_options(synchronize_session=False)
+        )
+    ).scalar_one_or_none()
+    if job is None:
+        raise _JobLost(job_id)
+    return job
 
 
 async def _update_job(job_id: str, **fields) -> None:
-    """Write job progress in a fresh short-lived session (safe from parallel tasks)."""
+    """Write job progress in a fresh short-lived session (safe from parallel tasks)
+    and publish it to anyone streaming the job. Raises _JobLost like _write_job."""
     async with get_session_factory()() as session:
-        job = await session.get(GenerationJob, job_id)
-        if job is None:
+        job = await _write_job(session, job_id, **fields)
+        owner_id = await session.scalar(select(Story.user_id).where(Story.id == job.story_id))
+        await session.commit()
+    heartbeat.progressed()
+    await publish_job(job, owner_id or "")
+
+
+class PageResultWriter:
+    """Coalesces per-illustration results into one short transaction per window.
+
+    Writing each page and bumping progress in its own session cost two
+    round-trips per image, serialized behind a lock — ~80 per worker wave at
+    max_jobs=8. Results are buffered instead and written together: one
+    `UPDATE story_pages ... WHERE position IN (...)` plus one progress bump,
+    when `flush_batch` results are waiting or `flush_seconds` after the first
+    of them, whichever comes first. `close()` is the guaranteed final flush.
+
+    Progress stays monotonic: flushes are serialized, and each one writes the
+    count of results recorded before its snapshot, which only ever grows.
+    """
+
+    def __init__(
+        self, *, story_id: str, job_id: str, flush_seconds: float, flush_batch: int, owner_id: str = ""
+    ):
+        self.story_id = story_id
+        self.job_id = job_id
+        # Published with each progress snapshot, so polls can check ownership
+        # without a join. Unknown, the snapshot is dropped rather than cached.
+        self.owner_id = owner_id
+        self.flush_seconds = flush_seconds
+        self.flush_batch = max(1, flush_batch)
+        self.recorded = 0
+        # Pages expected so far. Fixed up front for a whole draft, growing while
+        # a streamed one arrives; written with every flush so the two agree.
+        self.total = 0
+        self._pending: dict[int, tuple[str, str, tuple[str, str]]] = {}
+        # Consumption of the pending results, written in the same transaction
+        # so the ledger never shows an image that was paid for but lost.
+        self._pending_usage = Usage()
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+
+    async def record(
+        self,
+        position: int,
+        url: str,
+        error: str,
+        usage: Usage | None = None,
+        *,
+        thumbs: tuple[str, str] = ("", ""),
+    ) -> None:
+        """thumbs is (cover, grid), written with the page's image_url."""
+        self._pending[position] = (url, error, thumbs)
+        self._pending_usage = self._pending_usage + (usage or Usage())
+        self.recorded += 1
+        if len(self._pending) >= self.flush_batch:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_seconds)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            # Nobody awaits this task; the rows stay pending for close().
+            logger.error("Deferred progress flush for story %s failed: %s", self.story_id, e)
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self._pending:
+                return
+            # Snapshot and count together, with no await in between, so the
+            # progress written always matches the pages written with it.
+            batch, self._pending = self._pending, {}
+            usage, self._pending_usage = self._pending_usage, Usage()
+            done = self.recorded
+            try:
+                matched = await self._write(batch, done, usage)
+            except Exception:
+                # Put the rows back (newer results win) so close() retries them.
+                self._pending = {**batch, **self._pending}
+                self._pending_usage = usage + self._pending_usage
+                raise
+        if matched < len(batch) and any(url for url, _, _ in batch.values()):
+            # Pages vanished while these illustrations were being made: the
+            # account or story was deleted mid-generation. The files were
+            # already written, and save_image recreates the very directory
+            # deletion just removed, so nothing else will ever reclaim them —
+            # the rows that would have pointed at them are gone. On a
+            # children's product that is a picture derived from a child's
+            # name sitting on a public media mount forever.
+            logger.info("Story %s disappeared mid-generation; removing orphaned media", self.story_id)
+            try:
+                await get_storage().delete_story_media(self.story_id)
+            except Exception as e:
+                logger.error("Could not remove orphaned media for %s: %s", self.story_id, e)
+
+    async def _write(
+        self, batch: dict[int, tuple[str, str, tuple[str, str]]], done: int, usage: Usage
+    ) -> int:
+        urls = {position: url for position, (url, _, _) in batch.items()}
+        errors = {position: err for position, (_, err, _) in batch.items()}
+        covers = {position: thumbs[0] for position, (_, _, thumbs) in batch.items()}
+        grids = {position: thumbs[1] for position, (_, _, thumbs) in batch.items()}
+        async with get_session_factory()() as session:
+            result = await session.execute(
+                update(StoryPage)
+                .where(StoryPage.story_id == self.story_id, StoryPage.position.in_(list(batch)))
+                .values(
+                    image_url=case(urls, value=StoryPage.position),
+                    image_error=case(errors, value=StoryPage.position),
+                    thumb_cover_url=case(covers, value=StoryPage.position),
+                    thumb_grid_url=case(grids, value=StoryPage.position),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            # RETURNING hands back the row to publish without another SELECT.
+            job = (
+                await session.execute(
+                    update(GenerationJob)
+                    .where(*_owned(self.job_id))
+                    .values(progress_current=done, progress_total=max(self.total, done))
+                    .returning(GenerationJob)
+                    .execution_options(synchronize_session=False)
+                )
+            ).scalar_one_or_none()
+            if usage != Usage():
+                await _add_usage(session, self.story_id, usage)
+            await session.commit()
+        heartbeat.progressed()
+        if job is not None:
+            await publish_job(job, self.owner_id)
+        return result.rowcount
+
+    async def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+
+# image_error is user-visible (owner UI); keep it generic and log the detail.
+GENERIC_IMAGE_ERROR = "The illustration for this page could not be generated."
+
+
+@dataclass(frozen=True)
+class StoredIllustration:
+    url: str
+    thumb_cover_url: str = ""
+    thumb_grid_url: str = ""
+
+    @property
+    def urls(self) -> list[str]:
+        return [u for u in (self.url, self.thumb_cover_url, self.thumb_grid_url) if u]
+
+
+async def _store_illustration(image: GeneratedImage, *, story_id: str, position: int) -> StoredIllustration:
+    """Post-process a generated picture in the CPU pool and store every rendition.
+
+    If the bytes cannot be processed the picture is stored as delivered,
+    without thumbnails: a page with a heavy image beats a page with none.
+    Storage errors propagate to the caller.
+    """
+    settings = get_settings()
+    storage = get_storage()
+    try:
+        processed = await run_cpu(
+            process_illustration,
+            image.data,
+            fmt=resolve_format(settings.image_display_format),
+            quality=settings.image_quality,
+        )
+    except Exception as e:
+        logger.warning(
+            "Post-processing image %d for story %s failed; storing it as is: %s", position, story_id, e
+        )
+        url = await storage.save_image(image.data, story_id=story_id, position=position, mime=image.mime)
+        return StoredIllustration(url)
+    url, cover, grid = await asyncio.gather(
+        *(
+            storage.save_image(r.data, story_id=story_id, position=position, mime=r.mime, variant=variant)
+            for variant, r in (("", processed.display), ("cover", processed.cover), ("grid", processed.grid))
+        )
+    )
+    return StoredIllustration(url, cover, grid)
+
+
+class _Illustrations:
+    """The illustrating stage: one task per page, started as soon as its prompt
+    exists. Calls wait their turn in the process-wide image scheduler."""
+
+    def __init__(
+        self,
+        provider: GenerationProvider,
+        *,
+        story_id: str,
+        writer: PageResultWriter,
+        scheduler: ImageScheduler,
+        priority: bool = False,
+    ):
+        self.provider = provider
+        self.story_id = story_id
+        self.writer = writer
+        self.scheduler = scheduler
+        self.priority = priority
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self, position: int, image_prompt: str, *, title: str) -> None:
+        self._tasks.append(asyncio.create_task(self._one(position, image_prompt, title)))
+
+    async def _one(self, position: int, image_prompt: str, title: str) -> None:
+        async with self.scheduler.slot(self.story_id, priority=self.priority):
+            image = await self.provider.illustrate(image_prompt, title=title, position=position)
+        stored, err = StoredIllustration(""), ""
+        if image.ok:
+            try:
+                stored = await _store_illustration(image, story_id=self.story_id, position=position)
+            except Exception as e:
+                logger.error(
+                    "Storing image %d for story %s failed: %s", position, self.story_id, e, exc_info=True
+                )
+                err = GENERIC_IMAGE_ERROR
+        else:
+            logger.warning("Illustration %d for story %s failed: %s", position, self.story_id, image.error)
+            err = GENERIC_IMAGE_ERROR
+        # The call was billed whether or not it produced a picture.
+        await self.writer.record(
+            position,
+            stored.url,
+            err,
+            image.usage,
+            thumbs=(stored.thumb_cover_url, stored.thumb_grid_url),
+        )
+
+    async def finish(self) -> None:
+        try:
+            await asyncio.gather(*self._tasks)
+        except BaseException:
+            # gather leaves the siblings running: stop them before they record
+            # into a closed writer and arm a timer nobody will cancel.
+            self.cancel()
+            # Whatever finished is durable even if a sibling task blew up, but
+            # a failed final flush must not replace the error that ended it.
+            try:
+                await self.writer.close()
+            except Exception as e:
+                logger.error("Final progress flush for story %s failed: %s", self.story_id, e)
+            raise
+        await self.writer.close()
+
+    def cancel(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
+
+async def _save_text(
+    story_id: str, provider_name: str, *, title: str, scenes: list[DraftScene], first: bool
+) -> bool:
+    """Persist the title and/or page skeletons. False means the story is gone.
+
+    The first write deletes any existing pages so a queue-level retry of this
+    job can't duplicate them.
+    """
+    async with get_session_factory()() as session:
+        story = await session.get(Story, story_id)
+        if story is None:
+            return False
+        if first:
+            story.title = title
+            story.status = "generating"
+            story.provider = provider_name
+            await session.execute(delete(StoryPage).where(StoryPage.story_id == story_id))
+        for scene in scenes:
+            session.add(
+                StoryPage(
+                    story_id=story_id,
+                    position=scene.position,
+                    text=scene.text,
+                    image_prompt=scene.image_prompt,
+                )
+            )
+        await session.commit()
+    return True
+
+
+async def _write_whole(
+    provider: GenerationProvider,
+    req: StoryRequest,
+    *,
+    story_id: str,
+    job_id: str,
+    illustrations: _Illustrations,
+) -> StoryDraft | None:
+    """The whole draft in one call, then every illustration at once."""
+    draft = await provider.write_story(req)
+    scenes = draft.scenes()
+    if not await _save_text(story_id, provider.name, title=draft.title, scenes=scenes, first=True):
+        return None
+    await _checkpoint_text(story_id, job_id, provider.name, draft.usage)
+    illustrations.writer.total = len(scenes)
+    await _update_job(job_id, stage="illustrating", progress_current=0, progress_total=len(scenes))
+    for scene in scenes:
+        illustrations.start(scene.position, scene.image_prompt, title=draft.title)
+    return draft
+
+
+async def _write_streaming(
+    provider: GenerationProvider,
+    req: StoryRequest,
+    *,
+    story_id: str,
+    job_id: str,
+    illustrations: _Illustrations,
+) -> StoryDraft | None:
+    """Persist each scene and start its illustration the moment it parses.
+
+    Time to first picture is the wait a parent actually feels, and it no longer
+    includes the rest of the text. The total grows as scenes arrive, so the
+    stage reads "illustrating" while the tail of the story is still being
+    written — which is exactly the overlap this mode exists for.
+    """
+    count = 0
+    async for item in provider.write_story_stream(req):
+        if isinstance(item, StoryDraft):
+            if count == 0:
+                raise GenerationError("Story stream ended without a single scene")
+            await _update_job(job_id, progress_total=count)
+            await _checkpoint_text(story_id, job_id, provider.name, item.usage)
+            return item
+        if not await _save_text(story_id, provider.name, title=item.title, scenes=[item], first=count == 0):
+            return None
+        if count == 0:
+            await _update_job(job_id, stage="illustrating", progress_current=0, progress_total=1)
+        count += 1
+        illustrations.writer.total = count
+        illustrations.start(item.position, item.image_prompt, title=item.title)
+    raise GenerationError("Story stream ended without a final draft")
+
+
+async def _checkpoint_text(story_id: str, job_id: str, provider_name: str, usage: Usage) -> None:
+    """Mark the text durable and charge for it, atomically.
+
+    One transaction, so a crash can never leave the text's cost recorded
+    without the checkpoint (charged twice on resume) or the reverse.
+    """
+    async with get_session_factory()() as session:
+        await _add_usage(session, story_id, usage, provider_name=provider_name)
+        await session.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id == job_id)
+            .values(checkpoint=STORY_WRITTEN)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+
+async def _resume(story_id: str, job_id: str, *, illustrations: _Illustrations) -> StoryDraft | None:
+    """Rebuild the draft from saved pages and illustrate only what is missing.
+
+    A page with an image_error was attempted and paid for; retrying it here
+    would spend again on a run that is only meant to recover lost work. Only
+    pages with no result at all (still in flight when the worker died) go back
+    to the provider. The draft's usage is zero because it is already recorded.
+    """
+    async with get_session_factory()() as session:
+        story = await session.get(Story, story_id)
+        if story is None:
+            return None
+        pages = (
+            (
+                await session.execute(
+                    select(StoryPage).where(StoryPage.story_id == story_id).order_by(StoryPage.position)
+                )
+            )
+            .scalars()
+            .all()
+        )
+        title = story.title
+    if not pages:
+        raise GenerationError("Checkpointed story has no saved pages")
+    missing = [p for p in pages if not p.image_url and not p.image_error]
+    writer = illustrations.writer
+    writer.total = len(pages)
+    writer.recorded = len(pages) - len(missing)
+    logger.info("Resuming story %s: %d of %d pages to illustrate", story_id, len(missing), len(pages))
+    await _update_job(
+        job_id, stage="illustrating", progress_current=writer.recorded, progress_total=len(pages)
+    )
+    for page in missing:
+        illustrations.start(page.position, page.image_prompt, title=title)
+    return StoryDraft(
+        title=title,
+        paragraphs=[p.text for p in pages],
+        image_prompts=[p.image_prompt for p in pages],
+    )
+
+
+async def regenerate_illustration(story_id: str, position: int) -> None:
+    """Redraw one page's picture; the entry point for a single-page redraw job.
+
+    The old picture stays on the page until the new one is stored. The swap is
+    a compare-and-set on the old URL, so a story deleted meanwhile is never
+    written to; whichever object lost is removed from storage. A failed redraw
+    keeps the old picture: the parent asked for a different one, not for none.
+    """
+    factory = get_session_factory()
+    async with factory() as session:
+        row = (
+            await session.execute(
+                select(StoryPage, Story)
+                .join(Story, Story.id == StoryPage.story_id)
+                .where(StoryPage.story_id == story_id, StoryPage.position == position)
+            )
+        ).one_or_none()
+        if row is None:
+            logger.info("regenerate_illustration: page %d of story %s is gone", position, story_id)
             return
-        for k, v in fields.items():
-            setattr(job, k, v)
+        page, story = row
+        if page.image_requested_at is None:
+            # A duplicate delivery of a redraw that already finished.
+            logger.info(
+                "regenerate_illustration: page %d of story %s has nothing pending", position, story_id
+            )
+            return
+        old = StoredIllustration(page.image_url, page.thumb_cover_url, page.thumb_grid_url)
+        image_prompt, title = page.image_prompt, story.title
+        owner = await session.get(User, story.user_id)
+        priority = get_plan(effective_plan_for(owner)).priority if owner else False
+
+    provider = get_provider()
+    storage = get_storage()
+    usage = Usage()
+    new = StoredIllustration("")
+    try:
+        async with get_image_scheduler().slot(story_id, priority=priority):
+            image = await provider.illustrate(image_prompt, title=title, position=position)
+        usage = image.usage
+        if image.ok:
+            new = await _store_illustration(image, story_id=story_id, position=position)
+        else:
+            logger.warning(
+                "Redraw of illustration %d for story %s failed: %s", position, story_id, image.error
+            )
+    except Exception as e:
+        logger.error(
+            "Redraw of illustration %d for story %s failed: %s", position, story_id, e, exc_info=True
+        )
+
+    values: dict = {"image_requested_at": None}
+    if new.url:
+        values.update(
+            image_url=new.url,
+            thumb_cover_url=new.thumb_cover_url,
+            thumb_grid_url=new.thumb_grid_url,
+            image_error="",
+        )
+    elif not old.url:
+        values["image_error"] = GENERIC_IMAGE_ERROR
+    async with factory() as session:
+        result = await session.execute(
+            update(StoryPage)
+            .where(
+                StoryPage.story_id == story_id,
+                StoryPage.position == position,
+                StoryPage.image_url == old.url,
+            )
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        # The call was billed whether or not it produced a picture.
+        if usage != Usage():
+            await _add_usage(session, story_id, usage)
         await session.commit()
 
+    # Whichever renditions no row points at any more go; nothing else would
+    # ever reclaim them.
+    swapped = bool(result.rowcount)
+    orphans = (old.urls if new.url else []) if swapped else new.urls
+    for url in orphans:
+        try:
+            await storage.delete_image(url)
+        except Exception as e:
+            logger.warning("Could not delete replaced image for story %s: %s", story_id, e)
+    if swapped and new.url:
+        # Any rendered book shows the old picture; its key can never be asked
+        # for again, so it is only taking up space.
+        await drop_books(story_id)
+        logger.info("Redrew illustration %d for story %s", position, story_id)
+
+
+async def _prerender_book(story_id: str) -> None:
+    """The finalizing stage: bind the book while the worker still has the story
+    warm, so the first download is a storage read. Best-effort: a failure here
+    costs one render at download time, never the story."""
+    async with get_session_factory()() as session:
+        story = (
+            await session.execute(
+                select(Story).where(Story.id == story_id).options(selectinload(Story.pages))
+            )
+        ).scalar_one_or_none()
+    if story is None:
+        return
+    workdir = scratch_dir()
+    try:
+        path = await render_book(story, workdir)
+    except Exception as e:
+        metrics.incr("pdf_prerender_failures_total")
+        logger.warning("Could not pre-render the PDF for story %s: %s", story_id, e)
+        return
+    else:
+        await save_book(story_id, book_digest(story), path)
+    finally:
+        await asyncio.to_thread(remove_scratch, workdir)
+
+
+async def _swept_if_deleted(story_id: str) -> bool:
+    """If the story is gone, remove whatever media this run wrote after its
+    deletion, and say so."""
+    async with get_session_factory()() as session:
+        if await session.get(Story, story_id) is not None:
+            return False
+    logger.info("Story %s deleted during generation; sweeping media", story_id)
+    try:
+        await get_storage().delete_story_media(story_id)
+    except Exception as e:
+        logger.error("Media sweep for deleted story %s failed: %s", story_id, e)
+    return True
+
 
 async def run_generation(story_id: str) -> None:
     """Entry point invoked by the job backend. Owns the story/job lifecycle."""
@@ -112,9 +717,20 @@ async def run_generation(story_id: str) -> None:
         if job is None:
             logger.error("run_generation: job for story %s not found", story_id)
             return
+        if job.status in ("complete", "failed"):
+            # A duplicate delivery of a finished job. Failed jobs were already
+            # refunded, so running one again would generate for free.
+            logger.info("run_generation: job for story %s already %s", story_id, job.status)
+            return
         job_id = job.id
+        owner_id = story.user_id
+        checkpoint = job.checkpoint
         # Read inside the session; the row is detached once it closes.
         story_cast_json = story.cast_json
+        # Decided once, at the start: a plan that lapses mid-story keeps its
+        # place in the queue for the rest of that story.
+        owner = await session.get(User, story.user_id)
+        priority = get_plan(effective_plan_for(owner)).priority if owner else False
         req = StoryRequest(
             prompt=story.prompt,
             language=story.language,
@@ -124,25 +740,54 @@ async def run_generation(story_id: str) -> None:
             reading_band=story.reading_band,
         )
 
+    cache: CachingProvider | None = None
     try:
         provider = get_provider()
-        await _update_job(job_id, status="running", stage="writing_story")
-
-        draft = await provider.write_story(req)
+        if settings.illustration_cache_max_mb > 0:
+            cache = CachingProvider(
+                provider,
+                storage=get_storage(),
+                user_id=owner_id,
+                max_bytes=settings.illustration_cache_max_mb * 1024 * 1024,
+            )
+        if checkpoint != STORY_WRITTEN:
+            await _update_job(
+                job_id, status="running", stage="writing_story", worker_id=heartbeat.worker_id()
+            )
 
-        # Persist title + page skeletons. Delete any existing pages first so a
-        # queue-level retry of this job can't duplicate them.
-        async with factory() as session:
-            story = await session.get(Story, story_id)
-            if story is None:
-                return
-            story.title = draft.title
-            story.status = "generating"
-            story.provider = provider.name
-            await session.execute(delete(StoryPage).where(StoryPage.story_id == story_id))
-            for i, (text, img_prompt) in enumerate(zip(draft.paragraphs, draft.image_prompts, strict=False)):
-                session.add(StoryPage(story_id=story_id, position=i, text=text, image_prompt=img_prompt))
-            await session.commit()
+        writer = PageResultWriter(
+            story_id=story_id,
+            job_id=job_id,
+            owner_id=owner_id,
+            flush_seconds=settings.progress_flush_seconds,
+            flush_batch=settings.progress_flush_batch,
+        )
+        illustrations = _Illustrations(
+            cache or provider,
+            story_id=story_id,
+            writer=writer,
+            scheduler=get_image_scheduler(),
+            priority=priority,
+        )
+        try:
+            if checkpoint == STORY_WRITTEN:
+                await _update_job(job_id, status="running", worker_id=heartbeat.worker_id())
+                draft = await _resume(story_id, job_id, illustrations=illustrations)
+            elif settings.stream_story_text:
+                draft = await _write_streaming(
+                    provider, req, story_id=story_id, job_id=job_id, illustrations=illustrations
+                )
+            else:
+                draft = await _write_whole(
+                    provider, req, story_id=story_id, job_id=job_id, illustrations=illustrations
+                )
+        except BaseException:
+            # Illustrations already in flight belong to a story that is about
+            # to be failed (or was deleted); stop paying for them.
+            illustrations.cancel()
+            raise
+        if draft is None:
+            return  # the story was deleted before its text could be saved
 
         # Measure whether every named child actually got to act. Logged, not
         # repaired: a repair call doubles the cost of the most expensive story
@@ -166,96 +811,43 @@ async def run_generation(story_id: str) -> None:
                 },
             )
 
-        total = len(draft.paragraphs)
-        await _update_job(job_id, stage="illustrating", progress_current=0, progress_total=total)
-
-        storage = get_storage()
-        semaphore = asyncio.Semaphore(settings.image_concurrency)
-        done_count = 0
-        total_usage = draft.usage
-        count_lock = asyncio.Lock()
-
-        # image_error is user-visible (owner UI); keep it generic and log the detail.
-        GENERIC_IMAGE_ERROR = "The illustration for this page could not be generated."
-
-        async def illustrate_one(position: int, image_prompt: str) -> None:
-            nonlocal done_count, total_usage
-            async with semaphore:
-                image = await provider.illustrate(image_prompt, title=draft.title, position=position)
-            url, err = "", ""
-            if image.ok:
-                try:
-                    url = await storage.save_image(
-                        image.data, story_id=story_id, position=position, mime=image.mime
-                    )
-                except Exception as e:
-                    logger.error(
-                        "Storing image %d for story %s failed: %s", position, story_id, e, exc_info=True
-                    )
-                    err = GENERIC_IMAGE_ERROR
-            else:
-                logger.warning("Illustration %d for story %s failed: %s", position, story_id, image.error)
-                err = GENERIC_IMAGE_ERROR
-            async with factory() as session:
-                page = (
-                    await session.execute(
-                        select(StoryPage).where(
-                            StoryPage.story_id == story_id, StoryPage.position == position
-                        )
-                    )
-                ).scalar_one_or_none()
-                if page is not None:
-                    page.image_url = url
-                    page.image_error = err
-                    await session.commit()
-                elif url:
-                    # The page vanished while this illustration was being made:
-                    # the account or story was deleted mid-generation. The file
-                    # was already written, and save_image recreates the very
-                    # directory deletion just removed, so nothing else will ever
-                    # reclaim it — the row that would have pointed at it is gone.
-                    # On a children's product that is a picture derived from a
-                    # child's name sitting on a public media mount forever.
-                    logger.info("Story %s disappeared mid-generation; removing orphaned media", story_id)
-                    try:
-                        await storage.delete_story_media(story_id)
-                    except Exception as e:
-                        logger.error("Could not remove orphaned media for %s: %s", story_id, e)
-            # Progress write stays inside the lock so a slower task can't
-            # overwrite a higher count with a lower one. Usage accumulates in
-            # the same critical section for the same reason.
-            async with count_lock:
-                done_count += 1
-                total_usage = total_usage + image.usage
-                await _update_job(job_id, progress_current=done_count)
-
-        await asyncio.gather(*(illustrate_one(i, p) for i, p in enumerate(draft.image_prompts)))
-
-        # Final sweep: if the story was deleted while the last images were in
-        # flight, every write after the endpoint's rmtree is orphaned. Cheap,
-        # and it closes the window the per-image check cannot (a save landing
-        # after that check but before deletion committed).
-        async with factory() as session:
-            if await session.get(Story, story_id) is None:
-                logger.info("Story %s deleted during generation; sweeping media", story_id)
-                try:
-                    await storage.delete_story_media(story_id)
-                except Exception as e:
-                    logger.error("Media sweep for deleted story %s failed: %s", story_id, e)
-                return
+        total = writer.total
+        await illustrations.finish()
+
+        if settings.pdf_prerender:
+            await _update_job(job_id, stage="finalizing")
+            await _prerender_book(story_id)
 
-        await _record_usage(story_id, provider.name, total_usage)
+        # Final sweep: if the story was deleted while the last images (or the
+        # book) were in flight, every write after the endpoint's rmtree is
+        # orphaned. Cheap, and it closes the window the per-image check cannot
+        # (a save landing after that check but before deletion committed).
+        if await _swept_if_deleted(story_id):
+            return
+
+        await _log_usage(story_id)
 
         async with factory() as session:
-            story = await session.get(Story, story_id)
-            if story is not None:
-                story.status = "complete"
-                await session.commit()
-        await _update_job(
-            job_id, status="complete", stage="done", progress_current=total, progress_total=total
-        )
+            job = await _write_job(
+                session, job_id, status="complete", stage="done", progress_current=total, progress_total=total
+            )
+            await session.execute(
+                update(Story)
+                .where(Story.id == story_id)
+                .values(status="complete")
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        await publish_job(job, owner_id)
         logger.info("Story %s generated (%d pages)", story_id, total)
 
+    except _JobLost:
+        # Deleted with its story, or failed by the reaper (and refunded) while
+        # this worker was unresponsive: the parent was told it failed.
+        if not await _swept_if_deleted(story_id):
+            logger.warning("Generation for story %s abandoned: its job was failed or taken over", story_id)
+        return
+
     except Exception as e:
         coded = isinstance(e, GenerationError)
         user_message = (
@@ -268,6 +860,18 @@ async def run_generation(story_id: str) -> None:
         error_code = e.code if coded else GENERATION_FAILED
         logger.error("Generation failed for story %s: %s", story_id, e, exc_info=True)
         async with factory() as session:
+            try:
+                job = await _write_job(
+                    session,
+                    job_id,
+                    status="failed",
+                    stage="failed",
+                    error=user_message,
+                    error_code=error_code,
+                )
+            except _JobLost:
+                # Failed already (and refunded), or deleted with its story.
+                return
             story = await session.get(Story, story_id)
             if story is not None:
                 story.status = "failed"
@@ -281,4 +885,4 @@ async def run_generation(story_id: str) -> None:
                 .values(refunded=True, refund_reason="generation_failed")
             )
             await session.commit()
-        await _update_job(job_id, status="failed", stage="failed", error=user_message, error_code=error_code)
+        await publish_job(job, owner_id)
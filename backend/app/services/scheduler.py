@@ -0,0 +1,196 @@
+"""Process-wide scheduler for image calls.
+
+The ceiling that matters is the provider's rate limit, and that is shared by
+every story a process is generating, not owned by any one of them. So image
+calls queue here rather than behind a semaphore per story: one ceiling for the
+process, a big story can use capacity its neighbours are not, and waiting
+stories are served round-robin so a five-page book cannot starve a one-page one.
+
+Plans that promise priority generation are served first, but not exclusively:
+one grant in every _PRIORITY_SHARE + 1 goes to a standard story while both are
+waiting, so "priority" never turns into "free stories stall forever".
+
+With IMAGE_CONCURRENCY_CLUSTER set, every call also takes a lease from a Redis
+sorted set, which bounds the calls of all workers together. A lease expires on
+its own, so a worker killed mid-call cannot leak one. If Redis is unreachable
+the lease is skipped: the per-process ceiling still holds, and budgets are
+enforced elsewhere.
+"""
+
+import asyncio
+import logging
+import random
+import time
+import uuid
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from .. import kv, metrics
+from ..config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_PRIORITY_SHARE = 3
+_LEASE_KEY = "katha:image_leases"
+
+
+def _tier(priority: bool) -> str:
+    return "priority" if priority else "standard"
+
+
+class ImageScheduler:
+    def __init__(self, limit: int, *, cluster_limit: int = 0, lease_seconds: float = 300.0):
+        self.limit = max(1, limit)
+        self.cluster_limit = cluster_limit
+        self.lease_seconds = lease_seconds
+        self._active = 0
+        # tier -> story id -> waiters, oldest story first. A story moves to the
+        # back after each grant, which is what makes the service round-robin.
+        self._waiting: dict[bool, OrderedDict[str, deque[asyncio.Future]]] = {
+            True: OrderedDict(),
+            False: OrderedDict(),
+        }
+        self._priority_streak = 0
+
+    def depth(self, priority: bool | None = None) -> int:
+        """Calls waiting for a slot, in one tier or both."""
+        tiers = (True, False) if priority is None else (priority,)
+        return sum(len(q) for t in tiers for q in self._waiting[t].values())
+
+    @property
+    def in_flight(self) -> int:
+        return self._active
+
+    @asynccontextmanager
+    async def slot(self, story_id: str, *, priority: bool = False) -> AsyncIterator[None]:
+        started = time.monotonic()
+        await self._acquire(story_id, priority)
+        waited = time.monotonic() - started
+        metrics.incr("image_queue_wait_seconds_total", waited, tier=_tier(priority))
+        metrics.incr("image_queue_waits_total", tier=_tier(priority))
+        lease = None
+        try:
+            if self.cluster_limit > 0:
+                lease = await self._take_lease()
+            yield
+        finally:
+            if lease is not None:
+                await self._drop_lease(lease)
+            self._release()
+
+    # --- Local slots ---------------------------------------------------------
+
+    async def _acquire(self, story_id: str, priority: bool) -> None:
+        if self._active < self.limit and not self.depth():
+            self._active += 1
+            self._publish()
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting[priority].setdefault(story_id, deque()).append(waiter)
+        self._publish()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted and cancelled in the same tick: the slot was already
+                # handed over, so pass it on rather than lose it.
+                self._release()
+            else:
+                self._forget(story_id, priority, waiter)
+            raise
+
+    def _release(self) -> None:
+        waiter = self._next_waiter()
+        if waiter is None:
+            self._active -= 1
+        else:
+            waiter.set_result(None)  # the slot passes straight to the waiter
+        self._publish()
+
+    def _next_waiter(self) -> asyncio.Future | None:
+        order = (True, False)
+        if self._priority_streak >= _PRIORITY_SHARE and self.depth(False):
+            order = (False, True)
+        for priority in order:
+            ring = self._waiting[priority]
+            while ring:
+                story_id, queue = ring.popitem(last=False)
+                waiter = queue.popleft()
+                if queue:
+                    ring[story_id] = queue
+                if waiter.done():
+                    continue
+                self._priority_streak = self._priority_streak + 1 if priority else 0
+                return waiter
+        return None
+
+    def _forget(self, story_id: str, priority: bool, waiter: asyncio.Future) -> None:
+        queue = self._waiting[priority].get(story_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass
+        if not queue:
+            del self._waiting[priority][story_id]
+        self._publish()
+
+    def _publish(self) -> None:
+        metrics.set_gauge("image_calls_in_flight", self._active)
+        for priority in (True, False):
+            metrics.set_gauge("image_queue_depth", self.depth(priority), tier=_tier(priority))
+
+    # --- Cluster leases --------------------------------------------------------
+
+    async def _take_lease(self) -> str | None:
+        token = uuid.uuid4().hex
+        delay = 0.05
+        while True:
+            try:
+                r = await kv.get_redis()
+                now = time.time()
+                async with r.pipeline(transaction=True) as pipe:
+                    pipe.zremrangebyscore(_LEASE_KEY, "-inf", now)
+                    pipe.zadd(_LEASE_KEY, {token: now + self.lease_seconds})
+                    pipe.zcard(_LEASE_KEY)
+                    _, _, held = await pipe.execute()
+                if held <= self.cluster_limit:
+                    return token
+                await r.zrem(_LEASE_KEY, token)
+            except Exception as e:
+                logger.warning("Image lease unavailable, relying on the process ceiling: %s", e)
+                return None
+            # Jittered so workers that lost the same race do not retry in step.
+            await asyncio.sleep(delay * (0.5 + random.random()))
+            delay = min(delay * 2, 1.0)
+
+    async def _drop_lease(self, token: str) -> None:
+        try:
+            await (await kv.get_redis()).zrem(_LEASE_KEY, token)
+        except Exception as e:  # it expires on its own
+            logger.warning("Could not release image lease: %s", e)
+
+
+_scheduler: ImageScheduler | None = None
+
+
+def get_image_scheduler() -> ImageScheduler:
+    global _scheduler
+    if _scheduler is None:
+        s = get_settings()
+        _scheduler = ImageScheduler(
+            s.image_concurrency,
+            cluster_limit=s.image_concurrency_cluster if s.job_backend == "arq" else 0,
+            # Comfortably longer than one call with its retries; expiry is only
+            # the safety net for a worker that died holding a lease.
+            lease_seconds=s.generation_call_timeout_seconds * 3,
+        )
+    return _scheduler
+
+
+def reset_image_scheduler() -> None:
+    """Test helper."""
+    global _scheduler
+    _scheduler = None
@@ -1,21 +1,38 @@
-"""Image storage abstraction: local disk (default) or S3-compatible object storage."""
+"""Image storage abstraction: local disk (default) or S3-compatible object storage.
+
+Two namespaces. Images are public: saved under a URL the browser loads.
+Artifacts are private bytes the server keeps for itself (cached illustrations,
+rendered files), addressed by a key and never given a URL. Artifacts derived
+from one story live under stories/{story_id}/ and go when its media does.
+"""
 
 import asyncio
+import logging
 import os
+import shutil
 import uuid
 from abc import ABC, abstractmethod
 
 from .config import get_settings
 
+logger = logging.getLogger(__name__)
+
 
 class Storage(ABC):
     @abstractmethod
-    async def save_image(self, data: bytes, *, story_id: str, position: int, mime: str) -> str:
-        """Persist image bytes; return a URL the browser can load."""
+    async def save_image(
+        self, data: bytes, *, story_id: str, position: int, mime: str, variant: str = ""
+    ) -> str:
+        """Persist image bytes; return a URL the browser can load.
+
+        variant names a derived rendition ("cover", "grid") so it sorts beside
+        the page's display image.
+        """
 
     @abstractmethod
     async def delete_story_media(self, story_id: str) -> None:
-        """Best-effort removal of all images belonging to a story."""
+        """Best-effort removal of all images belonging to a story, and of its
+        artifacts (stories/{story_id}/...), which were rendered from them."""
 
     @abstractmethod
     async def load_image(self, url: str) -> bytes | None:
@@ -26,25 +43,136 @@ class Storage(ABC):
         the book.
         """
 
+    # Reads in flight at once for load_images. A book is a handful of pages;
+    # the bound is for the shared-link endpoint under a crawler.
+    load_concurrency = 8
+
+    async def load_images(self, urls: list[str]) -> list[bytes | None]:
+        """load_image for many URLs at once, results in the same order.
+
+        Concurrent, so a book costs about one read's latency instead of one
+        per page. Empty URLs come back as None without a read.
+        """
+        gate = asyncio.Semaphore(self.load_concurrency)
+
+        async def _one(url: str) -> bytes | None:
+            if not url:
+                return None
+            async with gate:
+                return await self.load_image(url)
+
+        return list(await asyncio.gather(*(_one(u) for u in urls)))
+
+    async def spool_images(self, urls: list[str], directory: str) -> list[str | None]:
+        """load_images, but each image is written to a file in directory as it
+        arrives and let go, so a book of any length holds at most
+        load_concurrency images in memory. Returns the file paths in order;
+        None where load_image found nothing."""
+        gate = asyncio.Semaphore(self.load_concurrency)
+
+        async def _one(index: int, url: str) -> str | None:
+            if not url:
+                return None
+            async with gate:
+                data = await self.load_image(url)
+                if data is None:
+                    return None
+                path = os.path.join(directory, f"image-{index:03d}")
+                await asyncio.to_thread(_write_file, path, data)
+            return path
+
+        return list(await asyncio.gather(*(_one(i, u) for i, u in enumerate(urls))))
+
+    @abstractmethod
+    async def delete_image(self, url: str) -> None:
+        """Best-effort removal of one image by its public URL; anything outside
+        this storage's own namespace is ignored."""
+
+    @abstractmethod
+    async def save_artifact(self, key: str, data: bytes, *, content_type: str) -> None:
+        """Persist private bytes under a server-chosen key, replacing any previous value."""
+
+    @abstractmethod
+    async def load_artifact(self, key: str) -> bytes | None:
+        """Read an artifact back; None when it does not exist or cannot be read."""
+
+    @abstractmethod
+    async def delete_artifacts(self, prefix: str) -> None:
+        """Best-effort removal of every artifact whose key starts with prefix."""
+
+    async def save_artifact_file(self, key: str, path: str, *, content_type: str) -> None:
+        """save_artifact from a file. Backends override this to copy or upload
+        without reading the whole file into memory."""
+        data = await asyncio.to_thread(_read_file, path)
+        await self.save_artifact(key, data, content_type=content_type)
+
+    async def load_artifact_file(self, key: str, path: str) -> str | None:
+        """The artifact as a file to serve from: downloaded to path, or where a
+        backend already keeps it on local disk, that file itself (never write
+        to the result). None when it does not exist or cannot be read."""
+        data = await self.load_artifact(key)
+        if data is None:
+            return None
+        await asyncio.to_thread(_write_file, path, data)
+        return path
+
+    async def close(self) -> None:
+        """Release connections. Nothing to release by default."""
+        return None
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_file(path: str, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+
 
 def _ext_for(mime: str) -> str:
-    return {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp"}.get(mime, "png")
+    return {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp", "image/avif": "avif"}.get(
+        mime, "png"
+    )
+
+
+def _image_name(position: int, mime: str, variant: str) -> str:
+    suffix = f"-{variant}" if variant else ""
+    return f"{position:02d}-{uuid.uuid4().hex[:8]}{suffix}.{_ext_for(mime)}"
+
+
+def _check_artifact_key(key: str) -> str:
+    # Keys are built by the server from hashes and ids, never from input, but a
+    # key becomes a path or an object name, so anything odd is refused outright.
+    if not key or key.startswith("/") or ".." in key.split("/") or "\\" in key:
+        raise ValueError(f"Bad artifact key: {key!r}")
+    return key
 
 
 class LocalStorage(Storage):
-    """Writes under MEDIA_ROOT; files are served by the API at MEDIA_URL_PREFIX."""
+    """Writes under MEDIA_ROOT; files are served by the API at MEDIA_URL_PREFIX.
 
-    def __init__(self, root: str, url_prefix: str):
+    Artifacts live in a separate directory that is not mounted: a file under
+    MEDIA_ROOT is one guessed URL away from any browser.
+    """
+
+    def __init__(self, root: str, url_prefix: str, artifact_root: str = ""):
         self.root = root
         self.url_prefix = url_prefix.rstrip("/")
+        self.artifact_root = artifact_root or os.path.join(
+            os.path.dirname(os.path.abspath(root)), "artifacts"
+        )
 
     def _write_sync(self, abs_dir: str, name: str, data: bytes) -> None:
         os.makedirs(abs_dir, exist_ok=True)
         with open(os.path.join(abs_dir, name), "wb") as f:
             f.write(data)
 
-    async def save_image(self, data: bytes, *, story_id: str, position: int, mime: str) -> str:
-        name = f"{position:02d}-{uuid.uuid4().hex[:8]}.{_ext_for(mime)}"
+    async def save_image(
+        self, data: bytes, *, story_id: str, position: int, mime: str, variant: str = ""
+    ) -> str:
+        name = _image_name(position, mime, variant)
         abs_dir = os.path.join(self.root, "stories", story_id)
         # Disk writes are blocking; off the event loop so concurrent illustrations
         # and every other in-flight request keep making progress.
@@ -54,9 +182,10 @@ class LocalStorage(Storage):
     async def delete_story_media(self, story_id: str) -> None:
         import shutil
 
-        target = os.path.join(self.root, "stories", story_id)
-        if os.path.isdir(target):
-            await asyncio.to_thread(shutil.rmtree, target, ignore_errors=True)
+        for base in (self.root, self.artifact_root):
+            target = os.path.join(base, "stories", story_id)
+            if os.path.isdir(target):
+                await asyncio.to_thread(shutil.rmtree, target, ignore_errors=True)
 
     async def load_image(self, url: str) -> bytes | None:
         from pathlib import Path
@@ -81,63 +210,289 @@ class LocalStorage(Storage):
         except OSError:
             return None
 
+    async def delete_image(self, url: str) -> None:
+        from pathlib import Path
+
+        prefix = self.url_prefix + "/"
+        if not url.startswith(prefix):
+            return
+        root = Path(self.root).resolve()
+        # Confined to MEDIA_ROOT for the same reason as load_image.
+        target = (root / url[len(prefix) :]).resolve()
+        if not target.is_relative_to(root):
+            return
+        await asyncio.to_thread(target.unlink, missing_ok=True)
+
+    async def save_artifact(self, key: str, data: bytes, *, content_type: str) -> None:
+        path = os.path.join(self.artifact_root, _check_artifact_key(key))
+
+        def _write() -> None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written aside and renamed, so a concurrent reader sees the old
+            # bytes or the new ones, never half a file.
+            tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+        await asyncio.to_thread(_write)
+
+    async def load_artifact(self, key: str) -> bytes | None:
+        path = os.path.join(self.artifact_root, _check_artifact_key(key))
+        try:
+            return await asyncio.to_thread(_read_file, path)
+        except OSError:
+            return None
+
+    async def save_artifact_file(self, key: str, path: str, *, content_type: str) -> None:
+        target = os.path.join(self.artifact_root, _check_artifact_key(key))
+
+        def _copy() -> None:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.{uuid.uuid4().hex[:8]}.tmp"
+            shutil.copyfile(path, tmp)
+            os.replace(tmp, target)
+
+        await asyncio.to_thread(_copy)
+
+    async def load_artifact_file(self, key: str, path: str) -> str | None:
+        # Served straight from the store: artifacts are replaced by rename,
+        # never rewritten, so a reader part-way through keeps whole bytes.
+        own = os.path.join(self.artifact_root, _check_artifact_key(key))
+        return own if await asyncio.to_thread(os.path.isfile, own) else None
+
+    async def delete_artifacts(self, prefix: str) -> None:
+        path = os.path.join(self.artifact_root, _check_artifact_key(prefix.rstrip("/")))
+
+        def _delete() -> None:
+            if prefix.endswith("/"):
+                shutil.rmtree(path, ignore_errors=True)
+                return
+            parent, stem = os.path.split(path)
+            try:
+                names = os.listdir(parent)
+            except OSError:
+                return
+            for name in names:
+                if name.startswith(stem):
+                    target = os.path.join(parent, name)
+                    if os.path.isdir(target):
+                        shutil.rmtree(target, ignore_errors=True)
+                    else:
+                        try:
+                            os.remove(target)
+                        except OSError:
+                            pass
+
+        await asyncio.to_thread(_delete)
+
 
 class S3Storage(Storage):
-    """S3-compatible storage (AWS S3, Cloudflare R2, GCS interop). Lazy boto3 import."""
+    """S3-compatible storage (AWS S3, Cloudflare R2, GCS interop) on aiobotocore.
+
+    Native async: requests run on the event loop over one pooled HTTP client
+    instead of borrowing default-executor threads, which the disk I/O and PDF
+    rendering also queue on. The pool is sized by S3_MAX_POOL_CONNECTIONS and
+    the client is created on first use. Lazy aiobotocore import, so it is only
+    required when s3 is configured.
+    """
 
     def __init__(self):
-        import boto3  # imported here so boto3 is only required when s3 is configured
+        from aiobotocore.session import get_session
 
         s = get_settings()
         self.bucket = s.s3_bucket
+        self.artifact_bucket = s.s3_artifact_bucket or s.s3_bucket
         self.public_base = s.s3_public_base_url.rstrip("/")
-        self.client = boto3.client(
-            "s3",
-            endpoint_url=s.s3_endpoint_url or None,
-            region_name=s.s3_region,
-            aws_access_key_id=s.s3_access_key_id,
-            aws_secret_access_key=s.s3_secret_access_key,
-        )
-
-    async def save_image(self, data: bytes, *, story_id: str, position: int, mime: str) -> str:
-        import asyncio
+        # S3 rejects parts under 5 MB (all but the last), so that is the floor.
+        self.multipart_threshold = max(5, s.s3_multipart_threshold_mb) * 1024 * 1024
+        self._session = get_session()
+        self._client_args = {
+            "endpoint_url": s.s3_endpoint_url or None,
+            "region_name": s.s3_region,
+            "aws_access_key_id": s.s3_access_key_id,
+            "aws_secret_access_key": s.s3_secret_access_key,
+        }
+        self._pool_size = s.s3_max_pool_connections
+        # Leave most of the pool to uploads when a book is being read back.
+        self.load_concurrency = max(1, self._pool_size // 2)
+        self._exit_stack = None
+        self._client = None
+        self._client_lock = asyncio.Lock()
+
+    async def _get_client(self):
+        if self._client is None:
+            async with self._client_lock:
+                if self._client is None:
+                    from contextlib import AsyncExitStack
+
+                    from aiobotocore.config import AioConfig
+
+                    stack = AsyncExitStack()
+                    self._client = await stack.enter_async_context(
+                        self._session.create_client(
+                            "s3", config=AioConfig(max_pool_connections=self._pool_size), **self._client_args
+                        )
+                    )
+                    self._exit_stack = stack
+        return self._client
+
+    async def close(self) -> None:
+        if self._exit_stack is not None:
+            stack, self._exit_stack, self._client = self._exit_stack, None, None
+            await stack.aclose()
+
+    async def _put(self, bucket: str, key: str, data: bytes, content_type: str) -> None:
+        client = await self._get_client()
+        if len(data) <= self.multipart_threshold:
+            await client.put_object(Bucket=bucket, Key=key, Body=data, ContentType=content_type)
+            return
+        # Large objects go up in parts, all in flight at once over the pool:
+        # one slow part no longer serialises the rest, and a failed one is
+        # retried alone by botocore instead of restarting the whole body.
+        part_size = self.multipart_threshold
+        upload = await client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)
+        upload_id = upload["UploadId"]
+        try:
+            parts = await asyncio.gather(
+                *(
+                    client.upload_part(
+                        Bucket=bucket,
+                        Key=key,
+                        UploadId=upload_id,
+                        PartNumber=number,
+                        Body=data[offset : offset + part_size],
+                    )
+                    for number, offset in enumerate(range(0, len(data), part_size), start=1)
+                )
+            )
+            await client.complete_multipart_upload(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={
+                    "Parts": [{"ETag": p["ETag"], "PartNumber": n} for n, p in enumerate(parts, start=1)]
+                },
+            )
+        except BaseException:
+            # Parts of an abandoned upload are billed storage until aborted.
+            await client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            raise
+
+    async def _put_file(self, bucket: str, key: str, path: str, content_type: str) -> None:
+        """_put from a file, holding at most one part of it in memory."""
+        if await asyncio.to_thread(os.path.getsize, path) <= self.multipart_threshold:
+            await self._put(bucket, key, await asyncio.to_thread(_read_file, path), content_type)
+            return
+        client = await self._get_client()
+        upload = await client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)
+        upload_id = upload["UploadId"]
+        parts = []
+        f = await asyncio.to_thread(open, path, "rb")
+        try:
+            while chunk := await asyncio.to_thread(f.read, self.multipart_threshold):
+                number = len(parts) + 1
+                part = await client.upload_part(
+                    Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=chunk
+                )
+                parts.append({"ETag": part["ETag"], "PartNumber": number})
+            await client.complete_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+        except BaseException:
+            await client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            raise
+        finally:
+            f.close()
+
+    async def _get(self, bucket: str, key: str) -> bytes:
+        client = await self._get_client()
+        resp = await client.get_object(Bucket=bucket, Key=key)
+        async with resp["Body"] as body:
+            return await body.read()
+
+    async def _delete_prefix(self, bucket: str, prefix: str) -> None:
+        client = await self._get_client()
+        paginator = client.get_paginator("list_objects_v2")
+        async for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            keys = [{"Key": o["Key"]} for o in page.get("Contents", [])]
+            if keys:
+                await client.delete_objects(Bucket=bucket, Delete={"Objects": keys})
 
-        key = f"stories/{story_id}/{position:02d}-{uuid.uuid4().hex[:8]}.{_ext_for(mime)}"
-        await asyncio.to_thread(
-            self.client.put_object, Bucket=self.bucket, Key=key, Body=data, ContentType=mime
-        )
+    async def save_image(
+        self, data: bytes, *, story_id: str, position: int, mime: str, variant: str = ""
+    ) -> str:
+        key = f"stories/{story_id}/{_image_name(position, mime, variant)}"
+        await self._put(self.bucket, key, data, mime)
         return f"{self.public_base}/{key}"
 
     async def delete_story_media(self, story_id: str) -> None:
-        import asyncio
-
-        def _delete():
-            prefix = f"stories/{story_id}/"
-            resp = self.client.list_objects_v2(Bucket=self.bucket, Prefix=prefix)
-            keys = [{"Key": o["Key"]} for o in resp.get("Contents", [])]
-            if keys:
-                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": keys})
-
-        await asyncio.to_thread(_delete)
+        await self._delete_prefix(self.bucket, f"stories/{story_id}/")
+        await self._delete_prefix(self.artifact_bucket, f"artifacts/stories/{story_id}/")
 
     async def load_image(self, url: str) -> bytes | None:
         # Only objects under our own public base; never fetch arbitrary URLs.
         if not self.public_base or not url.startswith(self.public_base + "/"):
             return None
         key = url[len(self.public_base) + 1 :]
+        try:
+            return await self._get(self.bucket, key)
+        except Exception as e:
+            logger.warning("Could not read %s from S3: %s", key, e)
+            return None
 
-        def _get() -> bytes:
-            resp = self.client.get_object(Bucket=self.bucket, Key=key)
-            return resp["Body"].read()
+    async def delete_image(self, url: str) -> None:
+        if not self.public_base or not url.startswith(self.public_base + "/"):
+            return
+        key = url[len(self.public_base) + 1 :]
+        await (await self._get_client()).delete_object(Bucket=self.bucket, Key=key)
 
+    async def save_artifact(self, key: str, data: bytes, *, content_type: str) -> None:
+        await self._put(self.artifact_bucket, f"artifacts/{_check_artifact_key(key)}", data, content_type)
+
+    async def load_artifact(self, key: str) -> bytes | None:
+        key = f"artifacts/{_check_artifact_key(key)}"
         try:
-            return await asyncio.to_thread(_get)
+            client = await self._get_client()
+            try:
+                return await self._get(self.artifact_bucket, key)
+            except client.exceptions.NoSuchKey:
+                return None
         except Exception as e:
-            import logging
+            logger.warning("Could not read artifact %s from S3: %s", key, e)
+            return None
 
-            logging.getLogger(__name__).warning("Could not read %s from S3: %s", key, e)
+    async def save_artifact_file(self, key: str, path: str, *, content_type: str) -> None:
+        await self._put_file(
+            self.artifact_bucket, f"artifacts/{_check_artifact_key(key)}", path, content_type
+        )
+
+    async def load_artifact_file(self, key: str, path: str) -> str | None:
+        key = f"artifacts/{_check_artifact_key(key)}"
+        try:
+            client = await self._get_client()
+            try:
+                resp = await client.get_object(Bucket=self.artifact_bucket, Key=key)
+            except client.exceptions.NoSuchKey:
+                return None
+            f = await asyncio.to_thread(open, path, "wb")
+            try:
+                async with resp["Body"] as body:
+                    while chunk := await body.read(256 * 1024):
+                        await asyncio.to_thread(f.write, chunk)
+            finally:
+                f.close()
+            return path
+        except Exception as e:
+            logger.warning("Could not read artifact %s from S3: %s", key, e)
             return None
 
+    async def delete_artifacts(self, prefix: str) -> None:
+        full_prefix = f"artifacts/{_check_artifact_key(prefix.rstrip('/'))}" + (
+            "/" if prefix.endswith("/") else ""
+        )
+        await self._delete_prefix(self.artifact_bucket, full_prefix)
+
 
 _storage: Storage | None = None
 
@@ -149,10 +504,17 @@ def get_storage() -> Storage:
         if s.storage_backend == "s3":
             _storage = S3Storage()
         else:
-            _storage = LocalStorage(s.media_root, s.media_url_prefix)
+            _storage = LocalStorage(s.media_root, s.media_url_prefix, s.artifact_root)
     return _storage
 
 
+async def close_storage() -> None:
+    global _storage
+    if _storage is not None:
+        storage, _storage = _storage, None
+        await storage.close()
+
+
 def reset_storage() -> None:
     """Test helper."""
     global _storage
@@ -2,15 +2,32 @@
 
 Run with:  arq app.worker.WorkerSettings   (from the backend/ directory, or in the
 worker container via docker compose).
+
+An ARQ worker reads one queue, so this process runs two: the one `arq` starts,
+on the standard queue, and a second started from `startup` on the priority
+queue (app.jobs.QUEUES), each with its own slots and Redis connection.
 """
 
+import asyncio
+import contextlib
 import logging
+import time
+from datetime import UTC, datetime
 
+from arq import Worker, cron, func
 from arq.connections import RedisSettings
 
+from . import admission, heartbeat, metrics, reaper
 from .config import get_settings
+from .cpu import shutdown_cpu_pool
+from .jobs import PRIORITY_QUEUE, STANDARD_JOBS_PER_WORKER, story_started
 from .observability import configure_logging, set_correlation_id
-from .services.pipeline import run_generation
+from .services.exports import run_export
+from .services.illustration_cache import purge_shared_cache
+from .services.pdf import warm_fonts
+from .services.pdf_renderer import shutdown_pdf_renderer
+from .services.pipeline import regenerate_illustration, run_generation
+from .storage import close_storage, get_storage
 
 configure_logging()
 logger = logging.getLogger(__name__)
@@ -19,8 +36,47 @@ logger = logging.getLogger(__name__)
 async def generate_story(ctx: dict, story_id: str) -> None:
     # Correlate every line this job emits with the story it belongs to.
     set_correlation_id(f"story:{story_id[:12]}")
-    logger.info("Worker picked up story", extra={"story_id": story_id})
-    await run_generation(story_id)
+    queue = ctx.get("queue", "standard")
+    waited = max(0.0, (datetime.now(UTC) - ctx["enqueue_time"]).total_seconds())
+    metrics.incr("queue_jobs_started_total", queue=queue)
+    metrics.incr("queue_wait_seconds_total", waited, queue=queue)
+    await story_started(ctx["redis"], queue, story_id)
+    logger.info(
+        "Worker picked up story", extra={"story_id": story_id, "queue": queue, "waited_s": round(waited, 1)}
+    )
+    started = time.monotonic()
+    with heartbeat.running(f"story:{story_id}"):
+        await run_generation(story_id)
+    # Every run, failed or instant ones included: admission estimates how fast
+    # the queue drains, and that is how long each run held its slot.
+    await admission.record_service_time(time.monotonic() - started)
+
+
+async def redraw_illustration(ctx: dict, story_id: str, position: int) -> None:
+    set_correlation_id(f"story:{story_id[:12]}")
+    logger.info("Worker picked up illustration redraw", extra={"story_id": story_id, "position": position})
+    with heartbeat.running(f"redraw:{story_id}:{position}"):
+        await regenerate_illustration(story_id, position)
+
+
+async def export_book(ctx: dict, export_id: str) -> None:
+    set_correlation_id(f"export:{export_id[:12]}")
+    logger.info("Worker picked up book export", extra={"export_id": export_id})
+    with heartbeat.running(f"export:{export_id}"):
+        await run_export(export_id)
+
+
+async def reap_stale_jobs(ctx: dict) -> None:
+    await reaper.reap_stale_jobs()
+
+
+async def reap_orphaned_jobs(ctx: dict) -> None:
+    await reaper.reap_orphaned_jobs()
+
+
+def _priority_worker_stopped(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Priority queue worker stopped", exc_info=task.exception())
 
 
 async def startup(ctx: dict) -> None:
@@ -41,20 +97,58 @@ async def startup(ctx: dict) -> None:
         )
         logger.info("Sentry error tracking enabled in worker")
     await init_db()
+    await purge_shared_cache(get_storage())
+    if settings.pdf_prerender and settings.pdf_render_workers <= 0:
+        await asyncio.to_thread(warm_fonts)
+    # Before either queue is read: every job this process stamps must belong
+    # to a worker that is already beating.
+    await heartbeat.start_heartbeat()
+    if settings.worker_priority_jobs > 0:
+        priority = Worker(
+            [generate_story],
+            queue_name=PRIORITY_QUEUE,
+            redis_settings=WorkerSettings.redis_settings,
+            max_jobs=settings.worker_priority_jobs,
+            job_timeout=WorkerSettings.job_timeout,
+            keep_result=WorkerSettings.keep_result,
+            handle_signals=False,  # the standard worker owns SIGINT/SIGTERM
+            ctx={"queue": "priority"},
+        )
+        ctx["priority_worker"] = priority
+        ctx["priority_task"] = asyncio.create_task(priority.async_run())
+        ctx["priority_task"].add_done_callback(_priority_worker_stopped)
     logger.info("Worker started", extra={"provider": get_settings().resolved_provider})
 
 
 async def shutdown(ctx: dict) -> None:
     from .db import dispose_engine
 
+    priority = ctx.pop("priority_worker", None)
+    if priority is not None:
+        # Cancels its running stories, as the signal did for the standard
+        # worker's. ARQ runs them again later.
+        await priority.close()
+        with contextlib.suppress(asyncio.CancelledError, Exception):  # or already logged
+            await ctx.pop("priority_task")
+    # Every job here is cancelled by now; unstamped, their re-runs resume them.
+    await heartbeat.stop_heartbeat()
     await dispose_engine()
+    await close_storage()
+    shutdown_cpu_pool()
+    shutdown_pdf_renderer()
 
 
 class WorkerSettings:
-    functions = [generate_story]
+    functions = [generate_story, func(redraw_illustration, name="regenerate_illustration"), export_book]
+    # The stale sweep every minute (second=0, any minute), the orphan sweep
+    # every 5 seconds. unique: with several workers, one sweep per tick.
+    cron_jobs = [
+        cron(reap_stale_jobs, second=0, run_at_startup=True, unique=True),
+        cron(reap_orphaned_jobs, second=set(range(0, 60, 5)), unique=True),
+    ]
     on_startup = startup
     on_shutdown = shutdown
     redis_settings = RedisSettings.from_dsn(get_settings().redis_url)
-    max_jobs = 8  # stories processed concurrently per worker instance
+    max_jobs = STANDARD_JOBS_PER_WORKER  # priority-queue jobs are on top (WORKER_PRIORITY_JOBS)
     job_timeout = 600  # hard cap: a story must finish within 10 minutes
     keep_result = 3600
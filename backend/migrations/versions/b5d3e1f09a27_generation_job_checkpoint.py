@@ -0,0 +1,30 @@
+"""generation job checkpoint
+
+Revision ID: b5d3e1f09a27
+Revises: a4b21c9de07f
+Create Date: 2026-10-18 09:12:40.118305
+
+Records the last durable stage of a generation so a re-run resumes after it.
+Existing rows get "", which means "start from the beginning" — exactly what
+every job did before this column existed.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "b5d3e1f09a27"
+down_revision: Union[str, None] = "a4b21c9de07f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "generation_jobs",
+        sa.Column("checkpoint", sa.String(length=40), server_default="", nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("generation_jobs", "checkpoint")
@@ -0,0 +1,34 @@
+"""single page illustration redraw
+
+Revision ID: c9a4f2e6d1b3
+Revises: b5d3e1f09a27
+Create Date: 2026-10-18 11:02:17.540921
+
+Marks a page whose illustration is being redrawn on its own, and counts the
+redraws per story. Existing rows get NULL and 0: nothing was ever requested.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "c9a4f2e6d1b3"
+down_revision: Union[str, None] = "b5d3e1f09a27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "stories",
+        sa.Column("image_redraws", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "story_pages",
+        sa.Column("image_requested_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("story_pages", "image_requested_at")
+    op.drop_column("stories", "image_redraws")
@@ -0,0 +1,34 @@
+"""story page thumbnails
+
+Revision ID: d2b7e8a4c5f0
+Revises: c9a4f2e6d1b3
+Create Date: 2026-10-18 13:40:06.271554
+
+Cover and grid renditions of each page's picture. Existing rows get "", which
+clients read as "no thumbnail, use image_url" — what they always did.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "d2b7e8a4c5f0"
+down_revision: Union[str, None] = "c9a4f2e6d1b3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "story_pages",
+        sa.Column("thumb_cover_url", sa.String(length=500), server_default="", nullable=False),
+    )
+    op.add_column(
+        "story_pages",
+        sa.Column("thumb_grid_url", sa.String(length=500), server_default="", nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("story_pages", "thumb_grid_url")
+    op.drop_column("story_pages", "thumb_cover_url")
@@ -0,0 +1,48 @@
+"""export jobs
+
+Revision ID: e3c6a9d2b7f1
+Revises: d2b7e8a4c5f0
+Create Date: 2026-10-18 09:41:52.318204
+
+Background book exports (the print-on-demand file), polled like generation
+jobs. A new table; nothing existing changes.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "e3c6a9d2b7f1"
+down_revision: Union[str, None] = "d2b7e8a4c5f0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "export_jobs",
+        sa.Column("id", sa.String(length=32), nullable=False),
+        sa.Column("story_id", sa.String(length=32), nullable=False),
+        sa.Column("profile", sa.String(length=16), nullable=False),
+        sa.Column("digest", sa.String(length=64), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("stage", sa.String(length=50), nullable=False),
+        sa.Column("progress_current", sa.Integer(), nullable=False),
+        sa.Column("progress_total", sa.Integer(), nullable=False),
+        sa.Column("size_bytes", sa.Integer(), nullable=False),
+        sa.Column("error", sa.Text(), nullable=False),
+        sa.Column("error_code", sa.String(length=40), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["story_id"], ["stories.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("export_jobs", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_export_jobs_story_id"), ["story_id"], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("export_jobs", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_export_jobs_story_id"))
+
+    op.drop_table("export_jobs")
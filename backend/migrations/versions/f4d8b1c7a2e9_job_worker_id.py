@@ -0,0 +1,30 @@
+"""job worker id
+
+Revision ID: f4d8b1c7a2e9
+Revises: e3c6a9d2b7f1
+Create Date: 2026-10-18 16:05:12.504311
+
+Names the worker process running a generation or export, so the reaper can
+fail it as soon as that worker stops sending heartbeats. Existing rows get "",
+which means "no known worker": they are left to the STALE_AFTER sweep, as
+every job was before this column existed.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "f4d8b1c7a2e9"
+down_revision: Union[str, None] = "e3c6a9d2b7f1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    for table in ("generation_jobs", "export_jobs"):
+        op.add_column(table, sa.Column("worker_id", sa.String(length=64), server_default="", nullable=False))
+
+
+def downgrade() -> None:
+    for table in ("generation_jobs", "export_jobs"):
+        op.drop_column(table, "worker_id")
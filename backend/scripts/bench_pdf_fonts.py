@@ -0,0 +1,77 @@
+"""Cold vs. warm font registration for build_story_pdf.
+
+Run from backend/:  python -m scripts.bench_pdf_fonts [--runs 20]
+
+"cold" is what every render paid before the font registry: probe the font
+directories, then read and parse each TTF. "warm" is a render once
+warm_fonts() has run. Both the font setup alone and the whole book are timed,
+for an English story and, where this host has a Devanagari font, a Nepali one.
+"""
+
+import argparse
+import functools
+import statistics
+import time
+from unittest import mock
+
+from fpdf import FPDF
+
+from app.services import pdf
+from app.services.pdf import PdfPage, build_story_pdf
+
+_TEXT = {
+    "en": "Asha and the little yak climbed the hill to count the stars, one by one, till the moon rose. " * 2,
+    "ne": "आशा र सानो याक ताराहरू गन्न डाँडामा चढे, एउटा एउटा गर्दै, जुन नउदाएसम्म। " * 2,
+}
+
+
+def _ms(fn, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def _fonts_only(language: str) -> None:
+    pdf._register_fonts(FPDF(unit="in", format="letter"), language)
+
+
+def _book(language: str) -> None:
+    build_story_pdf(
+        title="The yak who counts stars",
+        language=language,
+        hero_name="Asha",
+        pages=[PdfPage(text=_TEXT[language]) for _ in range(5)],
+    )
+
+
+def _cold(fn):
+    def run():
+        pdf._resolve_fonts.cache_clear()
+        fn()
+
+    return run
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    languages = ["en"] + (["ne"] if pdf.devanagari_font_available() else [])
+    print(f"{'':12}{'cold ms':>10}{'warm ms':>10}")
+    for language in languages:
+        for label, fn in (("fonts", _fonts_only), ("book", _book)):
+            with mock.patch.object(pdf._fonts, "parsed", return_value=None):
+                cold = _ms(_cold(functools.partial(fn, language)), args.runs)
+            pdf.warm_fonts()
+            warm = _ms(functools.partial(fn, language), args.runs)
+            print(f"{language + ' ' + label:12}{cold:>10.1f}{warm:>10.1f}")
+    if "ne" not in languages:
+        print("ne skipped: no Devanagari font on this host (see PDF_FONT_DIRS)")
+
+
+if __name__ == "__main__":
+    main()
@@ -28,8 +28,12 @@ from app.config import get_settings  # noqa: E402
 get_settings.cache_clear()
 
 from app.db import Base, dispose_engine, get_engine, init_db  # noqa: E402
+from app.kv import reset_kv  # noqa: E402
 from app.main import create_app  # noqa: E402
+from app.services.gemini import reset_limiter  # noqa: E402
+from app.services.pdf_renderer import reset_pdf_renderer  # noqa: E402
 from app.services.pipeline import reset_provider  # noqa: E402
+from app.services.scheduler import reset_image_scheduler  # noqa: E402
 from app.storage import reset_storage  # noqa: E402
 
 
@@ -37,6 +41,10 @@ from app.storage import reset_storage  # noqa: E402
 async def client():
     reset_provider()
     reset_storage()
+    reset_image_scheduler()
+    reset_limiter()
+    reset_pdf_renderer()
+    reset_kv()
     # Each test gets an empty schema. Sharing rows between tests hid a real bug:
     # per-user assertions passed while platform-wide counts silently accumulated.
     engine = get_engine()
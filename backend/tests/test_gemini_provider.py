@@ -6,26 +6,38 @@ SDK signature change or a parsing regression ships with fully green CI.
 """
 
 import asyncio
+import json
 import types
 
 import pytest
 
 from app.config import get_settings
-from app.services.base import GenerationError, StoryRequest
+from app.errors import GENERATION_BLOCKED
+from app.services import gemini
+from app.services.base import GenerationError, StoryDraft, StoryRequest, Usage
 
 pytestmark = pytest.mark.asyncio
 
 
-def _make_provider(monkeypatch, *, story_response=None, image_response=None, raise_with=None):
-    """Build a GeminiProvider whose SDK calls are replaced by fakes."""
+def _make_provider(
+    monkeypatch, *, story_response=None, image_response=None, raise_with=None, story_chunks=None
+):
+    """Build a GeminiProvider whose SDK calls are replaced by fakes.
+
+    story_chunks is what generate_content_stream delivers: a list of strings
+    (or of chunk objects) per call, so each call can stream something else.
+    """
     settings = get_settings()
     monkeypatch.setattr(settings, "google_api_key", "test-key-not-real", raising=False)
 
     import app.services.gemini as gemini_module
 
+    gemini_module.reset_limiter()
+
     class FakeModels:
         def __init__(self):
             self.calls = []
+            self.delivered = 0
 
         async def generate_content(self, **kwargs):
             self.calls.append(kwargs)
@@ -36,6 +48,20 @@ def _make_provider(monkeypatch, *, story_response=None, image_response=None, rai
                 return image_response
             return story_response
 
+        async def generate_content_stream(self, **kwargs):
+            self.calls.append(kwargs)
+            chunks = story_chunks.pop(0)
+
+            async def stream():
+                for chunk in chunks:
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    await asyncio.sleep(0)
+                    self.delivered += 1
+                    yield types.SimpleNamespace(text=chunk) if isinstance(chunk, str) else chunk
+
+            return stream()
+
     class FakeClient:
         def __init__(self, **_kwargs):
             self.aio = types.SimpleNamespace(models=FakeModels())
@@ -55,10 +81,15 @@ def _make_provider(monkeypatch, *, story_response=None, image_response=None, rai
 
 
 class _Parsed:
+    """A parsed response, built from paragraphs and their prompts; a prompt
+    the model left out is an empty string."""
+
     def __init__(self, title, paragraphs, image_prompts, moral="Be kind."):
         self.title = title
-        self.paragraphs = paragraphs
-        self.image_prompts = image_prompts
+        self.scenes = [
+            types.SimpleNamespace(text=text, image_prompt=image_prompts[i] if i < len(image_prompts) else "")
+            for i, text in enumerate(paragraphs)
+        ]
         self.moral = moral
 
 
@@ -125,6 +156,101 @@ async def test_empty_paragraphs_raise(monkeypatch):
         await provider.write_story(StoryRequest(prompt="x"))
 
 
+def _in_chunks(text, size):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+_STREAMED = json.dumps(
+    {
+        "title": "The Brave Yak",
+        "scenes": [
+            {"text": 'Para one, with a "quote" and a } brace.', "image_prompt": "Scene one"},
+            {"text": "   ", "image_prompt": "skipped"},
+            {"text": "Para two.", "image_prompt": ""},
+            {"text": "Para three.", "image_prompt": "Scene three"},
+        ],
+        "moral": "Be brave.",
+    },
+    ensure_ascii=False,
+)
+
+
+async def test_story_stream_yields_each_scene_as_its_object_closes(monkeypatch):
+    usage = types.SimpleNamespace(
+        text="", usage_metadata=types.SimpleNamespace(prompt_token_count=12, candidates_token_count=34)
+    )
+    provider = _make_provider(monkeypatch, story_chunks=[[*_in_chunks(_STREAMED, 7), usage]])
+    stream = provider.write_story_stream(StoryRequest(prompt="a brave yak", max_paragraphs=5))
+
+    first = await anext(stream)
+    # Handed over while the rest of the story is still being written.
+    assert provider.client.aio.models.delivered < len(_STREAMED) // 7
+    assert (first.position, first.title, first.text) == (
+        0,
+        "The Brave Yak",
+        'Para one, with a "quote" and a } brace.',
+    )
+    assert provider.client.aio.models.calls[0]["config"].response_schema is gemini._StorySchema
+    rest = [item async for item in stream]
+
+    scenes, draft = rest[:-1], rest[-1]
+    assert [(s.position, s.text, s.image_prompt) for s in scenes] == [
+        (1, "Para two.", "Para two."),  # a missing prompt falls back to its own scene
+        (2, "Para three.", "Scene three"),
+    ]
+    assert isinstance(draft, StoryDraft)
+    assert draft.paragraphs == [first.text, "Para two.", "Para three."]
+    assert draft.moral == "Be brave."
+    assert draft.usage == Usage(input_tokens=12, output_tokens=34)
+
+
+async def test_story_stream_waits_for_a_late_title_and_caps_scenes(monkeypatch):
+    body = json.dumps(
+        {
+            "scenes": [{"text": f"P{i}", "image_prompt": f"S{i}"} for i in range(5)],
+            "title": "Late",
+            "moral": "",
+        }
+    )
+    provider = _make_provider(monkeypatch, story_chunks=[_in_chunks(body, 5)])
+    items = [item async for item in provider.write_story_stream(StoryRequest(prompt="x", max_paragraphs=3))]
+    assert [(s.position, s.title) for s in items[:-1]] == [(0, "Late"), (1, "Late"), (2, "Late")]
+    assert items[-1].paragraphs == ["P0", "P1", "P2"]
+
+
+async def test_story_stream_retries_until_the_first_scene_only(monkeypatch):
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", lambda *_a, **_k: real_sleep(0))
+    chunks = _in_chunks(_STREAMED, 11)
+    provider = _make_provider(
+        monkeypatch,
+        story_chunks=[
+            [chunks[0], RuntimeError("503 UNAVAILABLE")],
+            chunks,
+            [*chunks[:-3], RuntimeError("503")],
+        ],
+    )
+    items = [item async for item in provider.write_story_stream(StoryRequest(prompt="x"))]
+    assert len(items) == 4 and isinstance(items[-1], StoryDraft)
+
+    seen = []
+    with pytest.raises(GenerationError):
+        async for item in provider.write_story_stream(StoryRequest(prompt="x")):
+            seen.append(item)
+    assert seen, "scenes already handed over cannot be taken back by a retry"
+    assert len(provider.client.aio.models.calls) == 3
+
+
+async def test_blocked_story_stream_raises_friendly_generation_error(monkeypatch):
+    blocked = types.SimpleNamespace(text=None, prompt_feedback="BLOCKED_SAFETY")
+    provider = _make_provider(monkeypatch, story_chunks=[[blocked]])
+    with pytest.raises(GenerationError) as exc:
+        async for _ in provider.write_story_stream(StoryRequest(prompt="something disallowed")):
+            pass
+    assert exc.value.code == GENERATION_BLOCKED
+    assert "gentler" in exc.value.user_message.lower()
+
+
 async def test_illustration_extracts_inline_image_bytes(monkeypatch):
     part = types.SimpleNamespace(
         inline_data=types.SimpleNamespace(mime_type="image/png", data=b"\x89PNGfake")
@@ -215,6 +341,104 @@ async def test_hung_call_times_out_and_is_retried(monkeypatch):
     assert calls["n"] == 2, "timeouts are retryable"
 
 
+async def test_throttling_shrinks_the_shared_window_once_per_burst(monkeypatch):
+    """Calls failing together from one overload are one signal: halving per
+    failure would collapse the window to 1 from a single burst."""
+    from app.services.gemini import _get_limiter
+
+    provider = _make_provider(monkeypatch)
+    limiter = _get_limiter()
+    start = limiter.window
+
+    async def throttled():
+        raise RuntimeError("429 RESOURCE_EXHAUSTED: quota exceeded")
+
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            await provider._with_retry(throttled, attempts=1)
+    assert limiter.window == start / 2
+    assert limiter.in_flight == 0
+
+
+async def test_successes_grow_the_window_back_to_its_ceiling(monkeypatch):
+    from app.services.gemini import _get_limiter
+
+    provider = _make_provider(monkeypatch)
+    limiter = _get_limiter()
+    limiter.window = 1.0
+
+    async def ok():
+        return "ok"
+
+    for _ in range(200):
+        await provider._with_retry(ok)
+    assert limiter.window == limiter.max_window
+
+
+async def test_server_errors_leave_the_window_alone(monkeypatch):
+    """A 500 is not a success: counting it as one would widen the window
+    while the service is failing."""
+    from app.services.gemini import _get_limiter
+
+    provider = _make_provider(monkeypatch)
+    limiter = _get_limiter()
+    limiter.window = 4.0
+
+    async def broken():
+        raise RuntimeError("500 INTERNAL: backend error")
+
+    for _ in range(20):
+        with pytest.raises(RuntimeError):
+            await provider._with_retry(broken, attempts=1)
+    assert limiter.window == 4.0
+    assert limiter.in_flight == 0
+
+
+async def test_the_window_bounds_concurrent_calls(monkeypatch):
+    from app.services.gemini import _get_limiter
+
+    provider = _make_provider(monkeypatch)
+    limiter = _get_limiter()
+    limiter.window = 2.0
+    peak = {"now": 0, "max": 0}
+
+    async def call():
+        peak["now"] += 1
+        peak["max"] = max(peak["max"], peak["now"])
+        await asyncio.sleep(0.01)
+        peak["now"] -= 1
+
+    await asyncio.gather(*(provider._with_retry(call) for _ in range(6)))
+    assert peak["max"] == 2
+
+
+async def test_retry_after_hint_is_honoured(monkeypatch):
+    from app.services.gemini import _retry_after
+
+    provider = _make_provider(monkeypatch)
+    assert _retry_after(RuntimeError("429 RESOURCE_EXHAUSTED {'retryDelay': '7s'}")) == 7.0
+    assert _retry_after(RuntimeError("503 UNAVAILABLE")) == 0.0
+
+    slept = []
+    real_sleep = asyncio.sleep
+
+    async def record(seconds, *_a, **_k):
+        slept.append(seconds)
+        await real_sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", record)
+    calls = {"n": 0}
+
+    async def hinted():
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise RuntimeError("429 RESOURCE_EXHAUSTED {'retryDelay': '0.3s'}")
+        return "ok"
+
+    assert await provider._with_retry(hinted, attempts=2, base_delay=0.01) == "ok"
+    assert max(slept) >= 0.3, "the provider's own wait must not be undercut by our backoff"
+
+
 async def test_story_instruction_carries_language_hero_and_injection_guard():
     from app.services.gemini import _story_instruction
 
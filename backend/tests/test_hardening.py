@@ -6,7 +6,9 @@ from sqlalchemy import select
 
 from app.config import get_settings
 from app.db import get_session_factory
+from app.job_events import forget_jobs
 from app.models import GenerationJob
+from app.reaper import reap_stale_jobs
 
 from .conftest import wait_for_job
 
@@ -40,7 +42,14 @@ async def test_stale_running_job_reports_failed(client, auth_headers):
         job.created_at = stale
         job.updated_at = stale
         await session.commit()
+    # The dead worker's last snapshot would be as old as the row; polls treat
+    # such a snapshot as absent, so drop the fresh one the finished run left.
+    await forget_jobs(job_id)
 
+    r = await client.get(f"/api/jobs/{job_id}", headers=auth_headers)
+    assert r.json()["status"] == "running", "a poll only reads; the reaper fails dead jobs"
+
+    assert await reap_stale_jobs() == 1
     r = await client.get(f"/api/jobs/{job_id}", headers=auth_headers)
     assert r.status_code == 200
     body = r.json()
@@ -78,9 +87,12 @@ async def test_hero_name_stored_not_mangled_into_prompt(client, auth_headers):
     assert "main character" not in story["title"].lower()
 
 
-async def test_stale_generating_story_selfheals_from_story_read(client, auth_headers):
-    """After a page refresh the client loses the job id; reading the story or
-    library must still fail-over a dead generation so it can be deleted."""
+async def test_stale_generating_story_is_reaped_without_a_read(client, auth_headers):
+    """After a page refresh the client loses the job id. The story and the
+    library must still settle on failed so it can be deleted, and reading
+    them must not be what does it: reads never write."""
+    from app.models import GenerationEvent, Story
+
     r = await client.post("/api/stories", json={"prompt": "The stuck snowman"}, headers=auth_headers)
     story_id, job_id = r.json()["story_id"], r.json()["job_id"]
     await wait_for_job(client, auth_headers, job_id)
@@ -91,22 +103,236 @@ async def test_stale_generating_story_selfheals_from_story_read(client, auth_hea
         job.status = "running"
         job.created_at = stale
         job.updated_at = stale
-        from app.models import Story
-
         story = await session.get(Story, story_id)
         story.status = "generating"
         await session.commit()
 
+    assert (await client.get(f"/api/stories/{story_id}", headers=auth_headers)).json()[
+        "status"
+    ] == "generating"
+    assert (await client.get("/api/stories", headers=auth_headers)).json()[0]["status"] == "generating"
+
+    await reap_stale_jobs()
     story = (await client.get(f"/api/stories/{story_id}", headers=auth_headers)).json()
     assert story["status"] == "failed"
-    # ...and it no longer counts against the daily quota
-    usage = (await client.get("/api/auth/usage", headers=auth_headers)).json()
-    assert usage["stories_today"] < usage["daily_limit"] or usage["remaining_today"] >= 0
+    async with get_session_factory()() as session:
+        event = (
+            await session.execute(select(GenerationEvent).where(GenerationEvent.story_id == story_id))
+        ).scalar_one()
+    assert event.refunded and event.refund_reason == "stale_timeout", "our failure is not charged"
 
     r = await client.delete(f"/api/stories/{story_id}", headers=auth_headers)
     assert r.status_code == 204
 
 
+async def test_the_reaper_sweeps_every_user_and_spares_live_jobs(client, auth_headers, monkeypatch):
+    from app import reaper
+    from app.models import ExportJob
+
+    monkeypatch.setattr(reaper, "_BATCH", 2)  # several batches from a few jobs
+    others = []
+    for i in range(2):
+        r = await client.post(
+            "/api/auth/register",
+            json={"email": f"reaped-{i}@example.com", "password": "password123", "display_name": ""},
+        )
+        others.append({"Authorization": f"Bearer {r.json()['access_token']}"})
+    job_ids = []
+    for headers in [auth_headers, *others]:
+        r = await client.post("/api/stories", json={"prompt": "The lantern keeper"}, headers=headers)
+        job_ids.append(r.json()["job_id"])
+        await wait_for_job(client, headers, job_ids[-1])
+    live, *dead = job_ids
+
+    stale = datetime.now(UTC) - timedelta(hours=1)
+    async with get_session_factory()() as session:
+        for job_id in job_ids:
+            job = await session.get(GenerationJob, job_id)
+            job.status = "running"
+            job.updated_at = datetime.now(UTC) if job_id == live else stale
+        job = await session.get(GenerationJob, dead[0])
+        session.add(ExportJob(story_id=job.story_id, digest="x", status="running", updated_at=stale))
+        await session.commit()
+
+    assert await reap_stale_jobs() == len(dead) + 1
+    async with get_session_factory()() as session:
+        statuses = {job_id: (await session.get(GenerationJob, job_id)).status for job_id in job_ids}
+        exports = (await session.execute(select(ExportJob.status))).scalars().all()
+    assert statuses == {live: "running", **dict.fromkeys(dead, "failed")}
+    assert exports == ["failed"]
+    assert await reap_stale_jobs() == 0
+
+
+async def _missing_since(worker, seconds):
+    """Backdate when the sweeps first missed worker, as time passing would."""
+    from app import kv
+    from app.reaper import _MISSING
+
+    await kv.put(_MISSING + worker, str(datetime.now(UTC).timestamp() - seconds), ttl=60)
+
+
+async def test_a_job_whose_worker_stops_beating_is_failed_in_seconds(client, auth_headers, monkeypatch):
+    from app import heartbeat
+    from app.models import GenerationEvent
+    from app.reaper import reap_orphaned_jobs
+
+    job_ids = []
+    for prompt in ("The orphaned owl", "The watched owl"):
+        r = await client.post("/api/stories", json={"prompt": prompt}, headers=auth_headers)
+        job_ids.append(r.json()["job_id"])
+        await wait_for_job(client, auth_headers, job_ids[-1])
+    orphan, watched = job_ids
+
+    await heartbeat.start_heartbeat()
+    try:
+        # A minute of silence: nowhere near STALE_AFTER, but several beats.
+        quiet = datetime.now(UTC) - timedelta(minutes=1)
+        async with get_session_factory()() as session:
+            for job_id, worker in ((orphan, "gone-1-abcdef"), (watched, heartbeat.worker_id())):
+                job = await session.get(GenerationJob, job_id)
+                job.status, job.worker_id, job.updated_at = "running", worker, quiet
+            await session.commit()
+        await forget_jobs(*job_ids)
+
+        async def _unreadable():
+            raise ConnectionError("redis is down")
+
+        # Beats that cannot be read are not the same as no beats.
+        with monkeypatch.context() as m:
+            m.setattr(heartbeat, "beats", _unreadable)
+            assert await reap_orphaned_jobs() == 0
+
+        assert await reap_stale_jobs() == 0
+        # The first sweep to miss a worker only notes it...
+        assert await reap_orphaned_jobs() == 0
+        await _missing_since("gone-1-abcdef", heartbeat.beat_ttl())
+        # ...and a sweep a beat's lifetime later fails its jobs.
+        assert await reap_orphaned_jobs() == 1
+        r = await client.get(f"/api/jobs/{orphan}", headers=auth_headers)
+        assert r.json()["status"] == "failed"
+        assert r.json()["error_code"] == "generation.stalled"
+        async with get_session_factory()() as session:
+            event = (
+                await session.execute(
+                    select(GenerationEvent)
+                    .join(GenerationJob, GenerationJob.story_id == GenerationEvent.story_id)
+                    .where(GenerationJob.id == orphan)
+                )
+            ).scalar_one()
+            assert event.refunded and event.refund_reason == "worker_lost"
+            assert (await session.get(GenerationJob, watched)).status == "running"
+    finally:
+        await heartbeat.stop_heartbeat()
+
+    # A clean stop hands the job back for ARQ's re-run rather than failing it.
+    async with get_session_factory()() as session:
+        job = await session.get(GenerationJob, watched)
+        assert (job.status, job.worker_id) == ("running", "")
+    assert await reap_orphaned_jobs() == 0
+
+
+async def test_beats_lost_with_redis_do_not_fail_live_workers(client, auth_headers):
+    from app import heartbeat, kv
+    from app.reaper import reap_orphaned_jobs
+
+    r = await client.post("/api/stories", json={"prompt": "The flushed owl"}, headers=auth_headers)
+    job_id = r.json()["job_id"]
+    await wait_for_job(client, auth_headers, job_id)
+
+    await heartbeat.start_heartbeat()
+    try:
+        async with get_session_factory()() as session:
+            job = await session.get(GenerationJob, job_id)
+            job.status, job.worker_id = "running", heartbeat.worker_id()
+            job.updated_at = datetime.now(UTC) - timedelta(minutes=1)
+            await session.commit()
+        await forget_jobs(job_id)
+
+        # Redis restarted: every beat is gone, though the worker is alive.
+        await kv.delete("worker-beat:" + heartbeat.worker_id())
+        assert await heartbeat.beats() == []
+        assert await reap_orphaned_jobs() == 0, "one sweep without beats must not fail anything"
+
+        await heartbeat._write()  # the worker's next beat
+        await _missing_since(heartbeat.worker_id(), heartbeat.beat_ttl())
+        assert await reap_orphaned_jobs() == 0
+        async with get_session_factory()() as session:
+            assert (await session.get(GenerationJob, job_id)).status == "running"
+    finally:
+        await heartbeat.stop_heartbeat()
+
+
+async def test_a_worker_written_off_by_the_reaper_cannot_complete_its_story(
+    client, auth_headers, monkeypatch
+):
+    """A wedged worker whose job was failed and refunded must not come back and
+    mark the story complete over that refund."""
+    import asyncio
+
+    from sqlalchemy import update
+
+    from app import jobs
+    from app.models import GenerationEvent, Story
+    from app.services import pipeline
+
+    real_log_usage = pipeline._log_usage
+
+    async def reaped_meanwhile(story_id):
+        # What reap_orphaned_jobs does while this worker is unresponsive.
+        async with get_session_factory()() as session:
+            await session.execute(
+                update(GenerationJob).where(GenerationJob.story_id == story_id).values(status="failed")
+            )
+            await session.execute(update(Story).where(Story.id == story_id).values(status="failed"))
+            await session.execute(
+                update(GenerationEvent)
+                .where(GenerationEvent.story_id == story_id)
+                .values(refunded=True, refund_reason="worker_lost")
+            )
+            await session.commit()
+        await real_log_usage(story_id)
+
+    monkeypatch.setattr(pipeline, "_log_usage", reaped_meanwhile)
+    r = await client.post("/api/stories", json={"prompt": "The owl who dozed off"}, headers=auth_headers)
+    story_id = r.json()["story_id"]
+    await asyncio.gather(*jobs._inline_tasks)
+
+    async with get_session_factory()() as session:
+        story = await session.get(Story, story_id)
+        job = (
+            await session.execute(select(GenerationJob).where(GenerationJob.story_id == story_id))
+        ).scalar_one()
+        event = (
+            await session.execute(select(GenerationEvent).where(GenerationEvent.story_id == story_id))
+        ).scalar_one()
+    assert (story.status, job.status) == ("failed", "failed")
+    assert event.refunded and event.refund_reason == "worker_lost"
+
+
+async def test_worker_heartbeats_are_served_to_the_scraper(client, monkeypatch):
+    from app import heartbeat
+
+    monkeypatch.setattr(get_settings(), "metrics_token", "scrape-me")
+    assert (await client.get("/api/health/workers")).status_code == 404
+
+    await heartbeat.start_heartbeat()
+    try:
+        with heartbeat.running("story:abc"):
+            await heartbeat._write()  # as the next beat would
+            r = await client.get("/api/health/workers", headers={"Authorization": "Bearer scrape-me"})
+    finally:
+        await heartbeat.stop_heartbeat()
+    assert r.status_code == 200
+    [beat] = r.json()["workers"]
+    assert beat["jobs"] == ["story:abc"]
+    assert beat["pid"] == os.getpid()
+    assert beat["age_seconds"] < 5
+    assert beat["last_progress_at"] is not None
+
+    r = await client.get("/api/health/workers", headers={"Authorization": "Bearer scrape-me"})
+    assert r.json() == {"workers": []}
+
+
 async def test_password_over_72_bytes_rejected(client):
     r = await client.post(
         "/api/auth/register",
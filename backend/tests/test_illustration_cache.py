@@ -0,0 +1,253 @@
+"""Illustration cache: a repeat must cost nothing, entries stay within their
+family, and the cache stays within its bound.
+
+A fake provider counts calls, so "no API call on a hit" is asserted directly
+rather than inferred from timing.
+"""
+
+import asyncio
+
+import pytest
+
+from app import jobs, metrics
+from app.config import get_settings
+from app.services import pipeline
+from app.services.base import GeneratedImage, GenerationProvider, Usage
+from app.services.illustration_cache import (
+    CachingProvider,
+    cached_illustrations,
+    forget_illustrations,
+    forget_user,
+    purge_shared_cache,
+    reset_cache_index,
+)
+from app.services.mock import MockProvider
+from app.storage import LocalStorage
+
+# No module-level asyncio mark: one sync test, and pytest.ini runs in auto mode.
+
+
+class _Counting(GenerationProvider):
+    name = "counting"
+
+    def __init__(self, *, fail=False, size=100):
+        self.calls = 0
+        self.fail = fail
+        self.size = size
+
+    async def write_story(self, req):
+        raise NotImplementedError
+
+    async def illustrate(self, image_prompt, *, title, position):
+        self.calls += 1
+        if self.fail:
+            return GeneratedImage(error="blocked", usage=Usage(images=1))
+        return GeneratedImage(
+            data=b"\x89PNG" + image_prompt.encode().ljust(self.size, b"."), usage=Usage(images=1)
+        )
+
+    def illustration_cache_key(self, image_prompt, *, title, position):
+        return f"model-x\n{title}\n{image_prompt}"
+
+
+class _KeyedMock(MockProvider):
+    """The mock, cacheable, counting the pictures it is asked to draw."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def illustrate(self, image_prompt, *, title, position):
+        self.calls += 1
+        return await super().illustrate(image_prompt, title=title, position=position)
+
+    def illustration_cache_key(self, image_prompt, *, title, position):
+        return f"mock\n{title}\n{image_prompt}"
+
+
+@pytest.fixture(autouse=True)
+def _empty_index():
+    reset_cache_index()
+    yield
+    reset_cache_index()
+
+
+def _cached(tmp_path, inner, user_id="u1", max_bytes=10_000):
+    storage = LocalStorage(str(tmp_path / "media"), "/media")
+    return CachingProvider(inner, storage=storage, user_id=user_id, max_bytes=max_bytes), storage
+
+
+async def test_a_repeat_is_served_without_a_provider_call(tmp_path):
+    metrics.reset()
+    inner = _Counting()
+    provider, _ = _cached(tmp_path, inner)
+
+    first = await provider.illustrate("a yak on a hill", title="Yak", position=0)
+    # Position is not part of the key: the same scene on another page is the same picture.
+    again = await provider.illustrate("a yak on a hill", title="Yak", position=3)
+
+    assert inner.calls == 1
+    assert again.data == first.data and again.mime == "image/png"
+    assert again.usage == Usage(), "a hit consumed nothing and must not be billed"
+    assert (provider.hits, provider.misses) == (1, 1)
+    assert metrics.value("illustration_cache_hits_total", provider="counting") == 1
+
+
+async def test_the_cache_survives_a_new_process(tmp_path):
+    inner = _Counting()
+    first, storage = _cached(tmp_path, inner)
+    await first.illustrate("a yak", title="Yak", position=0)
+
+    second = CachingProvider(inner, storage=storage, user_id="u1", max_bytes=10_000)
+    await second.illustrate("a yak", title="Yak", position=0)
+    assert inner.calls == 1
+
+
+async def test_families_do_not_share_entries(tmp_path):
+    inner = _Counting()
+    first, storage = _cached(tmp_path, inner)
+    await first.illustrate("a yak", title="Yak", position=0)
+
+    other = CachingProvider(inner, storage=storage, user_id="u2", max_bytes=10_000)
+    await other.illustrate("a yak", title="Yak", position=0)
+    assert inner.calls == 2, "one family's prompt must never answer another's"
+
+
+async def test_failures_are_not_cached(tmp_path):
+    inner = _Counting(fail=True)
+    provider, _ = _cached(tmp_path, inner)
+    for _ in range(2):
+        image = await provider.illustrate("blocked idea", title="T", position=0)
+        assert not image.ok
+    assert inner.calls == 2, "a refusal must be retried, not remembered"
+
+
+async def test_least_recently_used_entries_are_evicted(tmp_path):
+    metrics.reset()
+    inner = _Counting(size=400)
+    provider, _ = _cached(tmp_path, inner, max_bytes=1000)
+
+    await provider.illustrate("one", title="T", position=0)
+    await provider.illustrate("two", title="T", position=1)
+    await provider.illustrate("one", title="T", position=0)  # refresh: "two" is now the oldest
+    await provider.illustrate("three", title="T", position=2)  # over the bound
+    assert inner.calls == 3
+    assert metrics.value("illustration_cache_evictions_total", provider="counting") == 1
+
+    await provider.illustrate("one", title="T", position=0)
+    assert inner.calls == 3, "recently used entry must survive eviction"
+    await provider.illustrate("two", title="T", position=1)
+    assert inner.calls == 4, "the least recently used entry must have been evicted"
+
+
+async def test_the_bound_is_shared_by_every_family(tmp_path):
+    inner = _Counting(size=400)
+    mine, storage = _cached(tmp_path, inner, max_bytes=1000)
+    theirs = CachingProvider(inner, storage=storage, user_id="u2", max_bytes=1000)
+
+    await mine.illustrate("one", title="T", position=0)
+    await theirs.illustrate("two", title="T", position=0)
+    await theirs.illustrate("three", title="T", position=0)
+    await mine.illustrate("one", title="T", position=0)
+    assert inner.calls == 4, "the oldest entry goes, whichever family it belongs to"
+
+
+async def test_forgetting_a_story_or_an_account_drops_its_entries(tmp_path):
+    inner = _Counting()
+    provider, storage = _cached(tmp_path, inner)
+    await provider.illustrate("a yak", title="Yak", position=0)
+    await provider.illustrate("a hill", title="Yak", position=1)
+
+    class _Page:
+        def __init__(self, image_prompt, position):
+            self.image_prompt, self.position = image_prompt, position
+
+    class _Story:
+        title = "Yak"
+        pages = [_Page("a yak", 0)]
+
+    await forget_illustrations(storage, cached_illustrations(inner, "u1", _Story()))
+    await provider.illustrate("a hill", title="Yak", position=1)
+    assert inner.calls == 2, "only the deleted story's pictures go"
+    await provider.illustrate("a yak", title="Yak", position=0)
+    assert inner.calls == 3
+
+    await forget_user(storage, "u1")
+    await provider.illustrate("a hill", title="Yak", position=1)
+    assert inner.calls == 4
+
+
+async def test_the_old_shared_cache_is_purged(tmp_path):
+    storage = LocalStorage(str(tmp_path / "media"), "/media")
+    await storage.save_artifact("illustrations/ab/abcd", b"private", content_type="image/png")
+    await purge_shared_cache(storage)
+    assert await storage.load_artifact("illustrations/ab/abcd") is None
+
+
+async def test_providers_without_a_key_bypass_the_cache(tmp_path):
+    provider, _ = _cached(tmp_path, MockProvider())
+    await provider.illustrate("anything", title="T", position=0)
+    assert provider.misses == provider.hits == 0
+    assert not (tmp_path / "artifacts").exists()
+
+
+def test_gemini_key_names_the_model_and_ignores_whitespace_noise():
+    from app.services.gemini import GeminiProvider
+
+    provider = object.__new__(GeminiProvider)
+    provider.image_model = "img-a"
+    a = provider.illustration_cache_key("a  yak\non a hill", title="Yak", position=0)
+    assert a == provider.illustration_cache_key("a yak on a hill", title="Yak", position=4)
+    assert a != provider.illustration_cache_key("a yak on a hill", title="Other", position=0)
+    provider.image_model = "img-b"
+    assert a != provider.illustration_cache_key("a yak on a hill", title="Yak", position=0)
+
+
+async def test_artifacts_are_not_served_as_media(client):
+    storage = LocalStorage(get_settings().media_root, "/media")
+    await storage.save_artifact("illustrations/ab/secret", b"private", content_type="image/png")
+    assert await storage.load_artifact("illustrations/ab/secret") == b"private"
+    assert (await client.get("/media/../artifacts/illustrations/ab/secret")).status_code == 404
+    await storage.delete_artifacts("illustrations/ab/")
+    assert await storage.load_artifact("illustrations/ab/secret") is None
+
+
+async def test_metrics_endpoint_is_dormant_without_a_token(client, monkeypatch):
+    assert (await client.get("/api/metrics")).status_code == 404
+    monkeypatch.setattr(get_settings(), "metrics_token", "scrape-me")
+    assert (await client.get("/api/metrics", headers={"Authorization": "Bearer wrong"})).status_code == 404
+
+    metrics.incr("illustration_cache_hits_total", provider="counting")
+    r = await client.get("/api/metrics", headers={"Authorization": "Bearer scrape-me"})
+    assert r.status_code == 200
+    assert 'illustration_cache_hits_total{provider="counting"}' in r.text
+
+
+async def test_a_failed_story_asked_for_again_costs_no_pictures(client, auth_headers, monkeypatch):
+    inner = _KeyedMock()
+    monkeypatch.setattr(pipeline, "_provider", inner)
+    real_log_usage = pipeline._log_usage
+
+    async def fail_at_the_end(story_id):
+        raise RuntimeError("lost the database at the last step")
+
+    monkeypatch.setattr(pipeline, "_log_usage", fail_at_the_end)
+    r = await client.post("/api/stories", json={"prompt": "The yak who sang"}, headers=auth_headers)
+    await asyncio.gather(*jobs._inline_tasks)
+    story = (await client.get(f"/api/stories/{r.json()['story_id']}", headers=auth_headers)).json()
+    assert story["status"] == "failed"
+    drawn = inner.calls
+    assert drawn > 0
+
+    monkeypatch.setattr(pipeline, "_log_usage", real_log_usage)
+    r = await client.post("/api/stories", json={"prompt": "The yak who sang"}, headers=auth_headers)
+    await asyncio.gather(*jobs._inline_tasks)
+    story_id = r.json()["story_id"]
+    story = (await client.get(f"/api/stories/{story_id}", headers=auth_headers)).json()
+    assert story["status"] == "complete"
+    assert inner.calls == drawn, "the failed story's pictures were kept and reused"
+
+    # Deleted with the story it was drawn for (and the failed one's pages, same pictures).
+    assert (await client.delete(f"/api/stories/{story_id}", headers=auth_headers)).status_code == 204
+    await client.post("/api/stories", json={"prompt": "The yak who sang"}, headers=auth_headers)
+    await asyncio.gather(*jobs._inline_tasks)
+    assert inner.calls == 2 * drawn
@@ -0,0 +1,72 @@
+"""Illustration post-processing: what the library and reader are actually sent."""
+
+import io
+
+import pytest
+from PIL import Image, UnidentifiedImageError
+
+from app.cpu import run_cpu
+from app.services.imaging import COVER_SIZE, GRID_SIZE, process_illustration
+
+# No module-level asyncio mark: sync and async tests, and pytest.ini runs in auto mode.
+
+
+def _png(size, color=(200, 120, 40)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def _open(data: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(data))
+
+
+def test_a_large_square_picture_gets_a_bounded_display_image_and_3_2_thumbnails():
+    out = process_illustration(_png((2048, 2048)))
+    display, cover, grid = _open(out.display.data), _open(out.cover.data), _open(out.grid.data)
+    assert (display.format, out.display.mime) == ("WEBP", "image/webp")
+    assert max(display.size) == 1536
+    assert (cover.format, cover.size) == ("JPEG", COVER_SIZE), "link previews need a JPEG"
+    assert (grid.format, grid.size) == ("WEBP", GRID_SIZE)
+
+
+def test_small_pictures_are_never_enlarged():
+    out = process_illustration(_png((768, 512)))
+    assert _open(out.display.data).size == (768, 512)
+    assert _open(out.cover.data).size == (768, 512)
+    assert _open(out.grid.data).size == GRID_SIZE
+
+
+def test_unreadable_bytes_raise():
+    with pytest.raises(UnidentifiedImageError):
+        process_illustration(b"not an image")
+
+
+async def test_processing_runs_in_the_cpu_pool():
+    # Proves the function and its result survive pickling into a spawned worker.
+    out = await run_cpu(process_illustration, _png((300, 200)), fmt="webp", quality=70)
+    assert out.grid.mime == "image/webp"
+
+
+async def test_mock_illustrations_are_drawn_off_the_loop_and_stay_deterministic(monkeypatch):
+    import asyncio
+
+    from app.services import mock
+
+    async def no_latency(_seconds):
+        return None
+
+    monkeypatch.setattr(mock.asyncio, "sleep", no_latency)
+    provider = mock.MockProvider()
+    a, b = await asyncio.gather(
+        provider.illustrate("x", title="Yak", position=1), provider.illustrate("y", title="Yak", position=1)
+    )
+    assert a.data == b.data, "the same title and page must draw the same picture"
+
+    img = _open(a.data).convert("RGB")
+    seed = int(mock.hashlib.sha256(b"Yak:1").hexdigest(), 16)
+    top, bottom = mock._PALETTES[seed % len(mock._PALETTES)]
+    # Down the left edge, above the hills: the colour the old per-row loop drew.
+    for y in (0, 200, 400):
+        expected = [top[c] + (bottom[c] - top[c]) * y / 512 for c in range(3)]
+        assert all(abs(p - q) <= 3 for p, q in zip(img.getpixel((0, y)), expected, strict=True)), y
@@ -113,6 +113,144 @@ async def test_shared_pdf_is_public(client, auth_headers):
     assert r.headers["content-type"] == "application/pdf"
 
 
+async def test_a_book_is_rendered_once_and_revalidated_by_etag(client, auth_headers, monkeypatch):
+    import os
+
+    from app.config import get_settings
+    from app.services import pdf_cache
+
+    # Renders in a thread, so the patched builder below need not be picklable.
+    monkeypatch.setattr(get_settings(), "pdf_render_workers", 0)
+    story_id = await _completed_story(client, auth_headers)
+    slug = (await client.post(f"/api/stories/{story_id}/share", headers=auth_headers)).json()["share_slug"]
+    renders = []
+    real_build = pdf_cache.build_story_pdf
+
+    def counting_build(**kwargs):
+        renders.append(kwargs["title"])
+        return real_build(**kwargs)
+
+    monkeypatch.setattr(pdf_cache, "build_story_pdf", counting_build)
+    first = await client.get(f"/api/stories/{story_id}/pdf", headers=auth_headers)
+    shared = await client.get(f"/api/stories/shared/{slug}/pdf")
+    assert first.status_code == shared.status_code == 200
+    assert len(renders) == 1, "the shared link must reuse the owner's render"
+    assert shared.content == first.content and shared.headers["etag"] == first.headers["etag"]
+
+    again = await client.get(
+        f"/api/stories/{story_id}/pdf", headers={**auth_headers, "If-None-Match": first.headers["etag"]}
+    )
+    assert again.status_code == 304 and not again.content
+
+    artifacts = os.path.join(os.path.dirname(get_settings().media_root), "artifacts", "stories", story_id)
+    assert len(os.listdir(os.path.join(artifacts, "pdf"))) == 1
+    await client.delete(f"/api/stories/{story_id}", headers=auth_headers)
+    assert not os.path.exists(artifacts), "a deleted story's book must go with it"
+
+
+async def test_concurrent_downloads_of_a_new_book_share_one_render(client, auth_headers, monkeypatch):
+    import asyncio
+    import time
+
+    from app.config import get_settings
+    from app.services import pdf_cache
+
+    monkeypatch.setattr(get_settings(), "pdf_render_workers", 0)
+    story_id = await _completed_story(client, auth_headers)
+    renders = []
+    real_build = pdf_cache.build_story_pdf
+
+    def slow_build(**kwargs):
+        renders.append(kwargs["title"])
+        time.sleep(0.3)  # long enough for every request to miss the cache
+        return real_build(**kwargs)
+
+    monkeypatch.setattr(pdf_cache, "build_story_pdf", slow_build)
+    responses = await asyncio.gather(
+        *(client.get(f"/api/stories/{story_id}/pdf", headers=auth_headers) for _ in range(4))
+    )
+    assert [r.status_code for r in responses] == [200] * 4
+    assert len({r.content for r in responses}) == 1
+    assert len(renders) == 1, "the misses must wait for the first render, not start their own"
+
+
+async def test_prerendered_book_is_downloaded_without_a_render(client, auth_headers, monkeypatch):
+    from app.config import get_settings
+    from app.services import pdf_cache
+
+    monkeypatch.setattr(get_settings(), "pdf_prerender", True)
+    monkeypatch.setattr(get_settings(), "pdf_render_workers", 0)
+    renders = []
+    real_build = pdf_cache.build_story_pdf
+
+    def counting_build(**kwargs):
+        renders.append(kwargs["title"])
+        return real_build(**kwargs)
+
+    monkeypatch.setattr(pdf_cache, "build_story_pdf", counting_build)
+    story_id = await _completed_story(client, auth_headers)
+    assert len(renders) == 1, "the finalizing stage binds the book"
+
+    r = await client.get(f"/api/stories/{story_id}/pdf", headers=auth_headers)
+    assert r.status_code == 200 and r.content.startswith(b"%PDF")
+    assert len(renders) == 1, "the download must read the stored book, not render again"
+
+
+async def test_a_failed_prerender_leaves_the_story_complete(client, auth_headers, monkeypatch):
+    from app.config import get_settings
+    from app.services import pdf_cache
+    from app.services.pdf import PdfUnavailableError
+
+    monkeypatch.setattr(get_settings(), "pdf_prerender", True)
+    monkeypatch.setattr(get_settings(), "pdf_render_workers", 0)
+
+    def no_fonts(**kwargs):
+        raise PdfUnavailableError("no fonts")
+
+    monkeypatch.setattr(pdf_cache, "build_story_pdf", no_fonts)
+    story_id = await _completed_story(client, auth_headers)
+    story = (await client.get(f"/api/stories/{story_id}", headers=auth_headers)).json()
+    assert story["status"] == "complete"
+    r = await client.get(f"/api/stories/{story_id}/pdf", headers=auth_headers)
+    assert r.status_code == 503 and r.json()["code"] == "story.pdf_unavailable"
+
+
+async def test_a_full_render_queue_answers_503_with_retry_after(client, auth_headers, monkeypatch):
+    from app.config import get_settings
+    from app.services.pdf_renderer import get_pdf_renderer
+
+    monkeypatch.setattr(get_settings(), "pdf_render_workers", 0)
+    monkeypatch.setattr(get_settings(), "pdf_render_queue", 0)
+    story_id = await _completed_story(client, auth_headers)
+    async with get_pdf_renderer().admitted():  # the one slot, taken
+        r = await client.get(f"/api/stories/{story_id}/pdf", headers=auth_headers)
+    assert r.status_code == 503 and r.json()["code"] == "story.pdf_busy"
+    assert int(r.headers["retry-after"]) >= 1
+
+    r = await client.get(f"/api/stories/{story_id}/pdf", headers=auth_headers)
+    assert r.status_code == 200, "the place is given back once the render ends"
+
+
+async def test_a_book_streams_from_disk_and_resumes_by_range(client, auth_headers, monkeypatch, tmp_path):
+    """The download is served from a scratch file, resumable with Range, and
+    the scratch is gone once the response has been sent."""
+    import tempfile
+
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    story_id = await _completed_story(client, auth_headers)
+    full = await client.get(f"/api/stories/{story_id}/pdf", headers=auth_headers)
+    assert full.status_code == 200 and full.headers["accept-ranges"] == "bytes"
+    assert int(full.headers["content-length"]) == len(full.content)
+
+    tail = await client.get(
+        f"/api/stories/{story_id}/pdf",
+        headers={**auth_headers, "Range": "bytes=100-", "If-Range": full.headers["etag"]},
+    )
+    assert tail.status_code == 206 and tail.content == full.content[100:]
+    assert tail.headers["etag"] == full.headers["etag"]
+    assert list(tmp_path.iterdir()) == [], "an export must not leave its scratch behind"
+
+
 async def test_unshared_story_has_no_public_pdf(client, auth_headers):
     story_id = await _completed_story(client, auth_headers)
     slug = (await client.post(f"/api/stories/{story_id}/share", headers=auth_headers)).json()["share_slug"]
@@ -129,7 +267,8 @@ async def test_missing_illustration_degrades_the_page_not_the_book(client, auth_
     from app.config import get_settings
 
     media_dir = os.path.join(get_settings().media_root, "stories", story_id)
-    victim = sorted(os.listdir(media_dir))[0]
+    # A display image, not one of its thumbnails: the PDF embeds only those.
+    victim = sorted(n for n in os.listdir(media_dir) if not n.endswith(("-cover.jpg", "-grid.webp")))[0]
     os.remove(os.path.join(media_dir, victim))
 
     r = await client.get(f"/api/stories/{story_id}/pdf", headers=auth_headers)
@@ -151,6 +290,41 @@ async def test_image_loader_refuses_paths_outside_media_root(tmp_path):
     assert await storage.load_image("/elsewhere/x.png") is None
 
 
+async def test_a_books_images_are_read_together_and_in_order(tmp_path):
+    import asyncio
+
+    class _Slow(LocalStorage):
+        in_flight = peak = 0
+
+        async def load_image(self, url):
+            type(self).in_flight += 1
+            type(self).peak = max(self.peak, self.in_flight)
+            await asyncio.sleep(0.05)
+            type(self).in_flight -= 1
+            return url.encode()
+
+    urls = [f"/media/stories/s/{i:02d}.webp" for i in range(5)]
+    got = await _Slow(str(tmp_path), "/media").load_images([urls[0], "", *urls[1:]])
+    assert got == [urls[0].encode(), None, *(u.encode() for u in urls[1:])]
+    assert _Slow.peak == 5, "pages must be fetched concurrently, not one after another"
+
+
+async def test_a_books_images_are_spooled_to_files_in_order(tmp_path):
+    storage = LocalStorage(str(tmp_path / "media"), "/media")
+    pages = [
+        await storage.save_image(bytes([i]) * 10, story_id="s", position=i, mime="image/png")
+        for i in range(3)
+    ]
+    spool = tmp_path / "spool"
+    spool.mkdir()
+
+    got = await storage.spool_images([pages[0], "", "/media/stories/s/missing.png", *pages[1:]], str(spool))
+    assert got[1:3] == [None, None]
+    from pathlib import Path
+
+    assert [Path(p).read_bytes() for p in (got[0], *got[3:])] == [bytes([i]) * 10 for i in range(3)]
+
+
 # --- Regressions found by adversarial review ---------------------------------
 
 
@@ -183,6 +357,74 @@ def test_corrupt_image_degrades_the_page_not_the_book():
         assert "First page.".split()[0] in (reader.pages[1].extract_text() or "")
 
 
+def _noisy_png(w, h, mode="RGB") -> bytes:
+    """A photo-like PNG: noise does not Flate-compress, as illustrations do not."""
+    import os as _os
+
+    from PIL import Image as _I
+
+    buf = BytesIO()
+    _I.frombytes(mode, (w, h), _os.urandom(w * h * len(mode))).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _embedded_images(data: bytes) -> dict[int, tuple[int, int, str]]:
+    """Each image object in the file once: (width, height, filter), by object number."""
+    found = {}
+    for page in PdfReader(BytesIO(data)).pages:
+        for ref in (page["/Resources"].get("/XObject") or {}).values():
+            obj = ref.get_object()
+            found[ref.idnum] = (obj["/Width"], obj["/Height"], obj["/Filter"])
+    return found
+
+
+def test_illustrations_are_resampled_to_the_printed_size():
+    """A full-size provider PNG must not be embedded as is: each picture is
+    resampled to its slot at the configured DPI, compressed, and the cover
+    shares its page's image object instead of embedding it again."""
+    from app.services.pdf import PICTURE_W, PdfPage, build_story_pdf
+
+    pages = [PdfPage(text=f"Page {i}.", image=_noisy_png(2048, 1365)) for i in range(3)]
+    screen = build_story_pdf(title="Sharp Enough", language="en", hero_name="", pages=pages)
+    images = _embedded_images(screen)
+    assert len(images) == 3, "the cover must reuse its page's image"
+    for width, _height, image_filter in images.values():
+        assert width == round(PICTURE_W * 150)
+        assert image_filter == "/DCTDecode"
+    assert len(screen) < sum(len(p.image) for p in pages) / 4
+
+    hires = build_story_pdf(title="Sharp Enough", language="en", hero_name="", pages=pages, image_dpi=300)
+    assert {w for w, _h, _f in _embedded_images(hires).values()} == {round(PICTURE_W * 300)}
+
+
+def test_small_and_transparent_illustrations_are_never_degraded():
+    """Pictures are never scaled up, a JPEG already small enough goes in byte
+    for byte, and real transparency survives (no white box on the cream cover)."""
+    from PIL import Image as _I
+
+    from app.services.pdf import PdfPage, build_story_pdf
+
+    buf = BytesIO()
+    _I.new("RGB", (600, 400), (20, 120, 200)).save(buf, format="JPEG", quality=90)
+    small_jpeg = buf.getvalue()
+    data = build_story_pdf(
+        title="Small Pictures",
+        language="en",
+        hero_name="",
+        pages=[
+            PdfPage(text="A small photo.", image=small_jpeg),
+            PdfPage(text="A sticker.", image=_noisy_png(300, 200, "RGBA")),
+        ],
+    )
+    reader = PdfReader(BytesIO(data))
+    photo = next(iter(reader.pages[1]["/Resources"]["/XObject"].values())).get_object()
+    assert (photo["/Width"], photo["/Height"]) == (600, 400)
+    assert photo.get_data() == small_jpeg
+    sticker = next(iter(reader.pages[2]["/Resources"]["/XObject"].values())).get_object()
+    assert (sticker["/Width"], sticker["/Height"]) == (300, 200)
+    assert "/SMask" in sticker
+
+
 def test_long_paragraph_stays_on_one_sheet():
     """~150 words with a square illustration used to spill a continuation
     sheet carrying the page number — the old exporter's bug, reborn."""
@@ -202,6 +444,71 @@ def test_long_paragraph_stays_on_one_sheet():
         assert str(i) in extracted, f"page number {i} must sit on its own scene's sheet"
 
 
+_WORDS = (
+    "the a yak star counted little brave mountain path walked WAVE AVATAR To Ty Yo fjord wolf's "
+    'quietly, jumped! over: "quoted" (paren) 12345 T. V. Wolf office affinity naïve café'
+).split()
+
+
+def _prose(rng, n):
+    text = " ".join(rng.choice(_WORDS) for _ in range(n))
+    if rng.random() < 0.15:
+        text = text.replace(" ", "\n", rng.randint(1, 2))
+    return text
+
+
+def test_text_measurement_matches_multi_cell_line_for_line():
+    """The sizing shortcut must agree with fpdf2's own line breaker at every
+    size and width, kerned pairs ("V.", "To") and newlines included."""
+    import random
+
+    from fpdf import FPDF
+    from fpdf.enums import MethodReturnValue
+
+    from app.services import pdf
+
+    rng = random.Random(7)  # noqa: S311 - a fixed corpus, not a secret
+    doc = FPDF(unit="in", format="letter")
+    pdf._register_fonts(doc, "en")
+    doc.add_page()
+    for _ in range(60):
+        text, style = _prose(rng, rng.randint(1, 120)), rng.choice(["", "B"])
+        for size in (13.5, 11.5, 9.5, 30):
+            width = rng.choice([pdf.TEXT_W, pdf.PAGE_W - 1.9, rng.uniform(1.0, 6.0)])
+            doc.set_font("latin", style, 13.5)
+            wrap = pdf._Wrap.of(doc, text)
+            doc.set_font("latin", style, size)
+            expected = doc.multi_cell(width, 0.3, text, dry_run=True, output=MethodReturnValue.LINES)
+            assert wrap.lines(size, width) in (None, len(expected)), (text, size, width)
+
+
+def test_fitted_books_are_identical_to_dry_run_fitting(monkeypatch):
+    """Byte for byte, the book must be the one the multi_cell dry runs chose,
+    from text that fits at full size to text that needs the smallest."""
+    import re
+
+    from app.services import pdf
+    from app.services.pdf import PdfPage, build_story_pdf
+
+    def book(language, texts):
+        data = build_story_pdf(
+            title="The Yak Who Counted Every Star in the Valley",
+            language=language,
+            hero_name="Asha",
+            pages=[PdfPage(text=t, image=_png(600, 400)) for t in texts],
+        )
+        return re.sub(rb"/CreationDate \(D:[^)]*\)|/ID \[<[0-9A-F]+><[0-9A-F]+>\]", b"", data)
+
+    base = "The brave little yak walked up the winding path to count the stars. "
+    books = [("en", [(base * n).strip() for n in (3, 8, 10, 12, 14, 20)])]
+    if devanagari_font_available():
+        ne = "सानो याक डाँडामा चढ्यो र ताराहरू एक एक गरी गन्यो। "
+        books.append(("ne", [(ne * n).strip() for n in (3, 8, 11, 14, 20)]))
+    fast = [book(language, texts) for language, texts in books]
+    monkeypatch.setattr(pdf._Wrap, "of", classmethod(lambda cls, doc, text: None))
+    assert fast == [book(language, texts) for language, texts in books]
+
+
 def test_long_title_keeps_the_cover_to_one_sheet():
     from app.services.pdf import PdfPage, build_story_pdf
 
@@ -213,6 +520,30 @@ def test_long_title_keeps_the_cover_to_one_sheet():
     assert len(PdfReader(BytesIO(data)).pages) == 3
 
 
+def test_shared_fonts_carry_nothing_from_one_book_to_the_next(monkeypatch):
+    """Parsed fonts are reused across renders, but fpdf2 subsets the font in
+    place at output: a leaked subset would drop or misplace glyphs in the next
+    book. Each render must match what a fresh add_font produces."""
+    import re
+
+    from app.services import pdf
+    from app.services.pdf import PdfPage, build_story_pdf
+
+    def book(text):
+        data = build_story_pdf(title="Yak", language="en", hero_name="Asha", pages=[PdfPage(text=text)])
+        # Both hash or print the clock; everything else must match exactly.
+        return re.sub(rb"/CreationDate \(D:[^)]*\)|/ID \[<[0-9A-F]+><[0-9A-F]+>\]", b"", data)
+
+    pdf.warm_fonts()
+    first = book("The little yak counted the stars.")
+    other = book("Zebras quietly jump over 12345 wide fjords!")
+    assert book("The little yak counted the stars.") == first
+    assert "Zebras quietly jump" in (PdfReader(BytesIO(other)).pages[1].extract_text() or "")
+
+    monkeypatch.setattr(pdf._fonts, "parsed", lambda *args: None)  # plain add_font
+    assert book("The little yak counted the stars.") == first
+
+
 async def test_filename_header_survives_a_hostile_title(client, auth_headers):
     """A '/' in the title made filename* invalid RFC 5987."""
     from sqlalchemy import update
@@ -232,3 +563,188 @@ async def test_filename_header_survives_a_hostile_title(client, auth_headers):
     disposition = r.headers["content-disposition"]
     assert "%2F" in disposition, "slash must be percent-encoded in filename*"
     assert "\n" not in disposition and "\r" not in disposition
+
+
+def test_print_profile_adds_bleed_trim_marks_and_print_resolution_images():
+    """The press needs a bleed around the trimmed page, marks to cut on, and
+    pictures at 300 DPI even when the source was smaller: upscaled, never
+    left soft, and flat (no soft mask a RIP may mishandle)."""
+    from app.services.pdf import BLEED, PAGE_H, PAGE_W, PICTURE_W, SLUG, PdfPage, build_story_pdf
+
+    pages = [PdfPage(text=f"Page {i}.", image=_noisy_png(768, 512, "RGBA")) for i in range(2)]
+    data = build_story_pdf(
+        title="For the Press", language="en", hero_name="", pages=pages, profile="print", image_dpi=300
+    )
+    reader = PdfReader(BytesIO(data))
+    assert len(reader.pages) == len(pages) + 2
+    offset = (BLEED + SLUG) * 72
+    for page in reader.pages:
+        assert [float(v) for v in page.mediabox] == pytest.approx(
+            [0, 0, PAGE_W * 72 + 2 * offset, PAGE_H * 72 + 2 * offset]
+        )
+        assert [float(v) for v in page.trimbox] == pytest.approx(
+            [offset, offset, offset + PAGE_W * 72, offset + PAGE_H * 72]
+        )
+        assert float(page.bleedbox[0]) == pytest.approx(SLUG * 72)
+    for width, _height, image_filter in _embedded_images(data).values():
+        assert width == round(PICTURE_W * 300)
+        assert image_filter == "/DCTDecode"
+    for page in reader.pages[1:-1]:
+        for ref in page["/Resources"]["/XObject"].values():
+            assert "/SMask" not in ref.get_object()
+
+    screen = build_story_pdf(title="For the Press", language="en", hero_name="", pages=pages)
+    screen_page = PdfReader(BytesIO(screen)).pages[0]
+    assert [float(v) for v in screen_page.mediabox] == pytest.approx([0, 0, PAGE_W * 72, PAGE_H * 72])
+
+
+def test_print_images_are_cmyk_when_a_profile_is_configured(monkeypatch):
+    from app.services import pdf
+
+    # No CMYK ICC profile ships with this host; the conversion itself is Pillow's.
+    monkeypatch.setattr(pdf, "_to_cmyk", lambda img, profile: img.convert("CMYK"))
+    data = pdf.build_story_pdf(
+        title="Ink",
+        language="en",
+        hero_name="",
+        pages=[pdf.PdfPage(text="Cyan sky.", image=_noisy_png(400, 300))],
+        profile="print",
+        cmyk_profile="press.icc",
+    )
+    page = PdfReader(BytesIO(data)).pages[1]
+    image = next(iter(page["/Resources"]["/XObject"].values())).get_object()
+    assert image["/ColorSpace"] == "/DeviceCMYK"
+
+
+async def _wait_for_export(client, headers, export_id, timeout=30.0):
+    import asyncio
+
+    deadline = asyncio.get_event_loop().time() + timeout
+    while True:
+        r = await client.get(f"/api/exports/{export_id}", headers=headers)
+        assert r.status_code == 200, r.text
+        if r.json()["status"] in ("complete", "failed"):
+            return r.json()
+        assert asyncio.get_event_loop().time() < deadline, r.json()
+        await asyncio.sleep(0.05)
+
+
+async def test_print_export_runs_as_a_job_and_is_reused(client, auth_headers, monkeypatch):
+    from app.config import get_settings
+
+    monkeypatch.setattr(get_settings(), "pdf_render_workers", 0)
+    story_id = await _completed_story(client, auth_headers)
+    r = await client.post("/api/exports", json={"story_id": story_id}, headers=auth_headers)
+    assert r.status_code == 202, r.text
+    export_id = r.json()["id"]
+    assert r.json()["download_url"] == ""
+
+    export = await _wait_for_export(client, auth_headers, export_id)
+    assert export["status"] == "complete", export
+    assert export["stage"] == "done"
+    assert export["progress_current"] == export["progress_total"]
+    assert export["size_bytes"] > 0
+
+    pdf = await client.get(export["download_url"], headers=auth_headers)
+    assert pdf.status_code == 200
+    assert pdf.headers["content-type"] == "application/pdf"
+    assert len(pdf.content) == export["size_bytes"]
+    assert "/TrimBox" in PdfReader(BytesIO(pdf.content)).pages[0]
+
+    again = await client.post("/api/exports", json={"story_id": story_id}, headers=auth_headers)
+    assert again.json()["id"] == export_id, "an unchanged book must not be prepared twice"
+
+    r2 = await client.post(
+        "/api/auth/register",
+        json={"email": "other-export@example.com", "password": "password123", "display_name": ""},
+    )
+    other = {"Authorization": f"Bearer {r2.json()['access_token']}"}
+    assert (await client.get(f"/api/exports/{export_id}", headers=other)).status_code == 404
+    assert (await client.get(f"/api/exports/{export_id}/pdf", headers=other)).status_code == 404
+    r = await client.post("/api/exports", json={"story_id": story_id}, headers=other)
+    assert r.status_code == 404
+
+
+async def test_an_export_cut_off_by_shutdown_is_rendered_again(client, auth_headers, monkeypatch):
+    from app import heartbeat
+    from app.config import get_settings
+    from app.db import get_session_factory
+    from app.models import ExportJob
+    from app.services.exports import run_export
+
+    monkeypatch.setattr(get_settings(), "pdf_render_workers", 0)
+    story_id = await _completed_story(client, auth_headers)
+    r = await client.post("/api/exports", json={"story_id": story_id}, headers=auth_headers)
+    export_id = r.json()["id"]
+    await _wait_for_export(client, auth_headers, export_id)
+
+    async def interrupted(worker_id):
+        async with get_session_factory()() as session:
+            export = await session.get(ExportJob, export_id)
+            export.status, export.stage, export.worker_id = "running", "rendering", worker_id
+            export.progress_current = 0
+            await session.commit()
+
+    async def status():
+        async with get_session_factory()() as session:
+            return (await session.get(ExportJob, export_id)).status
+
+    # Released by a clean stop, or stamped by a worker that stopped beating:
+    # ARQ's re-run must finish the book, not leave it running until the reaper.
+    for owner in ("", "gone-1-abc"):
+        await interrupted(owner)
+        await run_export(export_id)
+        assert await status() == "complete", owner
+
+    await heartbeat.start_heartbeat()
+    try:
+        await interrupted(heartbeat.worker_id())
+        await run_export(export_id)
+        assert await status() == "running", "a live worker's render must not be started twice"
+    finally:
+        await heartbeat.stop_heartbeat()
+
+    # A clean stop releases its exports like its stories, and the re-run resumes them.
+    async with get_session_factory()() as session:
+        assert (await session.get(ExportJob, export_id)).worker_id == ""
+    await run_export(export_id)
+    assert await status() == "complete"
+
+
+async def test_an_export_that_cannot_be_queued_answers_503(client, auth_headers, monkeypatch):
+    from app.config import get_settings
+    from app.routers import exports as exports_router
+
+    monkeypatch.setattr(get_settings(), "pdf_render_workers", 0)
+    story_id = await _completed_story(client, auth_headers)
+
+    async def queue_down(export_id):
+        raise ConnectionError("redis is down")
+
+    with monkeypatch.context() as m:
+        m.setattr(exports_router, "enqueue_export", queue_down)
+        r = await client.post("/api/exports", json={"story_id": story_id}, headers=auth_headers)
+    assert r.status_code == 503 and r.json()["code"] == "export.service_unavailable"
+
+    # Not left queued for the reaper: the next request starts a fresh export.
+    r = await client.post("/api/exports", json={"story_id": story_id}, headers=auth_headers)
+    assert r.status_code == 202
+    export = await _wait_for_export(client, auth_headers, r.json()["id"])
+    assert export["status"] == "complete"
+
+
+async def test_a_failed_export_is_reported_not_raised(client, auth_headers, monkeypatch):
+    from app.config import get_settings
+    from app.services import pdf_cache
+
+    def broken(**_kwargs):
+        raise RuntimeError("press jammed")
+
+    monkeypatch.setattr(get_settings(), "pdf_render_workers", 0)
+    monkeypatch.setattr(pdf_cache, "build_story_pdf", broken)
+    story_id = await _completed_story(client, auth_headers)
+    r = await client.post("/api/exports", json={"story_id": story_id}, headers=auth_headers)
+    export = await _wait_for_export(client, auth_headers, r.json()["id"])
+    assert export["status"] == "failed"
+    assert export["error_code"] == "export.failed"
+    assert (await client.get(f"/api/exports/{export['id']}/pdf", headers=auth_headers)).status_code == 409
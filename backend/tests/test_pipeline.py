@@ -0,0 +1,798 @@
+"""Generation pipeline internals: how results reach the database, not just that they do.
+
+The end-to-end flow tests prove a story completes. These pin the properties
+that keep a busy worker cheap on Postgres without ever showing a parent
+progress that moves backwards or a page that silently lost its picture.
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+from sqlalchemy import event, select, update
+
+from app import job_events
+from app.config import get_settings
+from app.db import get_engine, get_session_factory
+from app.models import GenerationJob, StoryPage
+from app.services.pipeline import PageResultWriter, _update_job
+
+from .conftest import wait_for_job
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _blank_story(client, headers, prompt="The owl who kept the lanterns"):
+    """A completed story whose page results are wiped and whose job runs
+    again, ready to be rewritten."""
+    r = await client.post("/api/stories", json={"prompt": prompt}, headers=headers)
+    assert r.status_code == 202, r.text
+    story_id, job_id = r.json()["story_id"], r.json()["job_id"]
+    await wait_for_job(client, headers, job_id)
+    async with get_session_factory()() as session:
+        await session.execute(
+            update(StoryPage).where(StoryPage.story_id == story_id).values(image_url="", image_error="")
+        )
+        await session.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id == job_id)
+            .values(status="running", progress_current=0)
+        )
+        await session.commit()
+    return story_id, job_id
+
+
+async def _state(story_id, job_id):
+    async with get_session_factory()() as session:
+        pages = (
+            (
+                await session.execute(
+                    select(StoryPage).where(StoryPage.story_id == story_id).order_by(StoryPage.position)
+                )
+            )
+            .scalars()
+            .all()
+        )
+        job = await session.get(GenerationJob, job_id)
+        return [p.image_url for p in pages], job.progress_current
+
+
+def _count_page_updates():
+    """Counts UPDATE statements against story_pages on the shared engine."""
+    seen = {"n": 0}
+
+    def _before(conn, cursor, statement, *_args):
+        if statement.lstrip().upper().startswith("UPDATE STORY_PAGES"):
+            seen["n"] += 1
+
+    event.listen(get_engine().sync_engine, "before_cursor_execute", _before)
+    return seen, lambda: event.remove(get_engine().sync_engine, "before_cursor_execute", _before)
+
+
+async def test_results_are_written_in_one_statement_per_batch(client, auth_headers):
+    story_id, job_id = await _blank_story(client, auth_headers)
+    writer = PageResultWriter(story_id=story_id, job_id=job_id, flush_seconds=60, flush_batch=3)
+    seen, stop = _count_page_updates()
+    try:
+        await writer.record(0, "/media/a.png", "")
+        await writer.record(1, "", "could not draw")
+        assert await _state(story_id, job_id) == (["", "", ""], 0), (
+            "nothing is written before the batch fills"
+        )
+
+        await writer.record(2, "/media/c.png", "")
+        assert await _state(story_id, job_id) == (["/media/a.png", "", "/media/c.png"], 3)
+        assert seen["n"] == 1, "three pages must cost one UPDATE, not three"
+    finally:
+        stop()
+        await writer.close()
+
+
+async def test_window_flushes_a_partial_batch(client, auth_headers):
+    story_id, job_id = await _blank_story(client, auth_headers)
+    writer = PageResultWriter(story_id=story_id, job_id=job_id, flush_seconds=0.05, flush_batch=10)
+    await writer.record(1, "/media/b.png", "")
+    await asyncio.sleep(0.3)
+    assert await _state(story_id, job_id) == (["", "/media/b.png", ""], 1)
+    await writer.close()
+
+
+async def test_close_is_the_final_flush(client, auth_headers):
+    story_id, job_id = await _blank_story(client, auth_headers)
+    writer = PageResultWriter(story_id=story_id, job_id=job_id, flush_seconds=60, flush_batch=10)
+    await writer.record(0, "/media/a.png", "")
+    await writer.record(2, "/media/c.png", "")
+    await writer.close()
+    assert await _state(story_id, job_id) == (["/media/a.png", "", "/media/c.png"], 2)
+
+
+async def test_progress_never_moves_backwards(client, auth_headers):
+    """Concurrent completions flushing out of order must not overwrite a
+    higher count with a lower one."""
+    story_id, job_id = await _blank_story(client, auth_headers)
+    writer = PageResultWriter(story_id=story_id, job_id=job_id, flush_seconds=0.01, flush_batch=1)
+    observed = []
+
+    async def one(position):
+        await asyncio.sleep(0.01 * (3 - position))
+        await writer.record(position, f"/media/{position}.png", "")
+        observed.append((await _state(story_id, job_id))[1])
+
+    await asyncio.gather(*(one(p) for p in range(3)))
+    await writer.close()
+    assert observed == sorted(observed)
+    assert (await _state(story_id, job_id))[1] == 3
+
+
+async def test_a_failed_final_flush_does_not_hide_why_illustrating_failed(client, auth_headers, monkeypatch):
+    from app.services.pipeline import _Illustrations
+    from app.services.scheduler import get_image_scheduler
+
+    story_id, job_id = await _blank_story(client, auth_headers)
+    writer = PageResultWriter(story_id=story_id, job_id=job_id, flush_seconds=60, flush_batch=10)
+    await writer.record(0, "/media/a.png", "")
+
+    async def database_down(*_args):
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(writer, "_write", database_down)
+
+    class _Exploding:
+        name = "exploding"
+
+        async def illustrate(self, image_prompt, *, title, position):
+            if position == 1:
+                raise RuntimeError("provider exploded")
+            await asyncio.sleep(60)
+
+    illustrations = _Illustrations(
+        _Exploding(), story_id=story_id, writer=writer, scheduler=get_image_scheduler()
+    )
+    illustrations.start(1, "a yak", title="T")
+    illustrations.start(2, "a hill", title="T")
+    with pytest.raises(RuntimeError, match="provider exploded"):
+        await illustrations.finish()
+    await asyncio.sleep(0)
+    assert all(task.done() for task in illustrations._tasks), "the sibling must not outlive the failure"
+
+
+# --- Streaming text ----------------------------------------------------------
+
+
+async def test_streamed_story_illustrates_before_the_text_is_finished(client, auth_headers, monkeypatch):
+    """The point of streaming: the first picture starts while later scenes are
+    still being written, and the finished book is the same shape either way."""
+    from app.config import get_settings
+    from app.services.base import StoryDraft
+    from app.services.mock import MockProvider
+
+    monkeypatch.setattr(get_settings(), "stream_story_text", True)
+    timeline = []
+    real_stream = MockProvider.write_story_stream
+    real_illustrate = MockProvider.illustrate
+
+    async def stream(self, req):
+        async for item in real_stream(self, req):
+            timeline.append("draft" if isinstance(item, StoryDraft) else f"scene{item.position}")
+            yield item
+
+    async def illustrate(self, image_prompt, *, title, position):
+        timeline.append(f"illustrate{position}")
+        return await real_illustrate(self, image_prompt, title=title, position=position)
+
+    monkeypatch.setattr(MockProvider, "write_story_stream", stream)
+    monkeypatch.setattr(MockProvider, "illustrate", illustrate)
+
+    r = await client.post("/api/stories", json={"prompt": "A river that sang"}, headers=auth_headers)
+    job = await wait_for_job(client, auth_headers, r.json()["job_id"])
+    assert job["status"] == "complete", job
+    assert timeline.index("illustrate0") < timeline.index("draft")
+
+    story = (await client.get(f"/api/stories/{r.json()['story_id']}", headers=auth_headers)).json()
+    assert [p["position"] for p in story["pages"]] == list(range(len(story["pages"])))
+    assert job["progress_total"] == job["progress_current"] == len(story["pages"])
+    assert all(p["image_url"] for p in story["pages"])
+
+
+async def test_default_stream_replays_the_whole_draft():
+    """Providers without a real stream still work in streaming mode."""
+    from app.services.base import DraftScene, GenerationProvider, StoryDraft, StoryRequest
+
+    class Whole(GenerationProvider):
+        async def write_story(self, req):
+            return StoryDraft(title="T", paragraphs=["a", "b"], image_prompts=["pa", "pb"])
+
+        async def illustrate(self, image_prompt, *, title, position):
+            raise NotImplementedError
+
+    items = [item async for item in Whole().write_story_stream(StoryRequest(prompt="x"))]
+    assert items[:2] == [
+        DraftScene(position=0, title="T", text="a", image_prompt="pa"),
+        DraftScene(position=1, title="T", text="b", image_prompt="pb"),
+    ]
+    assert isinstance(items[-1], StoryDraft)
+
+
+# --- Image scheduling --------------------------------------------------------
+
+
+async def _hold(scheduler, story_id, log, *, priority=False, seconds=0.02):
+    async with scheduler.slot(story_id, priority=priority):
+        log.append(story_id)
+        await asyncio.sleep(seconds)
+
+
+async def test_one_ceiling_is_shared_by_every_story():
+    from app.services.scheduler import ImageScheduler
+
+    scheduler = ImageScheduler(2)
+    peak = {"now": 0, "max": 0}
+
+    async def call(story_id):
+        async with scheduler.slot(story_id):
+            peak["now"] += 1
+            peak["max"] = max(peak["max"], peak["now"])
+            await asyncio.sleep(0.01)
+            peak["now"] -= 1
+
+    await asyncio.gather(*(call(s) for s in ("a", "b", "c") for _ in range(3)))
+    assert peak["max"] == 2
+    assert scheduler.in_flight == 0 and scheduler.depth() == 0
+
+
+async def test_waiting_stories_are_served_round_robin():
+    """A long story queued first must not make a one-page story wait behind
+    every one of its pages."""
+    from app.services.scheduler import ImageScheduler
+
+    scheduler = ImageScheduler(1)
+    log = []
+    tasks = [asyncio.create_task(_hold(scheduler, "long", log)) for _ in range(4)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(_hold(scheduler, "short", log)))
+    await asyncio.gather(*tasks)
+    assert log.index("short") <= 2, log
+
+
+async def test_priority_is_served_first_but_not_exclusively():
+    from app.services.scheduler import _PRIORITY_SHARE, ImageScheduler
+
+    scheduler = ImageScheduler(1)
+    log = []
+    tasks = [asyncio.create_task(_hold(scheduler, "busy", log))]
+    await asyncio.sleep(0)
+    tasks += [asyncio.create_task(_hold(scheduler, "free", log)) for _ in range(2)]
+    tasks += [asyncio.create_task(_hold(scheduler, "plus", log, priority=True)) for _ in range(6)]
+    await asyncio.sleep(0)
+    assert scheduler.depth(priority=True) == 6 and scheduler.depth(priority=False) == 2
+    await asyncio.gather(*tasks)
+
+    assert log[1] == "plus", "a priority story jumps the standard queue"
+    assert "free" in log[1 : _PRIORITY_SHARE + 2], "standard stories still get a share"
+
+
+async def test_a_cancelled_waiter_does_not_leak_its_slot():
+    from app.services.scheduler import ImageScheduler
+
+    scheduler = ImageScheduler(1)
+    log = []
+    holder = asyncio.create_task(_hold(scheduler, "a", log, seconds=0.05))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(_hold(scheduler, "b", log))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await holder
+    await _hold(scheduler, "c", log)
+    assert log == ["a", "c"]
+    assert scheduler.in_flight == 0 and scheduler.depth() == 0
+
+
+async def test_the_priority_plan_is_the_one_that_promises_it():
+    from app.plans import PLANS
+
+    for plan in PLANS.values():
+        promises = any("Priority generation" in f for f in plan.features)
+        assert plan.priority == promises, plan.code
+
+
+# --- Queues ------------------------------------------------------------------
+
+
+class _FakeArqPool:
+    """Records enqueues; keeps the sorted sets of waiting stories that
+    enqueue_generation, story_started and queue_depths use."""
+
+    def __init__(self):
+        self.enqueued = []
+        self.sets = {}
+
+    async def enqueue_job(self, function, *args, **kwargs):
+        self.enqueued.append((function, args, kwargs))
+
+    async def zadd(self, key, mapping):
+        self.sets.setdefault(key, {}).update(mapping)
+
+    async def zrem(self, key, member):
+        self.sets.get(key, {}).pop(member, None)
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, pool):
+        self.pool = pool
+        self.results = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def zremrangebyscore(self, key, low, high):
+        members = self.pool.sets.get(key, {})
+        for member in [m for m, score in members.items() if score <= high]:
+            del members[member]
+        self.results.append(None)
+
+    def zcard(self, key):
+        self.results.append(len(self.pool.sets.get(key, {})))
+
+    def zrange(self, key, start, end, withscores=False):
+        items = sorted(self.pool.sets.get(key, {}).items(), key=lambda item: item[1])
+        self.results.append(items[start : end + 1])
+
+    async def execute(self):
+        return self.results
+
+
+def _use_pool(monkeypatch, pool):
+    from app import jobs
+
+    async def _pool():
+        return pool
+
+    monkeypatch.setattr(jobs, "_get_arq_pool", _pool)
+    monkeypatch.setattr(get_settings(), "job_backend", "arq")
+
+
+async def test_stories_are_routed_by_the_owners_effective_plan(client, auth_headers, monkeypatch):
+    from datetime import UTC, datetime, timedelta
+
+    from app.models import User
+    from app.routers import stories
+
+    routed = []
+
+    async def _record(story_id, *, priority=False):
+        routed.append(priority)
+
+    monkeypatch.setattr(stories, "enqueue_generation", _record)
+    assert (
+        await client.post("/api/stories", json={"prompt": "A free owl"}, headers=auth_headers)
+    ).status_code == 202
+    me = (await client.get("/api/auth/me", headers=auth_headers)).json()
+    async with get_session_factory()() as session:
+        user = (await session.execute(select(User).where(User.id == me["id"]))).scalar_one()
+        user.plan = "plus"
+        user.plan_expires_at = datetime.now(UTC) + timedelta(days=20)
+        await session.commit()
+    assert (
+        await client.post("/api/stories", json={"prompt": "A paid owl"}, headers=auth_headers)
+    ).status_code == 202
+    async with get_session_factory()() as session:
+        user = (await session.execute(select(User).where(User.id == me["id"]))).scalar_one()
+        user.plan_expires_at = datetime.now(UTC) - timedelta(seconds=1)
+        await session.commit()
+    assert (
+        await client.post("/api/stories", json={"prompt": "A lapsed owl"}, headers=auth_headers)
+    ).status_code == 202
+    assert routed == [False, True, False]
+
+
+async def test_priority_stories_go_to_their_own_queue(monkeypatch):
+    from app import jobs, metrics
+
+    metrics.reset()
+    pool = _FakeArqPool()
+    _use_pool(monkeypatch, pool)
+    await jobs.enqueue_generation("s1", priority=True)
+    await jobs.enqueue_generation("s2")
+    # No priority slots configured: nothing would drain that queue.
+    monkeypatch.setattr(get_settings(), "worker_priority_jobs", 0)
+    await jobs.enqueue_generation("s3", priority=True)
+
+    assert [(args, kwargs["_queue_name"]) for _, args, kwargs in pool.enqueued] == [
+        (("s1",), jobs.PRIORITY_QUEUE),
+        (("s2",), jobs.STANDARD_QUEUE),
+        (("s3",), jobs.STANDARD_QUEUE),
+    ]
+    assert metrics.value("jobs_enqueued_total", queue="priority") == 1
+    assert metrics.value("jobs_enqueued_total", queue="standard") == 2
+    assert {name: (await jobs.queue_depths())[name][0] for name in jobs.QUEUES} == {
+        "priority": 1,
+        "standard": 2,
+    }
+
+
+async def test_metrics_report_each_queues_depth_and_oldest_wait(client, monkeypatch):
+    from app import jobs
+
+    pool = _FakeArqPool()
+    _use_pool(monkeypatch, pool)
+    for story_id in ("taken", "a", "b"):
+        await jobs.enqueue_generation(story_id)
+    now = time.time()
+    pool.sets["stories-waiting:standard"].update({"taken": now - 600, "a": now - 30, "b": now - 5})
+    # Taken by a worker: no longer waiting, and not the oldest wait.
+    await jobs.story_started(pool, "standard", "taken")
+    # Redraws and exports share the standard queue but are not stories.
+    await jobs.enqueue_export("e1")
+    await jobs.enqueue_illustration("a", 0)
+    monkeypatch.setattr(get_settings(), "metrics_token", "scrape-me")
+    text = (await client.get("/api/metrics", headers={"Authorization": "Bearer scrape-me"})).text
+
+    assert 'queue_depth{queue="standard"} 2' in text
+    assert 'queue_depth{queue="priority"} 0' in text
+    wait = next(
+        line for line in text.splitlines() if line.startswith('queue_oldest_wait_seconds{queue="standard"}')
+    )
+    assert 29 < float(wait.split()[-1]) < 60
+
+
+async def test_a_story_lost_before_it_started_ages_out_of_the_count(monkeypatch):
+    from app import jobs
+    from app.reaper import STALE_AFTER
+
+    pool = _FakeArqPool()
+    _use_pool(monkeypatch, pool)
+    await jobs.enqueue_generation("lost")
+    pool.sets["stories-waiting:standard"]["lost"] = time.time() - STALE_AFTER.total_seconds() - 1
+    assert (await jobs.queue_depths())["standard"] == (0, 0.0)
+
+
+def _two_workers_and_a_fresh_average(monkeypatch):
+    from app import heartbeat, kv
+
+    async def _two_workers():
+        return [{"worker_id": "w1"}, {"worker_id": "w2"}]
+
+    monkeypatch.setattr(heartbeat, "beats", _two_workers)
+    monkeypatch.setattr(kv, "_shared", lambda: False)  # the average, without Redis
+    kv.reset_kv()  # no average left by another test
+
+
+async def test_the_start_estimate_is_the_queue_ahead_over_its_slots(monkeypatch):
+    from app import admission, jobs
+
+    pool = _FakeArqPool()
+    _use_pool(monkeypatch, pool)
+    _two_workers_and_a_fresh_average(monkeypatch)
+    for i in range(16):
+        await jobs.enqueue_generation(f"s{i}")
+    for i in range(2):
+        await jobs.enqueue_generation(f"p{i}", priority=True)
+
+    await admission.record_service_time(160)  # 60s first guess, moved a fifth of the way
+    assert await admission.service_seconds() == 80
+    # 16 stories x 80s over 2 workers x 8 slots; 2 x 80s over 2 x 4.
+    assert await admission.estimate_wait(priority=False) == 80
+    assert await admission.estimate_wait(priority=True) == 20
+    monkeypatch.setattr(get_settings(), "worker_priority_jobs", 0)
+    assert await admission.estimate_wait(priority=True) == 80
+    pool.sets.clear()
+    assert await admission.estimate_wait(priority=False) == 0
+
+
+async def test_stories_being_run_are_not_a_backlog(monkeypatch):
+    from app import admission, jobs
+
+    pool = _FakeArqPool()
+    _use_pool(monkeypatch, pool)
+    _two_workers_and_a_fresh_average(monkeypatch)
+    monkeypatch.setattr(get_settings(), "admission_max_wait_seconds", 1)
+    for i in range(16):
+        await jobs.enqueue_generation(f"r{i}")
+        await jobs.story_started(pool, "standard", f"r{i}")
+        await jobs.story_started(pool, "standard", f"r{i}")  # a re-delivery changes nothing
+
+    # Every slot busy, nobody waiting: admitted, and next in line.
+    assert await admission.admit(priority=False) == 0
+    for i in range(8):
+        await jobs.enqueue_generation(f"w{i}")
+    # 8 waiting x the 60s first guess over 2 workers x 8 slots, the running 16 aside.
+    assert await admission.estimate_wait(priority=False) == 30
+
+
+async def test_a_new_story_gets_its_wait_or_is_shed_before_it_is_charged(client, auth_headers, monkeypatch):
+    from app import admission
+
+    r = await client.post("/api/stories", json={"prompt": "An owl with no queue"}, headers=auth_headers)
+    assert r.status_code == 202
+    assert r.json()["estimated_wait_seconds"] == 0  # inline: it starts at once
+    assert r.json()["estimated_start_at"] is not None
+    await wait_for_job(client, auth_headers, r.json()["job_id"])
+    before = (await client.get("/api/auth/usage", headers=auth_headers)).json()
+
+    async def _backlog(*, priority):
+        return 3600.0
+
+    monkeypatch.setattr(admission, "estimate_wait", _backlog)
+    monkeypatch.setattr(get_settings(), "admission_max_wait_seconds", 900)
+    r = await client.post("/api/stories", json={"prompt": "An owl at peak time"}, headers=auth_headers)
+    assert r.status_code == 503
+    assert r.json()["code"] == "capacity.busy"
+    assert r.headers["retry-after"] == "2700"  # when the backlog is back under the limit
+    assert r.json()["params"] == {"minutes": 45}
+    assert len((await client.get("/api/stories", headers=auth_headers)).json()) == 1
+    assert (await client.get("/api/auth/usage", headers=auth_headers)).json() == before
+
+    monkeypatch.setattr(get_settings(), "admission_max_wait_seconds", 0)
+    r = await client.post("/api/stories", json={"prompt": "An owl, no limit"}, headers=auth_headers)
+    assert r.status_code == 202
+    assert r.json()["estimated_wait_seconds"] == 3600
+    await wait_for_job(client, auth_headers, r.json()["job_id"])
+
+
+# --- Resuming ----------------------------------------------------------------
+
+
+async def _interrupt(story_id, job_id, *, lost, failed=()):
+    """Make a finished story look like a worker died mid-illustration."""
+    async with get_session_factory()() as session:
+        await session.execute(
+            update(StoryPage)
+            .where(StoryPage.story_id == story_id, StoryPage.position.in_(lost))
+            .values(image_url="", image_error="")
+        )
+        await session.execute(
+            update(StoryPage)
+            .where(StoryPage.story_id == story_id, StoryPage.position.in_(failed))
+            .values(image_url="", image_error="could not draw")
+        )
+        await session.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id == job_id)
+            .values(status="running", stage="illustrating", checkpoint="story_written")
+        )
+        await session.commit()
+
+
+async def test_a_rerun_after_the_text_is_saved_pays_only_for_lost_pictures(client, auth_headers, monkeypatch):
+    from app.models import GenerationEvent
+    from app.services.base import Usage
+    from app.services.mock import MockProvider
+    from app.services.pipeline import run_generation
+
+    r = await client.post("/api/stories", json={"prompt": "A crane who counted stars"}, headers=auth_headers)
+    story_id, job_id = r.json()["story_id"], r.json()["job_id"]
+    await wait_for_job(client, auth_headers, job_id)
+    before, _ = await _state(story_id, job_id)
+    await _interrupt(story_id, job_id, lost=[1], failed=[2])
+
+    calls = {"write": 0, "illustrate": []}
+    real_illustrate = MockProvider.illustrate
+
+    async def write_story(self, req):
+        calls["write"] += 1
+        raise AssertionError("the saved text must not be written again")
+
+    async def illustrate(self, image_prompt, *, title, position):
+        calls["illustrate"].append(position)
+        image = await real_illustrate(self, image_prompt, title=title, position=position)
+        image.usage = Usage(images=1)
+        return image
+
+    monkeypatch.setattr(MockProvider, "write_story", write_story)
+    monkeypatch.setattr(MockProvider, "illustrate", illustrate)
+    await run_generation(story_id)
+
+    assert calls == {"write": 0, "illustrate": [1]}, "only the page with no result is redone"
+    urls, progress = await _state(story_id, job_id)
+    assert urls[0] == before[0] and urls[1] and not urls[2]
+    job = (await client.get(f"/api/jobs/{job_id}", headers=auth_headers)).json()
+    assert job["status"] == "complete" and progress == job["progress_total"] == 3
+    async with get_session_factory()() as session:
+        event = (
+            await session.execute(select(GenerationEvent).where(GenerationEvent.story_id == story_id))
+        ).scalar_one()
+    assert event.images == 1, "the resumed picture is charged, and only once"
+
+
+async def test_a_finished_job_is_not_run_again(client, auth_headers, monkeypatch):
+    from app.services.mock import MockProvider
+    from app.services.pipeline import run_generation
+
+    r = await client.post("/api/stories", json={"prompt": "A drum that woke the hills"}, headers=auth_headers)
+    await wait_for_job(client, auth_headers, r.json()["job_id"])
+
+    async def write_story(self, req):
+        raise AssertionError("a duplicate delivery must not generate again")
+
+    monkeypatch.setattr(MockProvider, "write_story", write_story)
+    await run_generation(r.json()["story_id"])
+
+
+async def test_a_failed_redraw_keeps_the_old_picture_and_is_still_charged(client, auth_headers, monkeypatch):
+    from app.models import GenerationEvent, utcnow
+    from app.services.base import GeneratedImage, Usage
+    from app.services.mock import MockProvider
+    from app.services.pipeline import regenerate_illustration
+
+    r = await client.post("/api/stories", json={"prompt": "A goat on a rope bridge"}, headers=auth_headers)
+    story_id, job_id = r.json()["story_id"], r.json()["job_id"]
+    await wait_for_job(client, auth_headers, job_id)
+    before, _ = await _state(story_id, job_id)
+    async with get_session_factory()() as session:
+        await session.execute(
+            update(StoryPage)
+            .where(StoryPage.story_id == story_id, StoryPage.position == 1)
+            .values(image_requested_at=utcnow())
+        )
+        await session.commit()
+
+    async def illustrate(self, image_prompt, *, title, position):
+        return GeneratedImage(error="blocked", usage=Usage(images=1))
+
+    monkeypatch.setattr(MockProvider, "illustrate", illustrate)
+    await regenerate_illustration(story_id, 1)
+    await regenerate_illustration(story_id, 1)  # a duplicate delivery does nothing
+
+    after, _ = await _state(story_id, job_id)
+    assert after == before
+    async with get_session_factory()() as session:
+        page = (
+            await session.execute(
+                select(StoryPage).where(StoryPage.story_id == story_id, StoryPage.position == 1)
+            )
+        ).scalar_one()
+        event = (
+            await session.execute(select(GenerationEvent).where(GenerationEvent.story_id == story_id))
+        ).scalar_one()
+    assert not page.image_pending and page.image_error == ""
+    assert event.images == 1
+
+
+# --- Progress events ---------------------------------------------------------
+
+
+def _events(body: str) -> list[dict]:
+    return [
+        json.loads(line.removeprefix("data: ")) for line in body.splitlines() if line.startswith("data: ")
+    ]
+
+
+async def _running(job_id):
+    async with get_session_factory()() as session:
+        await session.execute(
+            update(GenerationJob)
+            .where(GenerationJob.id == job_id)
+            .values(status="running", stage="illustrating", progress_total=3)
+        )
+        await session.commit()
+    await job_events.forget_jobs(job_id)  # the finished run's snapshot
+
+
+async def _subscribed(job_id):
+    for _ in range(500):
+        if job_id in job_events._hub._listeners:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("the stream never subscribed")
+
+
+async def test_progress_is_pushed_to_the_event_stream(client, auth_headers):
+    story_id, job_id = await _blank_story(client, auth_headers)
+    await _running(job_id)
+    stream = asyncio.create_task(client.get(f"/api/jobs/{job_id}/events", headers=auth_headers))
+    await _subscribed(job_id)
+
+    writer = PageResultWriter(story_id=story_id, job_id=job_id, flush_seconds=60, flush_batch=1)
+    for position in range(3):
+        await writer.record(position, f"/media/{position}.png", "")
+    await writer.close()
+    await _update_job(job_id, status="complete", stage="done")
+
+    r = await asyncio.wait_for(stream, timeout=10)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = _events(r.text)
+    progress = [e["progress_current"] for e in events if e["status"] == "running"]
+    assert progress == sorted(set(progress)) and progress[-1] == 3, progress
+    assert events[-1]["status"] == "complete"
+    assert job_id not in job_events._hub._listeners, "a finished stream must unsubscribe"
+
+
+async def test_a_stream_resumes_from_the_last_event(client, auth_headers):
+    r = await client.post(
+        "/api/stories", json={"prompt": "The kite that would not land"}, headers=auth_headers
+    )
+    job_id = r.json()["job_id"]
+    await wait_for_job(client, auth_headers, job_id)
+
+    first = await client.get(f"/api/jobs/{job_id}/events", headers=auth_headers)
+    assert [e["status"] for e in _events(first.text)] == ["complete"]
+    last_id = next(line for line in first.text.splitlines() if line.startswith("id: ")).removeprefix("id: ")
+    again = await client.get(f"/api/jobs/{job_id}/events", headers={**auth_headers, "Last-Event-ID": last_id})
+    assert again.status_code == 200
+    assert _events(again.text) == [], "the client already has the final state"
+
+    r2 = await client.post(
+        "/api/auth/register",
+        json={"email": "other-events@example.com", "password": "password123", "display_name": ""},
+    )
+    other = {"Authorization": f"Bearer {r2.json()['access_token']}"}
+    assert (await client.get(f"/api/jobs/{job_id}/events", headers=other)).status_code == 404
+
+
+async def test_a_lost_event_is_recovered_on_the_heartbeat(client, auth_headers, monkeypatch):
+    """Pub/sub drops messages sent while a subscriber reconnects. A change
+    whose message never arrives must still reach the stream."""
+    monkeypatch.setattr(get_settings(), "job_events_heartbeat_seconds", 0.05)
+    _story_id, job_id = await _blank_story(client, auth_headers)
+    await _running(job_id)
+    stream = asyncio.create_task(client.get(f"/api/jobs/{job_id}/events", headers=auth_headers))
+    await _subscribed(job_id)
+    monkeypatch.setattr(job_events._hub, "dispatch", lambda *_args: None)
+    await _update_job(job_id, status="complete", stage="done")
+
+    r = await asyncio.wait_for(stream, timeout=10)
+    assert ": ping" in r.text
+    assert _events(r.text)[-1]["status"] == "complete"
+
+
+async def test_polls_are_answered_without_the_database(client, auth_headers):
+    r = await client.post("/api/stories", json={"prompt": "The quiet drum"}, headers=auth_headers)
+    story_id, job_id = r.json()["story_id"], r.json()["job_id"]
+    await wait_for_job(client, auth_headers, job_id)
+    await client.get(f"/api/jobs/{job_id}", headers=auth_headers)  # the token version is cached now
+
+    statements = []
+
+    def _before(conn, cursor, statement, *_args):
+        statements.append(statement)
+
+    event.listen(get_engine().sync_engine, "before_cursor_execute", _before)
+    try:
+        r = await client.get(f"/api/jobs/{job_id}", headers=auth_headers)
+    finally:
+        event.remove(get_engine().sync_engine, "before_cursor_execute", _before)
+    assert r.status_code == 200
+    assert r.json()["status"] == "complete" and r.json()["story_id"] == story_id
+    assert set(r.json()) == {
+        "id",
+        "story_id",
+        "status",
+        "stage",
+        "progress_current",
+        "progress_total",
+        "error",
+        "error_code",
+    }
+    assert statements == []
+
+    r2 = await client.post(
+        "/api/auth/register",
+        json={"email": "other-poll@example.com", "password": "password123", "display_name": ""},
+    )
+    other = {"Authorization": f"Bearer {r2.json()['access_token']}"}
+    assert (await client.get(f"/api/jobs/{job_id}", headers=other)).status_code == 404, (
+        "a cached snapshot must still be checked against its owner"
+    )
+
+
+async def test_a_changed_password_retires_tokens_on_the_cached_path(client, auth_headers):
+    r = await client.post("/api/stories", json={"prompt": "The lamp that hummed"}, headers=auth_headers)
+    job_id = r.json()["job_id"]
+    await wait_for_job(client, auth_headers, job_id)
+    r = await client.post(
+        "/api/auth/change-password",
+        json={"current_password": "password123", "new_password": "password456"},
+        headers=auth_headers,
+    )
+    assert r.status_code == 200, r.text
+    assert (await client.get(f"/api/jobs/{job_id}", headers=auth_headers)).status_code == 401
+    fresh = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    assert (await client.get(f"/api/jobs/{job_id}", headers=fresh)).status_code == 200
@@ -0,0 +1,94 @@
+"""S3Storage against a local S3 stand-in (moto's server), not a mock of the client.
+
+Skipped where the optional S3 dependencies are not installed.
+"""
+
+import pytest
+
+pytest.importorskip("aiobotocore")
+moto_server = pytest.importorskip("moto.server")
+
+from app.config import get_settings  # noqa: E402
+from app.storage import S3Storage  # noqa: E402
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(scope="module")
+def s3_endpoint():
+    server = moto_server.ThreadedMotoServer(port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+@pytest.fixture()
+async def storage(s3_endpoint, monkeypatch):
+    import uuid
+
+    settings = get_settings()
+    bucket = f"katha-{uuid.uuid4().hex[:8]}"
+    for name, value in {
+        "s3_bucket": bucket,
+        "s3_endpoint_url": s3_endpoint,
+        "s3_region": "us-east-1",
+        "s3_access_key_id": "test",
+        "s3_secret_access_key": "test",
+        "s3_public_base_url": f"https://cdn.example/{bucket}",
+        "s3_multipart_threshold_mb": 5,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    s3 = S3Storage()
+    await (await s3._get_client()).create_bucket(Bucket=bucket)
+    yield s3
+    await s3.close()
+
+
+async def test_images_round_trip_under_the_public_base(storage):
+    url = await storage.save_image(
+        b"webp-bytes", story_id="s1", position=2, mime="image/webp", variant="grid"
+    )
+    assert url.startswith(storage.public_base + "/stories/s1/02-") and url.endswith("-grid.webp")
+    assert await storage.load_image(url) == b"webp-bytes"
+    assert await storage.load_image("https://elsewhere.example/x.png") is None
+
+    await storage.delete_image(url)
+    assert await storage.load_image(url) is None
+
+
+async def test_deleting_a_story_removes_all_of_its_media(storage):
+    urls = [await storage.save_image(b"x", story_id="s2", position=i, mime="image/png") for i in range(3)]
+    await storage.delete_story_media("s2")
+    for url in urls:
+        assert await storage.load_image(url) is None
+
+
+async def test_large_artifacts_go_up_in_parts(storage):
+    data = bytes(range(256)) * (11 * 1024 * 1024 // 256)  # three parts at 5 MB
+    await storage.save_artifact("pdf/s3/book.pdf", data, content_type="application/pdf")
+    assert await storage.load_artifact("pdf/s3/book.pdf") == data
+    head = await (await storage._get_client()).head_object(
+        Bucket=storage.bucket, Key="artifacts/pdf/s3/book.pdf"
+    )
+    assert head["ETag"].strip('"').endswith("-3"), "a multipart ETag names its part count"
+    assert await storage.load_artifact("pdf/s3/missing.pdf") is None
+
+    await storage.delete_artifacts("pdf/s3/")
+    assert await storage.load_artifact("pdf/s3/book.pdf") is None
+
+
+async def test_artifact_files_go_up_in_parts_and_come_down_whole(storage, tmp_path):
+    data = bytes(range(256)) * (11 * 1024 * 1024 // 256)
+    (tmp_path / "book.pdf").write_bytes(data)
+    await storage.save_artifact_file(
+        "pdf/s3/book.pdf", str(tmp_path / "book.pdf"), content_type="application/pdf"
+    )
+    head = await (await storage._get_client()).head_object(
+        Bucket=storage.bucket, Key="artifacts/pdf/s3/book.pdf"
+    )
+    assert head["ETag"].strip('"').endswith("-3")
+
+    got = await storage.load_artifact_file("pdf/s3/book.pdf", str(tmp_path / "copy.pdf"))
+    assert got == str(tmp_path / "copy.pdf") and (tmp_path / "copy.pdf").read_bytes() == data
+    assert await storage.load_artifact_file("pdf/s3/missing.pdf", str(tmp_path / "none.pdf")) is None
@@ -33,7 +33,7 @@ async def test_full_story_generation_flow(client, auth_headers):
     assert 1 <= len(story["pages"]) <= 3
     for page in story["pages"]:
         assert page["text"]
-        assert page["image_url"].startswith("/media/")
+        assert page["image_url"].startswith("/media/") and page["image_url"].endswith(".webp")
 
     # Image files actually exist and are served
     img = await client.get(story["pages"][0]["image_url"])
@@ -46,6 +46,8 @@ async def test_full_story_generation_flow(client, auth_headers):
     items = r.json()
     assert len(items) == 1
     assert items[0]["cover_image_url"].startswith("/media/")
+    assert items[0]["thumb_grid_url"].endswith("-grid.webp")
+    assert items[0]["thumb_cover_url"].endswith("-cover.jpg")
 
 
 async def test_story_isolation_between_users(client, auth_headers):
@@ -152,3 +154,52 @@ async def test_health(client):
     body = r.json()
     assert body["status"] == "ok"
     assert body["provider"] == "mock"
+
+
+async def _finished_story(client, headers) -> str:
+    r = await client.post("/api/stories", json={"prompt": "A kite over Pokhara"}, headers=headers)
+    story_id = r.json()["story_id"]
+    job = await wait_for_job(client, headers, r.json()["job_id"])
+    assert job["status"] == "complete", job
+    return story_id
+
+
+async def test_redraw_replaces_one_picture_and_removes_the_old_file(client, auth_headers):
+    import asyncio
+    import os
+
+    from app.config import get_settings
+
+    story_id = await _finished_story(client, auth_headers)
+    before = (await client.get(f"/api/stories/{story_id}", headers=auth_headers)).json()["pages"]
+
+    r = await client.post(f"/api/stories/{story_id}/pages/0/illustration", headers=auth_headers)
+    assert r.status_code == 202, r.text
+    assert r.json()["image_pending"] is True
+    assert r.json()["image_url"] == before[0]["image_url"], "the old picture stays until replaced"
+    again = await client.post(f"/api/stories/{story_id}/pages/0/illustration", headers=auth_headers)
+    assert again.status_code == 409 and again.json()["code"] == "story.redraw_in_progress"
+
+    for _ in range(100):
+        after = (await client.get(f"/api/stories/{story_id}", headers=auth_headers)).json()["pages"]
+        if not after[0]["image_pending"]:
+            break
+        await asyncio.sleep(0.1)
+    assert after[0]["image_url"] != before[0]["image_url"]
+    assert after[1:] == before[1:], "other pages must be left alone"
+    media = get_settings().media_root
+    for key in ("image_url", "thumb_cover_url", "thumb_grid_url"):
+        assert not os.path.exists(os.path.join(media, before[0][key].removeprefix("/media/"))), key
+    assert (await client.get(after[0]["image_url"])).status_code == 200
+
+
+async def test_redraw_refuses_missing_pages_and_runs_out(client, auth_headers, monkeypatch):
+    from app.config import get_settings
+
+    story_id = await _finished_story(client, auth_headers)
+    r = await client.post(f"/api/stories/{story_id}/pages/99/illustration", headers=auth_headers)
+    assert r.status_code == 404 and r.json()["code"] == "story.page_not_found"
+
+    monkeypatch.setattr(get_settings(), "illustration_redraws_per_story", 0)
+    r = await client.post(f"/api/stories/{story_id}/pages/0/illustration", headers=auth_headers)
+    assert r.status_code == 429 and r.json()["code"] == "story.redraw_limit"
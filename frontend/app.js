@@ -121,6 +121,7 @@
 
     let currentStory = null;   // story object shown in the reader
     let pollTimer = null;
+    let jobStream = null;      // AbortController of the open progress stream
     let pollGen = 0;           // bumping this invalidates any in-flight poll loop
     let libraryTimer = null;   // auto-refresh while stories are generating
     let isSharedView = false;
@@ -585,7 +586,7 @@
                     child_ids: selectedChildIds(),
                 }),
             });
-            startPolling(resp.job_id, resp.story_id);
+            startPolling(resp.job_id, resp.story_id, resp.estimated_wait_seconds);
         } catch (err) {
             els.generateBtn.disabled = false;
             if (err.quotaExhausted) {
@@ -600,33 +601,78 @@
     function stopPolling() {
         pollGen += 1;
         if (pollTimer) { clearTimeout(pollTimer); pollTimer = null; }
+        if (jobStream) { jobStream.abort(); jobStream = null; }
         els.progressPanel.classList.add('hidden');
         els.generateBtn.disabled = false;
     }
 
-    function startPolling(jobId, storyId) {
+    // Progress arrives as Server-Sent Events, one whole job per event. Read
+    // with fetch rather than EventSource, which cannot send the Authorization
+    // header. A dropped connection resumes from the last event it delivered.
+    // Resolves true once onJob has seen the job finish (or the run was
+    // superseded), false when streaming is unavailable and the caller should
+    // fall back to polling.
+    async function streamJob(jobId, myGen, onJob) {
+        if (typeof TextDecoderStream === 'undefined') return false;
+        let lastId = '';
+        for (let attempt = 0; attempt < 3; attempt++) {
+            const controller = new AbortController();
+            jobStream = controller;
+            try {
+                const headers = { Authorization: 'Bearer ' + token() };
+                if (lastId) headers['Last-Event-ID'] = lastId;
+                const resp = await fetch('/api/jobs/' + jobId + '/events', { headers, signal: controller.signal });
+                if (!resp.ok || !resp.body) return false;
+                const reader = resp.body.pipeThrough(new TextDecoderStream()).getReader();
+                let buffer = '';
+                for (;;) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffer += value;
+                    let end;
+                    while ((end = buffer.indexOf('\n\n')) !== -1) {
+                        const block = buffer.slice(0, end);
+                        buffer = buffer.slice(end + 2);
+                        let data = '';
+                        for (const line of block.split('\n')) {
+                            if (line.startsWith('id: ')) lastId = line.slice(4);
+                            else if (line.startsWith('data: ')) data += line.slice(6);
+                        }
+                        if (!data) continue; // heartbeat
+                        if (myGen !== pollGen) return true;
+                        if (await onJob(JSON.parse(data))) return true;
+                    }
+                }
+            } catch (_) {
+                if (myGen !== pollGen) return true;
+            } finally {
+                if (jobStream === controller) jobStream = null;
+            }
+        }
+        return false;
+    }
+
+    // waitSeconds: the server's estimate of the queue ahead, if it made one.
+    function startPolling(jobId, storyId, waitSeconds) {
         pollGen += 1;
         const myGen = pollGen;
         let revealed = false;   // has the story text been shown yet
         els.progressPanel.classList.remove('hidden');
         els.progressBar.style.width = '4%';
         els.progressStage.textContent = stageLabel('queued');
-        els.progressDetail.textContent = '';
+        // A wait under a minute is not worth a line of its own.
+        els.progressDetail.textContent = waitSeconds >= 60
+            ? t('progress.starts_in', { minutes: Math.ceil(waitSeconds / 60) })
+            : '';
 
-        const poll = async () => {
-            let job;
-            try {
-                job = await api('/api/jobs/' + jobId);
-            } catch (err) {
-                if (myGen !== pollGen) return; // superseded by logout/another run
-                stopPolling();
-                return setError(els.createError, err.message);
-            }
-            if (myGen !== pollGen) return;
+        // Shows one snapshot of the job. True once the job is over (or this
+        // run was superseded) and nothing more should be read.
+        const onJob = async (job) => {
             els.progressStage.textContent = stageLabel(job.stage);
             let pct = 4;
             if (job.stage === 'writing_story') {
                 pct = 20;
+                els.progressDetail.textContent = '';  // the queue estimate, now spent
             } else if (job.progress_total > 0) {
                 pct = Math.round(30 + (job.progress_current / job.progress_total) * 65);
                 els.progressDetail.textContent = t('progress.illustration', {
@@ -643,13 +689,13 @@
                 revealed = true;
                 try {
                     await openStory(storyId);
-                    if (myGen !== pollGen) return;
+                    if (myGen !== pollGen) return true;
                     els.progressPanel.classList.add('hidden');
                 } catch (_) { revealed = false; }
             } else if (revealed && job.status !== 'complete') {
                 try {
                     const story = await api('/api/stories/' + storyId);
-                    if (myGen !== pollGen) return;
+                    if (myGen !== pollGen) return true;
                     currentStory = story;
                     patchPageImages(story);
                 } catch (_) { /* keep polling; the job status is authoritative */ }
@@ -665,17 +711,34 @@
                 } catch (err) {
                     setError(els.createError, t('create.err.display_failed', { message: err.message }));
                 }
-                return;
+                return true;
             }
             if (job.status === 'failed') {
                 stopPolling();
                 refreshUsage().catch(() => {});
                 if (revealed) show(els.createView);
-                return setError(els.createError, storedError(job, 'err.generation_failed'));
+                setError(els.createError, storedError(job, 'err.generation_failed'));
+                return true;
+            }
+            return false;
+        };
+
+        const poll = async () => {
+            let job;
+            try {
+                job = await api('/api/jobs/' + jobId);
+            } catch (err) {
+                if (myGen !== pollGen) return; // superseded by logout/another run
+                stopPolling();
+                return setError(els.createError, err.message);
             }
+            if (myGen !== pollGen) return;
+            if (await onJob(job) || myGen !== pollGen) return;
             pollTimer = setTimeout(poll, 1200);
         };
-        poll();
+        streamJob(jobId, myGen, onJob).then((finished) => {
+            if (!finished && myGen === pollGen) poll();
+        });
     }
 
     // ---------- Library ----------
@@ -696,8 +759,11 @@
         for (const s of items) {
             const card = document.createElement('div');
             card.className = 'story-card';
-            const cover = s.cover_image_url
-                ? Object.assign(document.createElement('img'), { className: 'cover', src: s.cover_image_url, alt: '' })
+            // The grid thumbnail is a few KB; stories made before thumbnails
+            // existed only have the full picture.
+            const coverSrc = s.thumb_grid_url || s.cover_image_url;
+            const cover = coverSrc
+                ? Object.assign(document.createElement('img'), { className: 'cover', src: coverSrc, alt: '' })
                 : Object.assign(document.createElement('div'), { className: 'cover-placeholder', textContent: '📖' });
             const meta = document.createElement('div');
             meta.className = 'meta';
@@ -1171,7 +1237,7 @@
     // the library, but a parent watching the bar should be told that, not shown
     // it vanishing.
     i18n.beforeSwitch = () => {
-        if (!pollTimer) return true;
+        if (!pollTimer && !jobStream) return true;
         return confirmDialog({
             title: t('locale.switch_busy.title'),
             body: t('locale.switch_busy.body'),
@@ -86,6 +86,7 @@
         'stage.done': 'Done!',
         'stage.failed': 'Something went wrong',
         'progress.illustration': 'Illustration {n} of {total}',
+        'progress.starts_in': 'Starting in about {minutes} min',
         'toast.story_ready': 'Your story is ready.',
 
         // Library
@@ -189,6 +189,7 @@ window.KS_I18N_NE = {
 "stage.done": "भयो!",
 "stage.failed": "केही गडबड भयो",
 "progress.illustration": "चित्र {total} मध्ये {n}",
+"progress.starts_in": "करिब {minutes} मिनेटमा सुरु हुँदैछ",
 "toast.story_ready": "तपाईंको कथा तयार छ।",
 
 "library.open_story": "कथा खोल्नुहोस्: {title}",
@@ -224,6 +225,7 @@ window.KS_I18N_NE = {
 "srv.quota.monthly": "तपाईंले यो महिनाका {limit} वटै कथा प्रयोग गरिसक्नुभयो। तपाईंको सीमा अर्को महिनाको सुरुमा फेरि सुरु हुनेछ।",
 "srv.capacity.paused": "कथा बनाउने सेवा केही बेर रोकिएको छ। केही मिनेटपछि फेरि प्रयास गर्नुहोस्।",
 "srv.capacity.full": "आजका लागि KathaSajha को क्षमता भरिएको छ। कृपया भोलि प्रयास गर्नुहोस्।",
+"srv.capacity.busy": "अहिले धेरै कथाहरू बन्दैछन्। कृपया करिब {minutes} मिनेटपछि फेरि प्रयास गर्नुहोस्।",
 "srv.rate.generate": "तपाईं धेरै छिटो कथा बनाउँदै हुनुहुन्छ। कृपया केही बेर पर्खनुहोस्।",
 "srv.rate.auth": "धेरै पटक प्रयास भयो। केही मिनेटपछि फेरि प्रयास गर्नुहोस्।",
 
@@ -245,15 +247,24 @@ window.KS_I18N_NE = {
 "srv.story.not_found": "कथा फेला परेन।",
 "srv.story.shared_not_found": "साझा गरिएको कथा फेला परेन।",
 "srv.story.pdf_unavailable": "PDF निर्यात अहिले उपलब्ध छैन। कृपया केही बेरपछि प्रयास गर्नुहोस्।",
+"srv.story.pdf_busy": "अहिले धेरै पुस्तकहरू बन्दैछन्। कृपया एकछिनपछि फेरि प्रयास गर्नुहोस्।",
 "srv.story.pdf_not_ready": "कथा अझै बन्दैछ; बनिसकेपछि पुस्तक सुरक्षित गर्न सकिन्छ।",
 "srv.story.share_not_complete": "पूरा भएका कथा मात्र बाँड्न सकिन्छ।",
 "srv.story.delete_while_generating": "कथा अझै बन्दैछ; मेटाउनुअघि पूरा हुन दिनुहोस्।",
+"srv.story.redraw_not_ready": "कथा अझै बन्दैछ; पूरा भएपछि चित्र फेरि बनाउन सकिन्छ।",
+"srv.story.page_not_found": "पृष्ठ फेला परेन।",
+"srv.story.redraw_in_progress": "यो पृष्ठको नयाँ चित्र बनिरहेको छ।",
+"srv.story.redraw_limit": "यो कथाका चित्र बढीमा {max} पटक मात्र फेरि बनाउन सकिन्छ।",
 
 "srv.profile.child_limit": "तपाईं बढीमा {max} जना बच्चा सुरक्षित गर्न सक्नुहुन्छ।",
 "srv.profile.companion_limit": "तपाईं बढीमा {max} वटा पात्र सुरक्षित गर्न सक्नुहुन्छ।",
 "srv.profile.child_not_found": "बच्चा फेला परेन।",
 "srv.profile.companion_not_found": "पात्र फेला परेन।",
 "srv.job.not_found": "काम फेला परेन।",
+"srv.export.not_found": "छापाको फाइल फेला परेन। कृपया पुस्तक फेरि तयार गर्नुहोस्।",
+"srv.export.not_ready": "पुस्तक अझै छापाका लागि तयार हुँदैछ।",
+"srv.export.failed": "पुस्तक छापाका लागि तयार गर्न सकिएन। कृपया फेरि प्रयास गर्नुहोस्।",
+"srv.export.service_unavailable": "छापा सेवा केही बेर उपलब्ध छैन। कृपया फेरि प्रयास गर्नुहोस्।",
 
 "srv.generation.blocked": "त्यस विचारबाट हामी कथा लेख्न सकेनौँ। कृपया बालबालिकालाई सुहाउने अलि नरम विचार राखेर फेरि प्रयास गर्नुहोस्।",
 "srv.generation.failed": "कथा बनाउन सकिएन। कृपया फेरि प्रयास गर्नुहोस्।",